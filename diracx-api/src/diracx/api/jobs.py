@@ -1,13 +1,17 @@
 from __future__ import annotations
 
-__all__ = ("create_sandbox", "download_sandbox")
+__all__ = ("create_sandbox", "create_sandboxes", "download_sandbox")
 
+import asyncio
 import hashlib
+import io
 import logging
 import os
+import shutil
 import tarfile
 import tempfile
-from contextlib import contextmanager
+from collections.abc import Awaitable, Callable
+from contextlib import ExitStack, contextmanager, suppress
 from pathlib import Path
 from typing import BinaryIO, Literal
 
@@ -23,13 +27,213 @@ logger = logging.getLogger(__name__)
 
 SANDBOX_CHECKSUM_ALGORITHM = "sha256"
 SANDBOX_COMPRESSION: Literal["zst"] = "zst"
+SANDBOX_COMPRESSION_LEVEL = 18
+# Used for data which is already compressed and wouldn't shrink much further
+SANDBOX_FAST_COMPRESSION_LEVEL = 1
+SANDBOX_IO_CHUNK_SIZE = 1024 * 1024
+SANDBOX_DOWNLOAD_MAX_BUFFERED_CHUNKS = 16
+SANDBOX_DOWNLOAD_MAX_RETRIES = 3
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class _ChecksumWriter:
+    """File-like object computing the checksum and size of what is written to it."""
+
+    def __init__(self, fh: BinaryIO):
+        self._fh = fh
+        self.hasher = getattr(hashlib, SANDBOX_CHECKSUM_ALGORITHM)()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.hasher.update(data)
+        self.size += len(data)
+        return self._fh.write(data)
+
+    def flush(self) -> None:
+        self._fh.flush()
+
+
+def _compression_threads(n_sandboxes: int) -> int:
+    """Number of zstd threads for each of ``n_sandboxes`` compressed at once.
+
+    The cores are shared between the sandboxes, each zstd thread also having its
+    own (long distance matching) buffers.
+    """
+    return max(1, (os.cpu_count() or 1) // n_sandboxes)
+
+
+def _write_sandbox(
+    paths: list[Path],
+    tar_fh: BinaryIO,
+    *,
+    compression_level: int = SANDBOX_COMPRESSION_LEVEL,
+    fast: bool = False,
+    threads: int = -1,
+) -> SandboxInfo:
+    """Write a compressed tarball of the given paths and return its SandboxInfo.
+
+    The checksum is computed while the data is being compressed so the tarball
+    is never read back. Compression uses ``threads`` threads, all the available
+    cores by default.
+    """
+    if fast:
+        cctx = zstandard.ZstdCompressor(
+            level=SANDBOX_FAST_COMPRESSION_LEVEL, threads=threads
+        )
+    else:
+        # Long distance matching helps with large sandboxes containing similar files
+        compression_params = zstandard.ZstdCompressionParameters.from_level(
+            compression_level, enable_ldm=1, threads=threads
+        )
+        cctx = zstandard.ZstdCompressor(compression_params=compression_params)
+    writer = _ChecksumWriter(tar_fh)
+    with cctx.stream_writer(
+        writer, write_size=SANDBOX_IO_CHUNK_SIZE, closefd=False
+    ) as compressor:
+        with tarfile.open(
+            fileobj=compressor, mode="w|", bufsize=SANDBOX_IO_CHUNK_SIZE
+        ) as tf:
+            for path in paths:
+                logger.debug("Adding %s to sandbox as %s", path.resolve(), path.name)
+                tf.add(path.resolve(), path.name, recursive=True)
+    tar_fh.seek(0)
+    checksum = writer.hasher.hexdigest()
+    logger.debug("Sandbox checksum is %s", checksum)
+
+    return SandboxInfo(
+        checksum_algorithm=SANDBOX_CHECKSUM_ALGORITHM,
+        checksum=checksum,
+        size=writer.size,
+        format=f"tar.{SANDBOX_COMPRESSION}",
+    )
+
+
+@with_client
+async def create_sandbox(
+    paths: list[Path],
+    *,
+    compression_level: int = SANDBOX_COMPRESSION_LEVEL,
+    fast: bool = False,
+    client: AsyncDiracClient,
+) -> str:
+    """Create a sandbox from the given paths and upload it to the storage backend.
+
+    Any paths that are directories will be added recursively.
+    The returned value is the PFN of the sandbox in the storage backend and can
+    be used to submit jobs.
+
+    The sandbox is compressed with zstd at the given ``compression_level``. If
+    the files are already compressed, ``fast`` can be used to only spend the
+    minimum amount of time compressing them.
+    """
+    (pfn,) = await create_sandboxes(
+        [paths], compression_level=compression_level, fast=fast, client=client
+    )
+    return pfn
+
+
+@with_client
+async def create_sandboxes(
+    sandboxes: list[list[Path]],
+    *,
+    compression_level: int = SANDBOX_COMPRESSION_LEVEL,
+    fast: bool = False,
+    client: AsyncDiracClient,
+) -> list[str]:
+    """Create several sandboxes and upload them to the storage backend.
+
+    This is the same as calling `create_sandbox` for each list of paths but a
+    single request is made to DiracX and the uploads are done concurrently.
+    The PFNs are returned in the same order as ``sandboxes``.
+    """
+    threads = _compression_threads(len(sandboxes))
+    with ExitStack() as stack:
+        tar_fhs = [
+            stack.enter_context(tempfile.TemporaryFile(mode="w+b")) for _ in sandboxes
+        ]
+        sandbox_infos = await asyncio.gather(
+            *(
+                asyncio.to_thread(
+                    _write_sandbox,
+                    paths,
+                    tar_fh,
+                    compression_level=compression_level,
+                    fast=fast,
+                    threads=threads,
+                )
+                for paths, tar_fh in zip(sandboxes, tar_fhs)
+            )
+        )
+
+        responses = await client.jobs.initiate_bulk_sandbox_upload(sandbox_infos)
+
+        async def upload(res, tar_fh: BinaryIO) -> None:
+            logger.debug("Uploading sandbox for %s", res.pfn)
+            files = {"file": ("file", tar_fh)}
+            response = await httpx_client.post(res.url, data=res.fields, files=files)
+            # TODO: Handle this error better
+            response.raise_for_status()
+            logger.debug(
+                "Sandbox uploaded for %s with status code %s",
+                res.pfn,
+                response.status_code,
+            )
+
+        uploads = {}
+        for res, tar_fh in zip(responses, tar_fhs):
+            if not res.url:
+                logger.debug("%s already exists in storage backend", res.pfn)
+            elif res.pfn not in uploads:
+                # The same sandbox might have been given more than once
+                uploads[res.pfn] = (res, tar_fh)
+        async with httpx.AsyncClient() as httpx_client:
+            await asyncio.gather(*(upload(*args) for args in uploads.values()))
+
+    return [res.pfn for res in responses]
+
+
+class _QueueReader(io.RawIOBase):
+    """Blocking file-like view of the chunks put in an asyncio.Queue.
+
+    This is meant to be read from a worker thread while the event loop fills the
+    queue. A ``None`` chunk marks the end of the data and an exception is raised
+    in the reading thread.
+    """
+
+    def __init__(self, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop):
+        self._queue = queue
+        self._loop = loop
+        self._chunk = b""
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk:
+            if self._eof:
+                return 0
+            chunk = asyncio.run_coroutine_threadsafe(
+                self._queue.get(), self._loop
+            ).result()
+            if isinstance(chunk, BaseException):
+                raise chunk
+            if chunk is None:
+                self._eof = True
+            else:
+                self._chunk = chunk
+        n = min(len(buffer), len(self._chunk))
+        buffer[:n] = self._chunk[:n]
+        self._chunk = self._chunk[n:]
+        return n
 
 
 @contextmanager
 def tarfile_open(fileobj: BinaryIO):
     """Context manager to extend tarfile.open to support reading zstd compressed files.
 
-    This is only needed for Python <=3.13.
+    This is only needed for Python <=3.13. It requires ``fileobj`` to be seekable,
+    use ``_extract_stream`` to extract a sandbox while it is being read.
     """
     # Save current position and read magic bytes
     current_pos = fileobj.tell()
@@ -37,7 +241,7 @@ def tarfile_open(fileobj: BinaryIO):
     fileobj.seek(current_pos)
 
     # Read magic bytes to determine compression format
-    if magic.startswith(b"\x28\xb5\x2f\xfd"):  # zstd magic number
+    if magic.startswith(ZSTD_MAGIC):
         dctx = zstandard.ZstdDecompressor()
         with dctx.stream_reader(fileobj) as decompressor:
             with tarfile.open(fileobj=decompressor, mode="r|") as tf:
@@ -47,79 +251,165 @@ def tarfile_open(fileobj: BinaryIO):
             yield tf
 
 
-@with_client
-async def create_sandbox(paths: list[Path], *, client: AsyncDiracClient) -> str:
-    """Create a sandbox from the given paths and upload it to the storage backend.
+def _extract_members(
+    tf: tarfile.TarFile, destination: Path, created: list[Path]
+) -> None:
+    """Extract the members of ``tf`` one by one as they are read.
 
-    Any paths that are directories will be added recursively.
-    The returned value is the PFN of the sandbox in the storage backend and can
-    be used to submit jobs.
+    The paths which didn't exist before are appended to ``created``. Like for
+    ``tar``, a member replaces an existing file or directory of another type.
     """
-    with tempfile.TemporaryFile(mode="w+b") as tar_fh:
-        # Create zstd compressed tar with level 18 and long matching enabled
-        compression_params = zstandard.ZstdCompressionParameters.from_level(
-            18, enable_ldm=1
-        )
-        cctx = zstandard.ZstdCompressor(compression_params=compression_params)
-        with cctx.stream_writer(tar_fh, closefd=False) as compressor:
-            with tarfile.open(fileobj=compressor, mode="w|") as tf:
-                for path in paths:
-                    logger.debug(
-                        "Adding %s to sandbox as %s", path.resolve(), path.name
-                    )
-                    tf.add(path.resolve(), path.name, recursive=True)
-        tar_fh.seek(0)
-
-        hasher = getattr(hashlib, SANDBOX_CHECKSUM_ALGORITHM)()
-        while data := tar_fh.read(512 * 1024):
-            hasher.update(data)
-        checksum = hasher.hexdigest()
-        tar_fh.seek(0)
-        logger.debug("Sandbox checksum is %s", checksum)
-
-        sandbox_info = SandboxInfo(
-            checksum_algorithm=SANDBOX_CHECKSUM_ALGORITHM,
-            checksum=checksum,
-            size=os.stat(tar_fh.fileno()).st_size,
-            format=f"tar.{SANDBOX_COMPRESSION}",
-        )
+    for member in tf:
+        target = destination / tarfile.data_filter(member, str(destination)).name
+        path = destination
+        for part in target.relative_to(destination).parts:
+            path = path / part
+            if not os.path.lexists(path):
+                created.append(path)
+        if member.isdir():
+            if os.path.lexists(target) and not target.is_dir():
+                target.unlink()
+        elif target.is_dir() and not target.is_symlink():
+            shutil.rmtree(target)
+        tf.extract(member, path=destination, filter="data")
 
-        res = await client.jobs.initiate_sandbox_upload(sandbox_info)
-        if res.url:
-            logger.debug("Uploading sandbox for %s", res.pfn)
-            files = {"file": ("file", tar_fh)}
-            async with httpx.AsyncClient() as httpx_client:
-                response = await httpx_client.post(
-                    res.url, data=res.fields, files=files
+
+def _extract_stream(
+    fileobj: io.BufferedIOBase, destination: Path, created: list[Path] | None = None
+) -> None:
+    """Extract a tarball while reading it sequentially from ``fileobj``.
+
+    The paths created in ``destination`` are appended to ``created`` so they
+    can be removed if the extraction doesn't complete.
+    """
+    if created is None:
+        created = []
+    if fileobj.peek(4)[:4] == ZSTD_MAGIC:
+        dctx = zstandard.ZstdDecompressor()
+        with dctx.stream_reader(fileobj, read_size=SANDBOX_IO_CHUNK_SIZE) as reader:
+            with tarfile.open(fileobj=reader, mode="r|") as tf:
+                _extract_members(tf, destination, created)
+    else:
+        with tarfile.open(fileobj=fileobj, mode="r|*") as tf:
+            _extract_members(tf, destination, created)
+
+
+async def _download_chunks(
+    get_url: Callable[[], Awaitable[str]],
+    queue: asyncio.Queue,
+    *,
+    http_client: httpx.AsyncClient,
+    max_retries: int,
+) -> None:
+    """Put the content of a download in ``queue``, resuming it if interrupted.
+
+    Errors are put in the queue rather than raised so they reach the reader.
+    """
+    received = 0
+    try:
+        for attempt in range(max_retries + 1):
+            url = await get_url()
+            headers = {"Range": f"bytes={received}-"} if received else {}
+            try:
+                async with http_client.stream("GET", url, headers=headers) as response:
+                    # TODO: Handle this error better
+                    response.raise_for_status()
+                    # The server might not support range requests
+                    to_skip = received if response.status_code != 206 else 0
+                    async for chunk in response.aiter_bytes():
+                        if to_skip:
+                            chunk, to_skip = (
+                                chunk[to_skip:],
+                                max(0, to_skip - len(chunk)),
+                            )
+                        if chunk:
+                            received += len(chunk)
+                            await queue.put(chunk)
+                break
+            except httpx.TransportError as e:
+                if attempt == max_retries:
+                    raise
+                logger.warning(
+                    "Download interrupted after %d bytes, resuming (%r)", received, e
                 )
-                # TODO: Handle this error better
-                response.raise_for_status()
+    except Exception as e:
+        await queue.put(e)
+    else:
+        await queue.put(None)
 
-            logger.debug(
-                "Sandbox uploaded for %s with status code %s",
-                res.pfn,
-                response.status_code,
-            )
-        else:
-            logger.debug("%s already exists in storage backend", res.pfn)
-        return res.pfn
+
+async def _download_and_extract(
+    get_url: Callable[[], Awaitable[str]],
+    destination: Path,
+    *,
+    http_client: httpx.AsyncClient,
+    max_retries: int = SANDBOX_DOWNLOAD_MAX_RETRIES,
+) -> None:
+    """Extract a sandbox to ``destination`` while it is being downloaded.
+
+    At most SANDBOX_DOWNLOAD_MAX_BUFFERED_CHUNKS chunks are kept in memory, the
+    download waits for the extraction to catch up when it's slower.
+
+    The files appear in ``destination`` as soon as they are extracted. If the
+    download or the extraction fails the files and directories which were
+    created are removed again, the ones which were overwritten are not restored.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SANDBOX_DOWNLOAD_MAX_BUFFERED_CHUNKS)
+    reader = io.BufferedReader(
+        _QueueReader(queue, asyncio.get_running_loop()), SANDBOX_IO_CHUNK_SIZE
+    )
+    download = asyncio.create_task(
+        _download_chunks(
+            get_url, queue, http_client=http_client, max_retries=max_retries
+        )
+    )
+    created: list[Path] = [] if destination.exists() else [destination]
+    extracted = False
+    try:
+        destination.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(_extract_stream, reader, destination, created)
+        extracted = True
+    finally:
+        # The end of the archive might have been found before the end of the
+        # download, or the extraction failed
+        download.cancel()
+        with suppress(asyncio.CancelledError):
+            await download
+        # Make sure the worker thread doesn't wait forever if it's still running
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(asyncio.CancelledError())
+        if not extracted:
+            for path in reversed(created):
+                if path.is_dir() and not path.is_symlink():
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    path.unlink(missing_ok=True)
 
 
 @with_client
-async def download_sandbox(pfn: str, destination: Path, *, client: AsyncDiracClient):
-    """Download a sandbox from the storage backend to the given destination."""
-    res = await client.jobs.get_sandbox_file(pfn=pfn)
+async def download_sandbox(
+    pfn: str,
+    destination: Path,
+    *,
+    max_retries: int = SANDBOX_DOWNLOAD_MAX_RETRIES,
+    client: AsyncDiracClient,
+):
+    """Download a sandbox from the storage backend to the given destination.
+
+    The sandbox is extracted while it is being downloaded, it is never stored
+    on disk. If the download is interrupted it is resumed where it stopped, at
+    most ``max_retries`` times. The files appear in ``destination`` while it
+    is being downloaded and are removed again if it fails.
+    """
+
+    async def get_url() -> str:
+        # Each attempt gets a new URL in case the previous one expired
+        return (await client.jobs.get_sandbox_file(pfn=pfn)).url
+
     logger.debug("Downloading sandbox for %s", pfn)
-    with tempfile.TemporaryFile(mode="w+b") as fh:
-        async with httpx.AsyncClient() as http_client:
-            response = await http_client.get(res.url)
-            # TODO: Handle this error better
-            response.raise_for_status()
-            async for chunk in response.aiter_bytes():
-                fh.write(chunk)
-        fh.seek(0)
-        logger.debug("Sandbox downloaded for %s", pfn)
-
-        with tarfile_open(fh) as tf:
-            tf.extractall(path=destination, filter="data")
-        logger.debug("Extracted %s to %s", pfn, destination)
+    async with httpx.AsyncClient() as http_client:
+        await _download_and_extract(
+            get_url, destination, http_client=http_client, max_retries=max_retries
+        )
+    logger.debug("Extracted %s to %s", pfn, destination)
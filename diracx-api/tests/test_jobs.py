@@ -1,9 +1,26 @@
 from __future__ import annotations
 
+import hashlib
 import logging
 import secrets
+import tarfile
+import tempfile
+import time
 
-from diracx.api.jobs import create_sandbox, download_sandbox
+import httpx
+import pytest
+import zstandard
+
+from diracx.api import jobs as jobs_module
+from diracx.api.jobs import (
+    _compression_threads,
+    _download_and_extract,
+    _extract_stream,
+    _write_sandbox,
+    create_sandbox,
+    create_sandboxes,
+    download_sandbox,
+)
 
 
 async def test_upload_download_sandbox(tmp_path, with_cli_login, caplog):
@@ -40,6 +57,277 @@ async def test_upload_download_sandbox(tmp_path, with_cli_login, caplog):
     assert (destination / "nested.dat").is_file()
 
 
+async def test_upload_many_sandboxes(tmp_path, with_cli_login, caplog):
+    caplog.set_level(logging.DEBUG)
+
+    input_files = []
+    for i in range(3):
+        input_file = tmp_path / f"input{i}.dat"
+        input_file.write_bytes(secrets.token_bytes(512))
+        input_files.append(input_file)
+    pfn = await create_sandbox(input_files[:1])
+
+    caplog.clear()
+    pfns = await create_sandboxes([input_files[:1], input_files[1:], input_files[1:]])
+    assert pfns[0] == pfn
+    assert pfns[1] == pfns[2] != pfn
+    assert has_record(caplog.records, "diracx.api.jobs", "already exists in storage")
+
+    destination = tmp_path / "output"
+    await download_sandbox(pfns[1], destination)
+    assert sorted(p.name for p in destination.iterdir()) == ["input1.dat", "input2.dat"]
+
+
+def make_input_files(directory, size: int):
+    """Create a mix of compressible and incompressible files."""
+    directory.mkdir()
+    n_files = 8
+    for i in range(n_files):
+        if i % 2:
+            data = secrets.token_bytes(size // n_files)
+        else:
+            data = secrets.token_hex(size // n_files // 8).encode() * 4
+        (directory / f"file{i}.dat").write_bytes(data)
+    return sorted(directory.iterdir())
+
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_write_sandbox(tmp_path, fast):
+    input_files = make_input_files(tmp_path / "input", 1024 * 1024)
+
+    with tempfile.TemporaryFile(mode="w+b") as tar_fh:
+        sandbox_info = _write_sandbox(
+            input_files, tar_fh, compression_level=3, fast=fast
+        )
+        # The checksum and size match what was written
+        data = tar_fh.read()
+        assert sandbox_info.size == len(data)
+        assert sandbox_info.checksum == hashlib.sha256(data).hexdigest()
+        assert sandbox_info.format == "tar.zst"
+
+        tar_fh.seek(0)
+        _extract_stream(tar_fh, tmp_path / "output")
+    for input_file in input_files:
+        output_file = tmp_path / "output" / input_file.name
+        assert output_file.read_bytes() == input_file.read_bytes()
+
+
+@pytest.mark.parametrize(
+    "cpu_count, n_sandboxes, expected",
+    [(8, 1, 8), (8, 3, 2), (8, 16, 1), (None, 2, 1)],
+)
+def test_compression_threads(monkeypatch, cpu_count, n_sandboxes, expected):
+    # The cores are shared by the sandboxes which are compressed concurrently
+    monkeypatch.setattr(jobs_module.os, "cpu_count", lambda: cpu_count)
+    assert _compression_threads(n_sandboxes) == expected
+
+
+def write_sandbox_baseline(paths, tar_fh):
+    """The previous implementation: compress then read the tarball back."""
+    compression_params = zstandard.ZstdCompressionParameters.from_level(
+        18, enable_ldm=1
+    )
+    cctx = zstandard.ZstdCompressor(compression_params=compression_params)
+    with cctx.stream_writer(tar_fh, closefd=False) as compressor:
+        with tarfile.open(fileobj=compressor, mode="w|") as tf:
+            for path in paths:
+                tf.add(path.resolve(), path.name, recursive=True)
+    tar_fh.seek(0)
+    hasher = hashlib.sha256()
+    while data := tar_fh.read(512 * 1024):
+        hasher.update(data)
+    return hasher.hexdigest()
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("size_mb", [1, 16, 128])
+def test_benchmark_write_sandbox(tmp_path, size_mb, record_property):
+    input_files = make_input_files(tmp_path / "input", size_mb * 1024 * 1024)
+
+    def timed(func, *args, **kwargs):
+        with tempfile.TemporaryFile(mode="w+b") as tar_fh:
+            start = time.perf_counter()
+            func(input_files, tar_fh, *args, **kwargs)
+            duration = time.perf_counter() - start
+            return duration, tar_fh.seek(0, 2)
+
+    results = {
+        "baseline": timed(write_sandbox_baseline),
+        "level18": timed(_write_sandbox),
+        "level3": timed(_write_sandbox, compression_level=3),
+        "fast": timed(_write_sandbox, fast=True),
+    }
+    for name, (duration, compressed_size) in results.items():
+        record_property(f"write_sandbox_{size_mb}MB_{name}", duration)
+        print(
+            f"{size_mb:>4} MB {name:>8}: {duration:.3f}s, "
+            f"{compressed_size / 1024 / 1024:.1f} MB"
+        )
+
+
+class FlakyStream(httpx.AsyncByteStream):
+    """Response body which fails after sending ``fail_after`` bytes."""
+
+    def __init__(self, data: bytes, fail_after: int | None):
+        self.data = data
+        self.fail_after = fail_after
+
+    async def __aiter__(self):
+        chunk_size = 64 * 1024
+        for start in range(0, len(self.data), chunk_size):
+            if self.fail_after is not None and start >= self.fail_after:
+                raise httpx.ReadError("Connection reset")
+            yield self.data[start : start + chunk_size]
+
+
+def make_storage(data: bytes, *, failures: int, support_range: bool = True):
+    """Mock storage backend serving ``data``, failing the first requests."""
+    requests = []
+
+    def handler(request: httpx.Request):
+        requests.append(request)
+        fail_after = len(data) // 3 if len(requests) <= failures else None
+        range_header = request.headers.get("Range")
+        if support_range and range_header:
+            start = int(range_header.removeprefix("bytes=").removesuffix("-"))
+            return httpx.Response(206, stream=FlakyStream(data[start:], fail_after))
+        return httpx.Response(200, stream=FlakyStream(data, fail_after))
+
+    return requests, httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.fixture
+def sandbox_data(tmp_path):
+    input_files = make_input_files(tmp_path / "input", 1024 * 1024)
+    with tempfile.TemporaryFile(mode="w+b") as tar_fh:
+        _write_sandbox(input_files, tar_fh, compression_level=3)
+        tar_fh.seek(0)
+        return input_files, tar_fh.read()
+
+
+async def get_url():
+    return "https://storage.invalid/sandbox.tar.zst"
+
+
+@pytest.mark.parametrize("support_range", [True, False])
+async def test_download_and_extract(tmp_path, sandbox_data, support_range):
+    input_files, data = sandbox_data
+    requests, http_client = make_storage(data, failures=2, support_range=support_range)
+
+    async with http_client:
+        await _download_and_extract(
+            get_url, tmp_path / "output", http_client=http_client, max_retries=2
+        )
+
+    for input_file in input_files:
+        output_file = tmp_path / "output" / input_file.name
+        assert output_file.read_bytes() == input_file.read_bytes()
+    # Nothing else is left next to the destination
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["input", "output"]
+    # The download was resumed where it was interrupted
+    assert [r.headers.get("Range") for r in requests][0] is None
+    assert all(r.headers.get("Range") for r in requests[1:])
+    assert len(requests) == 3
+
+
+async def test_download_and_extract_errors(tmp_path, sandbox_data):
+    _, data = sandbox_data
+
+    # Too many failures
+    _, http_client = make_storage(data, failures=2)
+    async with http_client:
+        with pytest.raises(httpx.ReadError):
+            await _download_and_extract(
+                get_url, tmp_path / "output", http_client=http_client, max_retries=1
+            )
+
+    # Truncated archive
+    _, http_client = make_storage(data[: len(data) // 2], failures=0)
+    async with http_client:
+        with pytest.raises(tarfile.ReadError):
+            await _download_and_extract(
+                get_url, tmp_path / "output", http_client=http_client
+            )
+
+    # Errors from the storage
+    http_client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(403))
+    )
+    async with http_client:
+        with pytest.raises(httpx.HTTPStatusError):
+            await _download_and_extract(
+                get_url, tmp_path / "output", http_client=http_client
+            )
+
+    # Nothing was extracted
+    assert [p.name for p in tmp_path.iterdir()] == ["input"]
+
+
+async def test_download_and_extract_existing_destination(tmp_path, sandbox_data):
+    input_files, data = sandbox_data
+    destination = tmp_path / "output"
+    destination.mkdir()
+    (destination / "existing.dat").write_bytes(b"existing")
+    (destination / input_files[0].name).write_bytes(b"replaced")
+
+    _, http_client = make_storage(data, failures=0)
+    async with http_client:
+        await _download_and_extract(get_url, destination, http_client=http_client)
+
+    # The sandbox is extracted on top of the existing files
+    assert (destination / "existing.dat").read_bytes() == b"existing"
+    for input_file in input_files:
+        output_file = destination / input_file.name
+        assert output_file.read_bytes() == input_file.read_bytes()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["input", "output"]
+
+
+async def test_download_and_extract_replaces_other_types(tmp_path, sandbox_data):
+    input_files, data = sandbox_data
+    destination = tmp_path / "output"
+    # A directory where the sandbox has a file
+    (destination / input_files[0].name).mkdir(parents=True)
+    (destination / input_files[0].name / "nested.dat").write_bytes(b"nested")
+
+    _, http_client = make_storage(data, failures=0)
+    async with http_client:
+        await _download_and_extract(get_url, destination, http_client=http_client)
+
+    output_file = destination / input_files[0].name
+    assert output_file.read_bytes() == input_files[0].read_bytes()
+
+
+async def test_download_and_extract_partial(tmp_path, sandbox_data):
+    input_files, data = sandbox_data
+    destination = tmp_path / "output"
+    destination.mkdir()
+    (destination / "existing.dat").write_bytes(b"existing")
+
+    # The archive is cut after the first files were extracted
+    extracted = []
+    original_extract = tarfile.TarFile.extract
+
+    def extract(self, member, *args, **kwargs):
+        extracted.append(member.name)
+        # The previous files are already in the destination
+        for name in extracted[:-1]:
+            assert (destination / name).is_file()
+        return original_extract(self, member, *args, **kwargs)
+
+    _, http_client = make_storage(data[: len(data) // 2], failures=0)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(tarfile.TarFile, "extract", extract)
+        async with http_client:
+            with pytest.raises(tarfile.ReadError):
+                await _download_and_extract(
+                    get_url, destination, http_client=http_client
+                )
+    assert len(extracted) > 1
+
+    # Only the files which were extracted are removed
+    assert [p.name for p in destination.iterdir()] == ["existing.dat"]
+
+
 def has_record(records: list[logging.LogRecord], logger_name: str, message: str):
     for record in records:
         if record.name == logger_name and message in record.message:
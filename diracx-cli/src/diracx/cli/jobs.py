@@ -64,9 +64,22 @@ async def search(
     all: bool = False,
     page: int = 1,
     per_page: int = 10,
+    stream: Annotated[
+        bool,
+        Option(help="Print the jobs as newline-delimited JSON as they are received"),
+    ] = False,
 ):
     search_specs = [parse_condition(cond) for cond in condition]
     async with AsyncDiracClient() as api:
+        if stream:
+            async for job in api.jobs.search_stream(
+                parameters=None if all else parameter,
+                search=search_specs if search_specs else None,
+                page=page,
+                per_page=per_page,
+            ):
+                print(json.dumps(job))
+            return
         jobs, content_range = await api.jobs.search(
             parameters=None if all else parameter,
             search=search_specs if search_specs else None,
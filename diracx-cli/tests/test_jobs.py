@@ -88,6 +88,13 @@ async def test_search(with_cli_login, jdl_file, capfd):
     assert cap.err == ""
     assert "[]" == cap.out.strip()
 
+    # Stream the jobs as newline-delimited JSON
+    await cli.jobs.search(per_page=9999, stream=True)
+    cap = capfd.readouterr()
+    assert cap.err == ""
+    streamed_jobs = [json.loads(line) for line in cap.out.splitlines()]
+    assert streamed_jobs == jobs
+
     # Switch to RICH output
     get_diracx_preferences.cache_clear()
     os.environ["DIRACX_OUTPUT_FORMAT"] = "RICH"
@@ -42,6 +42,7 @@ from ...operations._operations import (
     build_jobs_get_job_sandbox_request,
     build_jobs_get_job_sandboxes_request,
     build_jobs_get_sandbox_file_request,
+    build_jobs_initiate_bulk_sandbox_upload_request,
     build_jobs_initiate_sandbox_upload_request,
     build_jobs_patch_metadata_request,
     build_jobs_reschedule_jobs_request,
@@ -880,7 +881,11 @@ class ConfigOperations:
         If If-None-Match header is given and matches the latest ETag, return 304
 
         If If-Modified-Since is given and is newer than latest,
-            return 304: this is to avoid flip/flopping.
+            return 304: this is to avoid flip/flopping
+
+        If A-IM contains json-patch and If-None-Match is the ETag of one of the
+        previous revisions, return 226 with the JSON patch transforming that
+        revision into the latest one.
 
         :keyword if_modified_since: Default value is None.
         :paramtype if_modified_since: str
@@ -1076,6 +1081,114 @@ class JobsOperations:
 
         return deserialized  # type: ignore
 
+    @overload
+    async def initiate_bulk_sandbox_upload(
+        self, body: List[_models.SandboxInfo], *, content_type: str = "application/json", **kwargs: Any
+    ) -> List[_models.SandboxUploadResponse]:
+        """Initiate Bulk Sandbox Upload.
+
+        Get the PFNs for the given sandboxes, initiate the uploads as required.
+
+        This is the same as ``POST /sandbox`` for many sandboxes at once, the
+        responses are returned in the same order as the request.
+
+        :param body: Required.
+        :type body: list[~_generated.models.SandboxInfo]
+        :keyword content_type: Body Parameter content-type. Content type parameter for JSON body.
+         Default value is "application/json".
+        :paramtype content_type: str
+        :return: list of SandboxUploadResponse
+        :rtype: list[~_generated.models.SandboxUploadResponse]
+        :raises ~azure.core.exceptions.HttpResponseError:
+        """
+
+    @overload
+    async def initiate_bulk_sandbox_upload(
+        self, body: IO[bytes], *, content_type: str = "application/json", **kwargs: Any
+    ) -> List[_models.SandboxUploadResponse]:
+        """Initiate Bulk Sandbox Upload.
+
+        Get the PFNs for the given sandboxes, initiate the uploads as required.
+
+        This is the same as ``POST /sandbox`` for many sandboxes at once, the
+        responses are returned in the same order as the request.
+
+        :param body: Required.
+        :type body: IO[bytes]
+        :keyword content_type: Body Parameter content-type. Content type parameter for binary body.
+         Default value is "application/json".
+        :paramtype content_type: str
+        :return: list of SandboxUploadResponse
+        :rtype: list[~_generated.models.SandboxUploadResponse]
+        :raises ~azure.core.exceptions.HttpResponseError:
+        """
+
+    @distributed_trace_async
+    async def initiate_bulk_sandbox_upload(
+        self, body: Union[List[_models.SandboxInfo], IO[bytes]], **kwargs: Any
+    ) -> List[_models.SandboxUploadResponse]:
+        """Initiate Bulk Sandbox Upload.
+
+        Get the PFNs for the given sandboxes, initiate the uploads as required.
+
+        This is the same as ``POST /sandbox`` for many sandboxes at once, the
+        responses are returned in the same order as the request.
+
+        :param body: Is either a [SandboxInfo] type or a IO[bytes] type. Required.
+        :type body: list[~_generated.models.SandboxInfo] or IO[bytes]
+        :return: list of SandboxUploadResponse
+        :rtype: list[~_generated.models.SandboxUploadResponse]
+        :raises ~azure.core.exceptions.HttpResponseError:
+        """
+        error_map: MutableMapping = {
+            401: ClientAuthenticationError,
+            404: ResourceNotFoundError,
+            409: ResourceExistsError,
+            304: ResourceNotModifiedError,
+        }
+        error_map.update(kwargs.pop("error_map", {}) or {})
+
+        _headers = case_insensitive_dict(kwargs.pop("headers", {}) or {})
+        _params = kwargs.pop("params", {}) or {}
+
+        content_type: Optional[str] = kwargs.pop("content_type", _headers.pop("Content-Type", None))
+        cls: ClsType[List[_models.SandboxUploadResponse]] = kwargs.pop("cls", None)
+
+        content_type = content_type or "application/json"
+        _json = None
+        _content = None
+        if isinstance(body, (IOBase, bytes)):
+            _content = body
+        else:
+            _json = self._serialize.body(body, "[SandboxInfo]")
+
+        _request = build_jobs_initiate_bulk_sandbox_upload_request(
+            content_type=content_type,
+            json=_json,
+            content=_content,
+            headers=_headers,
+            params=_params,
+        )
+        _request.url = self._client.format_url(_request.url)
+
+        _stream = False
+        pipeline_response: PipelineResponse = await self._client._pipeline.run(  # pylint: disable=protected-access
+            _request, stream=_stream, **kwargs
+        )
+
+        response = pipeline_response.http_response
+
+        if response.status_code not in [200]:
+            map_error(status_code=response.status_code, response=response, error_map=error_map)
+            raise HttpResponseError(response=response)
+
+        deserialized = self._deserialize("[SandboxUploadResponse]", pipeline_response.http_response)
+
+        if cls:
+            return cls(pipeline_response, deserialized, {})  # type: ignore
+
+        return deserialized  # type: ignore
+
     @distributed_trace_async
     async def get_sandbox_file(self, *, pfn: str, **kwargs: Any) -> _models.SandboxDownloadResponse:
         """Get Sandbox File.
@@ -1925,6 +2038,9 @@ class JobsOperations:
         *,
         page: int = 1,
         per_page: int = 100,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None,
+        count_strategy: Union[str, _models.CountStrategy] = "exact",
         content_type: str = "application/json",
         **kwargs: Any
     ) -> List[Dict[str, Any]]:
@@ -1943,12 +2059,50 @@ class JobsOperations:
         By default, the search will return all jobs the user has access to, and all the fields
         of the job will be returned.
 
+        **Pagination**
+
+
+        * By default, pages are selected with ``page`` and ``per_page`` and the
+          ``Content-Range`` header gives the position of the page among all the jobs.
+        * When paging deep into the results, pass an empty ``cursor`` to get the first
+          page and then the value of the ``X-Next-Cursor`` response header to get the
+          following ones. This header is absent on the last page. In this mode,
+          the total number of jobs is given in the ``X-Total-Count`` header of the
+          first page, ``include_total`` can be used to request it for the other pages
+          or to skip it.
+
+        **Total**
+
+
+        * Counting all the matching jobs can be expensive, ``count_strategy`` selects
+          how the total is obtained: ``exact`` (default) counts the jobs, ``estimated``
+          uses the estimate of the database and ``cached`` reuses the total of the same
+          search if it was computed recently. The strategy which actually produced
+          the total is given in the ``X-Count-Strategy`` header: when no estimate or
+          recent total is available the jobs are counted.
+
+        **Streaming**
+
+
+        * With ``Accept: application/x-ndjson`` the jobs are sent as newline-delimited
+          JSON while they are read from the database instead of being loaded all at
+          once, which allows to retrieve large pages (up to ``per_page=10000``\\ ) with
+          a bounded memory usage. The total is given in the ``X-Total-Count`` header
+          unless ``include_total=false``. This is not supported together with ``cursor``.
+
         :param body: Default value is None.
         :type body: ~_generated.models.SearchParams
         :keyword page: Default value is 1.
         :paramtype page: int
         :keyword per_page: Default value is 100.
         :paramtype per_page: int
+        :keyword cursor: Default value is None.
+        :paramtype cursor: str
+        :keyword include_total: Default value is None.
+        :paramtype include_total: bool
+        :keyword count_strategy: Known values are: "exact", "estimated", and "cached". Default value
+         is "exact".
+        :paramtype count_strategy: str or ~_generated.models.CountStrategy
         :keyword content_type: Body Parameter content-type. Content type parameter for JSON body.
          Default value is "application/json".
         :paramtype content_type: str
@@ -1964,6 +2118,9 @@ class JobsOperations:
         *,
         page: int = 1,
         per_page: int = 100,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None,
+        count_strategy: Union[str, _models.CountStrategy] = "exact",
         content_type: str = "application/json",
         **kwargs: Any
     ) -> List[Dict[str, Any]]:
@@ -1982,12 +2139,50 @@ class JobsOperations:
         By default, the search will return all jobs the user has access to, and all the fields
         of the job will be returned.
 
+        **Pagination**
+
+
+        * By default, pages are selected with ``page`` and ``per_page`` and the
+          ``Content-Range`` header gives the position of the page among all the jobs.
+        * When paging deep into the results, pass an empty ``cursor`` to get the first
+          page and then the value of the ``X-Next-Cursor`` response header to get the
+          following ones. This header is absent on the last page. In this mode,
+          the total number of jobs is given in the ``X-Total-Count`` header of the
+          first page, ``include_total`` can be used to request it for the other pages
+          or to skip it.
+
+        **Total**
+
+
+        * Counting all the matching jobs can be expensive, ``count_strategy`` selects
+          how the total is obtained: ``exact`` (default) counts the jobs, ``estimated``
+          uses the estimate of the database and ``cached`` reuses the total of the same
+          search if it was computed recently. The strategy which actually produced
+          the total is given in the ``X-Count-Strategy`` header: when no estimate or
+          recent total is available the jobs are counted.
+
+        **Streaming**
+
+
+        * With ``Accept: application/x-ndjson`` the jobs are sent as newline-delimited
+          JSON while they are read from the database instead of being loaded all at
+          once, which allows to retrieve large pages (up to ``per_page=10000``\\ ) with
+          a bounded memory usage. The total is given in the ``X-Total-Count`` header
+          unless ``include_total=false``. This is not supported together with ``cursor``.
+
         :param body: Default value is None.
         :type body: IO[bytes]
         :keyword page: Default value is 1.
         :paramtype page: int
         :keyword per_page: Default value is 100.
         :paramtype per_page: int
+        :keyword cursor: Default value is None.
+        :paramtype cursor: str
+        :keyword include_total: Default value is None.
+        :paramtype include_total: bool
+        :keyword count_strategy: Known values are: "exact", "estimated", and "cached". Default value
+         is "exact".
+        :paramtype count_strategy: str or ~_generated.models.CountStrategy
         :keyword content_type: Body Parameter content-type. Content type parameter for binary body.
          Default value is "application/json".
         :paramtype content_type: str
@@ -2003,6 +2198,9 @@ class JobsOperations:
         *,
         page: int = 1,
         per_page: int = 100,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None,
+        count_strategy: Union[str, _models.CountStrategy] = "exact",
         **kwargs: Any
     ) -> List[Dict[str, Any]]:
         """Search.
@@ -2020,12 +2218,50 @@ class JobsOperations:
         By default, the search will return all jobs the user has access to, and all the fields
         of the job will be returned.
 
+        **Pagination**
+
+
+        * By default, pages are selected with ``page`` and ``per_page`` and the
+          ``Content-Range`` header gives the position of the page among all the jobs.
+        * When paging deep into the results, pass an empty ``cursor`` to get the first
+          page and then the value of the ``X-Next-Cursor`` response header to get the
+          following ones. This header is absent on the last page. In this mode,
+          the total number of jobs is given in the ``X-Total-Count`` header of the
+          first page, ``include_total`` can be used to request it for the other pages
+          or to skip it.
+
+        **Total**
+
+
+        * Counting all the matching jobs can be expensive, ``count_strategy`` selects
+          how the total is obtained: ``exact`` (default) counts the jobs, ``estimated``
+          uses the estimate of the database and ``cached`` reuses the total of the same
+          search if it was computed recently. The strategy which actually produced
+          the total is given in the ``X-Count-Strategy`` header: when no estimate or
+          recent total is available the jobs are counted.
+
+        **Streaming**
+
+
+        * With ``Accept: application/x-ndjson`` the jobs are sent as newline-delimited
+          JSON while they are read from the database instead of being loaded all at
+          once, which allows to retrieve large pages (up to ``per_page=10000``\\ ) with
+          a bounded memory usage. The total is given in the ``X-Total-Count`` header
+          unless ``include_total=false``. This is not supported together with ``cursor``.
+
         :param body: Is either a SearchParams type or a IO[bytes] type. Default value is None.
         :type body: ~_generated.models.SearchParams or IO[bytes]
         :keyword page: Default value is 1.
         :paramtype page: int
         :keyword per_page: Default value is 100.
         :paramtype per_page: int
+        :keyword cursor: Default value is None.
+        :paramtype cursor: str
+        :keyword include_total: Default value is None.
+        :paramtype include_total: bool
+        :keyword count_strategy: Known values are: "exact", "estimated", and "cached". Default value
+         is "exact".
+        :paramtype count_strategy: str or ~_generated.models.CountStrategy
         :return: list of dict mapping str to any
         :rtype: list[dict[str, any]]
         :raises ~azure.core.exceptions.HttpResponseError:
@@ -2058,6 +2294,9 @@ class JobsOperations:
         _request = build_jobs_search_request(
             page=page,
             per_page=per_page,
+            cursor=cursor,
+            include_total=include_total,
+            count_strategy=count_strategy,
             content_type=content_type,
             json=_json,
             content=_content,
@@ -2078,8 +2317,14 @@ class JobsOperations:
             raise HttpResponseError(response=response)
 
         response_headers = {}
+        if response.status_code == 200:
+            response_headers["X-Next-Cursor"] = self._deserialize("str", response.headers.get("X-Next-Cursor"))
+            response_headers["X-Total-Count"] = self._deserialize("int", response.headers.get("X-Total-Count"))
+            response_headers["X-Count-Strategy"] = self._deserialize("str", response.headers.get("X-Count-Strategy"))
+
         if response.status_code == 206:
             response_headers["Content-Range"] = self._deserialize("str", response.headers.get("Content-Range"))
+            response_headers["X-Count-Strategy"] = self._deserialize("str", response.headers.get("X-Count-Strategy"))
 
         deserialized = self._deserialize("[{object}]", pipeline_response.http_response)
 
@@ -14,6 +14,14 @@ class ChecksumAlgorithm(str, Enum, metaclass=CaseInsensitiveEnumMeta):
     SHA256 = "sha256"
 
 
+class CountStrategy(str, Enum, metaclass=CaseInsensitiveEnumMeta):
+    """How the total number of results of a search is obtained."""
+
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    CACHED = "cached"
+
+
 class JobStatus(str, Enum, metaclass=CaseInsensitiveEnumMeta):
     """JobStatus."""
 
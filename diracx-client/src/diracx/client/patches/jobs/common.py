@@ -10,14 +10,30 @@ __all__ = [
     "make_summary_body",
     "SummaryKwargs",
     "prepare_body_for_patch",
+    "prepare_search_stream_request",
+    "NDJSONDecoder",
+    "NDJSON_MEDIA_TYPE",
+    "SEARCH_STREAM_ERROR_MAP",
 ]
 
 import json
 from io import BytesIO, IOBase
 from typing import Any, IO, Dict, TypedDict, Union, Unpack, cast, Literal
 
+from azure.core.exceptions import ClientAuthenticationError, ResourceNotFoundError
+from azure.core.rest import HttpRequest
+
 from diracx.core.models import SearchSpec
 
+from ..._generated.operations._operations import build_jobs_search_request
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+SEARCH_STREAM_ERROR_MAP = {
+    401: ClientAuthenticationError,
+    404: ResourceNotFoundError,
+}
+
 
 class ResponseExtra(TypedDict, total=False):
     content_type: str
@@ -35,6 +51,9 @@ class SearchBody(TypedDict, total=False):
 class SearchExtra(ResponseExtra, total=False):
     page: int
     per_page: int
+    cursor: str
+    include_total: bool
+    count_strategy: str
 
 
 class SearchKwargs(SearchBody, SearchExtra): ...
@@ -60,6 +79,43 @@ def make_search_body(**kwargs: Unpack[SearchKwargs]) -> UnderlyingSearchArgs:
     return result
 
 
+def prepare_search_stream_request(
+    format_url, **kwargs: Unpack[SearchKwargs]
+) -> HttpRequest:
+    """Build a search request asking for the jobs as newline-delimited JSON."""
+    args = make_search_body(**kwargs)
+    request = build_jobs_search_request(
+        page=args.pop("page", 1),  # type: ignore[typeddict-item]
+        per_page=args.pop("per_page", 100),  # type: ignore[typeddict-item]
+        cursor=args.pop("cursor", None),  # type: ignore[typeddict-item]
+        include_total=args.pop("include_total", None),  # type: ignore[typeddict-item]
+        count_strategy=args.pop("count_strategy", "exact"),  # type: ignore[typeddict-item]
+        content_type=args.pop("content_type", "application/json"),
+        content=args.pop("body"),
+        headers={**args.pop("headers", {}), "Accept": NDJSON_MEDIA_TYPE},
+        params=args.pop("params", {}),
+    )
+    request.url = format_url(request.url)
+    return request
+
+
+class NDJSONDecoder:
+    """Incrementally decode newline-delimited JSON from chunks of bytes."""
+
+    def __init__(self) -> None:
+        self._buffer = b""
+
+    def feed(self, chunk: bytes) -> list[Any]:
+        """Return the documents which are complete once ``chunk`` is added."""
+        *lines, self._buffer = (self._buffer + chunk).split(b"\n")
+        return [json.loads(line) for line in lines if line.strip()]
+
+    def close(self) -> list[Any]:
+        """Return the last document if the stream doesn't end with a newline."""
+        buffer, self._buffer = self._buffer, b""
+        return [json.loads(buffer)] if buffer.strip() else []
+
+
 class SummaryBody(TypedDict, total=False):
     grouping: list[str]
     search: list[SearchSpec]
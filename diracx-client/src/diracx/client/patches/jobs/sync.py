@@ -11,13 +11,25 @@ __all__ = [
     "JobsOperations",
 ]
 
+from collections.abc import Iterator
 from typing import IO, Any, Dict, Union, Unpack, cast
 
+from azure.core.exceptions import HttpResponseError, map_error
+from azure.core.pipeline import PipelineResponse
 from azure.core.tracing.decorator import distributed_trace
 
 from ..._generated.operations._operations import JobsOperations as _JobsOperations
 from diracx.client._generated.models._models import JobMetaData
-from .common import make_search_body, make_summary_body, SearchKwargs, SummaryKwargs, prepare_body_for_patch
+from .common import (
+    NDJSONDecoder,
+    SEARCH_STREAM_ERROR_MAP,
+    SearchKwargs,
+    SummaryKwargs,
+    make_search_body,
+    make_summary_body,
+    prepare_body_for_patch,
+    prepare_search_stream_request,
+)
 
 # We're intentionally ignoring overrides here because we want to change the interface.
 # mypy: disable-error-code=override
@@ -29,6 +41,29 @@ class JobsOperations(_JobsOperations):
         """TODO"""
         return super().search(**make_search_body(**kwargs))
 
+    def search_stream(self, **kwargs: Unpack[SearchKwargs]) -> Iterator[dict[str, Any]]:
+        """Search for jobs, yielding them as they are received.
+
+        This accepts the same arguments as ``search`` but the jobs are streamed
+        as newline-delimited JSON so large pages don't need to be held in memory.
+        """
+        request = prepare_search_stream_request(self._client.format_url, **kwargs)
+        pipeline_response: PipelineResponse = self._client._pipeline.run(  # pylint: disable=protected-access
+            request, stream=True
+        )
+        response = pipeline_response.http_response
+        if response.status_code != 200:
+            response.read()
+            map_error(status_code=response.status_code, response=response, error_map=SEARCH_STREAM_ERROR_MAP)
+            raise HttpResponseError(response=response)
+
+        decoder = NDJSONDecoder()
+        for chunk in response.iter_bytes():
+            for job in decoder.feed(chunk):
+                yield job
+        for job in decoder.close():
+            yield job
+
     @distributed_trace
     def summary(self, **kwargs: Unpack[SummaryKwargs]) -> list[dict[str, Any]]:
         """TODO"""
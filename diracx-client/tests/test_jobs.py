@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+# The patches can only be imported once the generated client is initialised
+import diracx.client.aio  # noqa: F401
+from diracx.client.patches.jobs.common import NDJSONDecoder
+
+JOBS = [{"JobID": i, "Status": "Received", "LoggingInfo": []} for i in range(1, 6)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_ndjson_decoder(chunk_size, trailing_newline):
+    payload = "\n".join(json.dumps(job) for job in JOBS).encode()
+    if trailing_newline:
+        payload += b"\n"
+
+    decoder = NDJSONDecoder()
+    jobs = []
+    for i in range(0, len(payload), chunk_size):
+        jobs.extend(decoder.feed(payload[i : i + chunk_size]))
+    jobs.extend(decoder.close())
+    assert jobs == JOBS
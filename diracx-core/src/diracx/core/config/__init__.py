@@ -7,6 +7,7 @@ from .sources import (
     ConfigSource,
     ConfigSourceUrl,
     LocalGitConfigSource,
+    ObjectStoreGitConfigSource,
     RemoteGitConfigSource,
     is_running_in_async_context,
 )
@@ -16,6 +17,7 @@ __all__ = (
     "ConfigSource",
     "ConfigSourceUrl",
     "LocalGitConfigSource",
+    "ObjectStoreGitConfigSource",
     "RemoteGitConfigSource",
     "is_running_in_async_context",
 )
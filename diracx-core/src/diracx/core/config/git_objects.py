@@ -0,0 +1,323 @@
+"""Minimal reader for the object store of a local git repository.
+
+This allows the configuration to be read without starting any ``git``
+subprocess. Only what is needed for that is supported: resolving references
+(loose or packed) and reading objects, either loose or from version 2 pack
+files (including deltified objects). Alternates and SHA-256 repositories are
+not supported.
+"""
+
+from __future__ import annotations
+
+__all__ = ("GitObjectNotFoundError", "GitObjectStore")
+
+import mmap
+import re
+import struct
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+
+OBJ_COMMIT = 1
+OBJ_TREE = 2
+OBJ_BLOB = 3
+OBJ_TAG = 4
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+OBJECT_TYPES = {
+    b"commit": OBJ_COMMIT,
+    b"tree": OBJ_TREE,
+    b"blob": OBJ_BLOB,
+    b"tag": OBJ_TAG,
+}
+
+PACK_IDX_HEADER = b"\xfftOc\x00\x00\x00\x02"
+# Amount of compressed data given to zlib at once when reading from a pack
+PACK_READ_SIZE = 64 * 1024
+# Same limit as git for following symbolic references
+MAX_SYMREF_DEPTH = 5
+
+HEXSHA_RE = re.compile(r"[0-9a-f]{40}")
+
+
+class GitObjectNotFoundError(LookupError):
+    """The requested reference or object doesn't exist."""
+
+
+def _read_size(data: bytes, pos: int) -> tuple[int, int]:
+    """Decode a size from a delta header, return it with the new position."""
+    size = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        size |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return size, pos
+
+
+def _apply_delta(base: bytes, delta: bytes) -> bytes:
+    """Rebuild an object from its base and the delta from a pack file."""
+    base_size, pos = _read_size(delta, 0)
+    result_size, pos = _read_size(delta, pos)
+    if base_size != len(base):
+        raise ValueError("Delta doesn't apply to the given base object")
+    result = bytearray()
+    while pos < len(delta):
+        opcode = delta[pos]
+        pos += 1
+        if opcode & 0x80:
+            # Copy a range of the base object
+            offset = size = 0
+            for i in range(4):
+                if opcode & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if opcode & (0x10 << i):
+                    size |= delta[pos] << (8 * i)
+                    pos += 1
+            result += base[offset : offset + (size or 0x10000)]
+        elif opcode:
+            # Insert new data
+            result += delta[pos : pos + opcode]
+            pos += opcode
+        else:
+            raise ValueError("Invalid delta opcode")
+    if len(result) != result_size:
+        raise ValueError("Delta produced an object of the wrong size")
+    return bytes(result)
+
+
+class _Pack:
+    """A pack file and its (version 2) index, both memory mapped."""
+
+    def __init__(self, idx_path: Path):
+        with open(idx_path, "rb") as fh:
+            self._idx = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(idx_path.with_suffix(".pack"), "rb") as fh:
+            self._pack = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._idx[: len(PACK_IDX_HEADER)] != PACK_IDX_HEADER:
+            raise ValueError(f"Unsupported pack index format for {idx_path}")
+        self._fanout = struct.unpack_from(">256I", self._idx, len(PACK_IDX_HEADER))
+        n_objects = self._fanout[-1]
+        self._names_start = len(PACK_IDX_HEADER) + 256 * 4
+        # The names are followed by the CRC32s, the offsets and the large offsets
+        self._offsets_start = self._names_start + 24 * n_objects
+        self._large_offsets_start = self._offsets_start + 4 * n_objects
+
+    def find(self, sha: bytes) -> int | None:
+        """Return the offset of an object in the pack, None if it isn't there."""
+        lo = self._fanout[sha[0] - 1] if sha[0] else 0
+        hi = self._fanout[sha[0]]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self._names_start + 20 * mid
+            name = self._idx[start : start + 20]
+            if name < sha:
+                lo = mid + 1
+            elif name > sha:
+                hi = mid
+            else:
+                (offset,) = struct.unpack_from(
+                    ">I", self._idx, self._offsets_start + 4 * mid
+                )
+                if offset & 0x80000000:
+                    (offset,) = struct.unpack_from(
+                        ">Q",
+                        self._idx,
+                        self._large_offsets_start + 8 * (offset & 0x7FFFFFFF),
+                    )
+                return offset
+        return None
+
+    def read(self, offset: int, store: GitObjectStore) -> tuple[int, bytes]:
+        """Read the object at the given offset, resolving deltas if needed."""
+        byte = self._pack[offset]
+        obj_type = (byte >> 4) & 0x7
+        size = byte & 0x0F
+        shift = 4
+        pos = offset + 1
+        while byte & 0x80:
+            byte = self._pack[pos]
+            pos += 1
+            size |= (byte & 0x7F) << shift
+            shift += 7
+
+        if obj_type == OBJ_OFS_DELTA:
+            byte = self._pack[pos]
+            pos += 1
+            base_distance = byte & 0x7F
+            while byte & 0x80:
+                byte = self._pack[pos]
+                pos += 1
+                base_distance = ((base_distance + 1) << 7) | (byte & 0x7F)
+            base_type, base = self.read(offset - base_distance, store)
+            return base_type, _apply_delta(base, self._decompress(pos, size))
+        if obj_type == OBJ_REF_DELTA:
+            base_type, base = store.read_object(self._pack[pos : pos + 20].hex())
+            return base_type, _apply_delta(base, self._decompress(pos + 20, size))
+        return obj_type, self._decompress(pos, size)
+
+    def _decompress(self, pos: int, size: int) -> bytes:
+        decompressor = zlib.decompressobj()
+        chunks = []
+        view = memoryview(self._pack)
+        try:
+            while not decompressor.eof:
+                chunk = view[pos : pos + PACK_READ_SIZE]
+                if not chunk:
+                    raise ValueError("Truncated pack file")
+                chunks.append(decompressor.decompress(chunk))
+                pos += PACK_READ_SIZE
+        finally:
+            view.release()
+        data = b"".join(chunks)
+        if len(data) != size:
+            raise ValueError("Object from the pack file has the wrong size")
+        return data
+
+
+class GitObjectStore:
+    """Read references and objects from a local git repository.
+
+    The pack files are memory mapped the first time they are needed, new ones
+    are found when an object can't be found in the known ones (e.g. after a
+    ``git gc``). Instances aren't thread safe.
+    """
+
+    def __init__(self, path: Path):
+        git_dir = path / ".git"
+        if git_dir.is_file():
+            # e.g. submodules
+            git_dir = path / git_dir.read_text().removeprefix("gitdir:").strip()
+        elif not git_dir.is_dir():
+            # Bare repository
+            git_dir = path
+        if not (git_dir / "objects").is_dir() or not (git_dir / "HEAD").is_file():
+            raise ValueError(f"{path} is not a valid git repository")
+        self.git_dir = git_dir
+        self._packs: dict[Path, _Pack] = {}
+        self._packed_refs: dict[str, str] = {}
+        self._packed_refs_mtime: int | None = None
+
+    def resolve(self, name: str) -> str:
+        """Find the commit a reference points to, like ``git rev-parse``."""
+        candidates = [f"refs/{name}"] + [
+            f"refs/{kind}/{name}" for kind in ("tags", "heads", "remotes")
+        ]
+        if name == "HEAD" or name.startswith("refs/"):
+            candidates.insert(0, name)
+        for ref in candidates:
+            if (hexsha := self._read_ref(ref)) is not None:
+                return self._peel(hexsha)
+        if HEXSHA_RE.fullmatch(name):
+            return self._peel(name)
+        raise GitObjectNotFoundError(f"Unknown revision {name!r}")
+
+    def commit_time(self, hexsha: str) -> datetime:
+        """Return the committer date of a commit."""
+        for line in self._read_typed(hexsha, OBJ_COMMIT).split(b"\n"):
+            if line.startswith(b"committer "):
+                # committer <name> <<email>> <timestamp> <timezone>
+                timestamp = int(line.rsplit(b" ", 2)[1])
+                return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+            if not line:
+                break
+        raise ValueError(f"Commit {hexsha} has no committer")
+
+    def read_file(self, hexsha: str, path: str) -> bytes:
+        """Return the content of a file in a commit, like ``git show <sha>:<path>``."""
+        header = self._read_typed(hexsha, OBJ_COMMIT).split(b"\n", 1)[0]
+        if not header.startswith(b"tree "):
+            raise ValueError(f"Commit {hexsha} has no tree")
+        object_sha = header[5:].decode()
+        for name in path.split("/"):
+            object_sha = self._tree_entry(object_sha, name.encode())
+        return self._read_typed(object_sha, OBJ_BLOB)
+
+    def read_object(self, hexsha: str) -> tuple[int, bytes]:
+        """Return the type and the content of an object."""
+        loose_path = self.git_dir / "objects" / hexsha[:2] / hexsha[2:]
+        try:
+            raw = zlib.decompress(loose_path.read_bytes())
+        except FileNotFoundError:
+            pass
+        else:
+            header, _, data = raw.partition(b"\0")
+            obj_type, size = header.split(b" ")
+            if int(size) != len(data):
+                raise ValueError(f"Loose object {hexsha} has the wrong size")
+            return OBJECT_TYPES[obj_type], data
+
+        sha = bytes.fromhex(hexsha)
+        for refresh in (False, True):
+            for pack in self._get_packs(refresh):
+                if (offset := pack.find(sha)) is not None:
+                    return pack.read(offset, self)
+        raise GitObjectNotFoundError(f"Unknown object {hexsha}")
+
+    def _read_typed(self, hexsha: str, expected_type: int) -> bytes:
+        obj_type, data = self.read_object(hexsha)
+        if obj_type != expected_type:
+            raise ValueError(f"Object {hexsha} has the wrong type ({obj_type})")
+        return data
+
+    def _tree_entry(self, tree_sha: str, name: bytes) -> str:
+        data = self._read_typed(tree_sha, OBJ_TREE)
+        pos = 0
+        # Each entry is "<mode> <name>\0<20 bytes sha>"
+        while pos < len(data):
+            name_end = data.index(b"\0", pos)
+            entry_name = data[data.index(b" ", pos) + 1 : name_end]
+            if entry_name == name:
+                return data[name_end + 1 : name_end + 21].hex()
+            pos = name_end + 21
+        raise GitObjectNotFoundError(f"{name.decode()} not found in tree {tree_sha}")
+
+    def _peel(self, hexsha: str) -> str:
+        """Follow annotated tags until a commit is found."""
+        obj_type, data = self.read_object(hexsha)
+        while obj_type == OBJ_TAG:
+            hexsha = data.split(b"\n", 1)[0].removeprefix(b"object ").decode()
+            obj_type, data = self.read_object(hexsha)
+        if obj_type != OBJ_COMMIT:
+            raise ValueError(f"{hexsha} is not a commit")
+        return hexsha
+
+    def _read_ref(self, ref: str) -> str | None:
+        for _ in range(MAX_SYMREF_DEPTH):
+            try:
+                value = (self.git_dir / ref).read_text().strip()
+            except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+                return self._get_packed_refs().get(ref)
+            if not value.startswith("ref:"):
+                return value
+            ref = value.removeprefix("ref:").strip()
+        raise ValueError(f"Too many levels of symbolic references for {ref}")
+
+    def _get_packed_refs(self) -> dict[str, str]:
+        path = self.git_dir / "packed-refs"
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        if mtime != self._packed_refs_mtime:
+            packed_refs = {}
+            for line in path.read_text().splitlines():
+                # Skip the header and the peeled values of tags
+                if line and line[0] not in "#^":
+                    hexsha, ref = line.split(" ", 1)
+                    packed_refs[ref] = hexsha
+            self._packed_refs = packed_refs
+            self._packed_refs_mtime = mtime
+        return self._packed_refs
+
+    def _get_packs(self, refresh: bool) -> list[_Pack]:
+        if refresh:
+            idx_paths = set((self.git_dir / "objects" / "pack").glob("*.idx"))
+            self._packs = {
+                idx_path: self._packs.get(idx_path) or _Pack(idx_path)
+                for idx_path in idx_paths
+            }
+        return list(self._packs.values())
@@ -0,0 +1,133 @@
+"""Lookup tables derived from the configuration.
+
+The configuration is immutable, so anything computed from it can be reused
+for as long as the same revision is served. ``ConfigIndex`` holds the
+structures which would otherwise be rebuilt for each request or job, it is
+available as ``Config.index``.
+"""
+
+from __future__ import annotations
+
+__all__ = ("ConfigIndex",)
+
+from collections.abc import Mapping
+from functools import cached_property, partial
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any
+
+from ..properties import SecurityProperty
+
+if TYPE_CHECKING:
+    from .schema import Config
+
+
+class ConfigIndex:
+    """Read-only lookup tables for a given Config, built when first needed."""
+
+    def __init__(self, config: Config):
+        self.config = config
+
+    def __eq__(self, other: object) -> bool:
+        # The index is derived from the config, it mustn't change how configs
+        # are compared
+        return isinstance(other, ConfigIndex)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    @cached_property
+    def subs_by_preferred_username(self) -> Mapping[str, Mapping[str, str]]:
+        """Mapping of vo -> preferred username -> sub."""
+        subs_by_vo = {}
+        for vo, registry in self.config.Registry.items():
+            subs: dict[str, str] = {}
+            for sub, user in registry.Users.items():
+                subs.setdefault(user.PreferedUsername, sub)
+            subs_by_vo[vo] = MappingProxyType(subs)
+        return MappingProxyType(subs_by_vo)
+
+    @cached_property
+    def user_groups(self) -> Mapping[str, Mapping[str, tuple[str, ...]]]:
+        """Mapping of vo -> sub -> groups the user is a member of."""
+        groups_by_vo = {}
+        for vo, registry in self.config.Registry.items():
+            groups: dict[str, list[str]] = {}
+            for group, group_config in registry.Groups.items():
+                for sub in group_config.Users:
+                    groups.setdefault(sub, []).append(group)
+            groups_by_vo[vo] = MappingProxyType(
+                {sub: tuple(names) for sub, names in groups.items()}
+            )
+        return MappingProxyType(groups_by_vo)
+
+    @cached_property
+    def user_properties(
+        self,
+    ) -> Mapping[str, Mapping[str, frozenset[SecurityProperty]]]:
+        """Mapping of vo -> sub -> properties of all the groups of the user."""
+        properties_by_vo = {}
+        for vo, user_groups in self.user_groups.items():
+            registry = self.config.Registry[vo]
+            properties_by_vo[vo] = MappingProxyType(
+                {
+                    sub: frozenset().union(
+                        *(registry.Groups[group].Properties for group in groups)
+                    )
+                    for sub, groups in user_groups.items()
+                }
+            )
+        return MappingProxyType(properties_by_vo)
+
+    @cached_property
+    def job_manifest_configs(self) -> Mapping[str, Mapping[str, Any]]:
+        """Mapping of vo -> configuration for DIRACCommon's JobManifest."""
+        configs = {}
+        for vo, operations in self.config.Operations.items():
+            job_desc = operations.JobDescription
+            configs[vo] = MappingProxyType(
+                {
+                    "defaultForGroup": MappingProxyType(
+                        {
+                            "CPUTime": job_desc.DefaultCPUTime,
+                            "Priority": job_desc.DefaultPriority,
+                        }
+                    ),
+                    "minForGroup": MappingProxyType(
+                        {
+                            "CPUTime": job_desc.MinCPUTime,
+                            "Priority": job_desc.MinPriority,
+                        }
+                    ),
+                    "maxForGroup": MappingProxyType(
+                        {
+                            "CPUTime": job_desc.MaxCPUTime,
+                            "Priority": job_desc.MaxPriority,
+                        }
+                    ),
+                    "allowedJobTypesForGroup": tuple(job_desc.AllowedJobTypes),
+                    "maxInputData": job_desc.MaxInputData,
+                }
+            )
+        return MappingProxyType(configs)
+
+    @cached_property
+    def check_and_prepare_job_configs(self) -> Mapping[str, Mapping[str, Any]]:
+        """Mapping of vo -> configuration for DIRACCommon's checkAndPrepareJob."""
+        # Avoid a circular import, the resources depend on the config
+        from ..resources import find_compatible_platforms
+
+        get_dirac_platform = partial(find_compatible_platforms, config=self.config)
+        return MappingProxyType(
+            {
+                vo: MappingProxyType(
+                    {
+                        "inputDataPolicyForVO": operations.InputDataPolicy.InputDataModule,
+                        "softwareDistModuleForVO": operations.SoftwareDistModule,
+                        "defaultCPUTimeForOwnerGroup": (
+                            operations.JobDescription.DefaultCPUTime
+                        ),
+                        "getDIRACPlatform": get_dirac_platform,
+                    }
+                )
+                for vo, operations in self.config.Operations.items()
+            }
+        )
@@ -17,6 +17,7 @@ from pydantic.functional_serializers import PlainSerializer
 
 from ..properties import SecurityProperty
 from ..utils import recursive_merge
+from .index import ConfigIndex
 
 # By default the serialization of set doesn't have a well defined ordering so
 # we have to use a custom type to make sure the values are always sorted.
@@ -116,7 +117,8 @@ class RegistryConfig(BaseModel):
     def sub_from_preferred_username(self, preferred_username: str) -> str:
         """Get the user sub from the preferred username.
 
-        TODO: This could easily be cached or optimised
+        This scans all the users of the VO, ``Config.index.subs_by_preferred_username``
+        gives the same result in constant time when the VO is known.
         """
         for sub, user in self.Users.items():
             if user.PreferedUsername == preferred_username:
@@ -274,3 +276,16 @@ class Config(BaseModel):
     _hexsha: str = PrivateAttr()
     # modification date
     _modified: datetime = PrivateAttr()
+    # lookup tables derived from the config, see the "index" property
+    _index: ConfigIndex = PrivateAttr()
+
+    def model_post_init(self, context: Any) -> None:
+        self._index = ConfigIndex(self)
+
+    @property
+    def index(self) -> ConfigIndex:
+        """Lookup tables for this revision, built the first time they're used."""
+        # The private attributes are kept by model_copy so check it's really ours
+        if self._index.config is not self:
+            self._index = ConfigIndex(self)
+        return self._index
@@ -0,0 +1,206 @@
+"""Share the validated configuration between the processes of a server.
+
+Without this, each worker process polls the config backend and parses and
+validates every new revision on its own. With a ``ConfigSnapshot`` a single
+process (the publisher, elected with a file lock) does that and writes the
+validated config to a directory, keyed by its hexsha. The other processes only
+have to check a small pointer file to find out about new revisions, and load
+the snapshot instead of reading the backend.
+
+The snapshots contain the pickled sub-trees of the validated config (e.g. the
+``Registry`` of each VO), so loading them doesn't parse or validate anything.
+The sub-trees which didn't change since the previous revision aren't even
+unpickled: the objects already in memory are reused, like the
+``CachedConfigValidator`` of the publisher does.
+
+If the publisher exits (or is closed), its lock is released and the next
+process refreshing its config takes over. If it is still running but doesn't
+refresh the pointer anymore (e.g. it is stuck or doesn't receive requests),
+the other processes read the backend themselves until it does.
+
+Python objects can't be shared between processes, so each of them still holds
+its own ``Config``. As unpickling runs arbitrary code, the directory must only be
+writable by the user running the server.
+"""
+
+from __future__ import annotations
+
+__all__ = ("ConfigSnapshot",)
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any
+
+from ..exceptions import BadConfigurationVersionError
+from .schema import Config
+
+LOCK_FILE = "publisher.lock"
+LATEST_FILE = "latest.json"
+SNAPSHOT_SUFFIX = ".pickle"
+# Keep the same number of revisions as the content cache of the ConfigSource
+MAX_SNAPSHOTS = 2
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigSnapshot:
+    """Directory containing the validated config, shared by several processes."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        stat = self.directory.stat()
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+            raise PermissionError(
+                f"{self.directory} must only be writable by the current user"
+            )
+        self._lock_file: IO[bytes] | None = None
+        # Sub-trees of the last loaded snapshot, by the hash of their pickle
+        self._subtrees: dict[str, Any] = {}
+
+    def is_publisher(self) -> bool:
+        """Whether this process is responsible for publishing new revisions.
+
+        Once a process has become the publisher it stays so until it exits.
+        """
+        if self._lock_file is None:
+            lock_file = open(self.directory / LOCK_FILE, "ab")  # noqa: SIM115
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return False
+            logger.info("Publishing the config snapshots to %s", self.directory)
+            self._lock_file = lock_file
+        return True
+
+    def close(self) -> None:
+        """Stop being the publisher, if this process was."""
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def latest_revision(
+        self, max_age: float | None = None
+    ) -> tuple[str, datetime] | None:
+        """Return the latest published revision.
+
+        :param max_age: maximum time in seconds since the publisher last
+            checked the latest revision
+        :return: None if nothing was published yet, or if the publisher didn't
+            check the latest revision for more than ``max_age`` seconds
+        """
+        latest_path = self.directory / LATEST_FILE
+        try:
+            with latest_path.open("rb") as fh:
+                age = time.time() - os.fstat(fh.fileno()).st_mtime
+                latest = json.loads(fh.read())
+        except FileNotFoundError:
+            return None
+        if max_age is not None and age > max_age:
+            logger.warning(
+                "The config snapshot in %s wasn't refreshed for %d seconds",
+                self.directory,
+                age,
+            )
+            return None
+        return latest["hexsha"], datetime.fromisoformat(latest["modified"])
+
+    def publish(self, config: Config) -> None:
+        """Write the snapshot of a config and make it the latest revision."""
+        hexsha, modified = config._hexsha, config._modified
+        if self.latest_revision() == (hexsha, modified):
+            # Show the other processes that the snapshot is still up to date
+            os.utime(self.directory / LATEST_FILE)
+            return
+        snapshot_path = self.directory / f"{hexsha}{SNAPSHOT_SUFFIX}"
+        if snapshot_path.exists():
+            # e.g. a commit was reverted, make sure it isn't removed below
+            os.utime(snapshot_path)
+        else:
+            self._write_atomic(snapshot_path, _dump(config))
+        self._write_atomic(
+            self.directory / LATEST_FILE,
+            json.dumps({"hexsha": hexsha, "modified": modified.isoformat()}).encode(),
+        )
+        logger.debug("Published config snapshot %s to %s", hexsha, self.directory)
+
+        # Remove the oldest snapshots, the processes which are still using
+        # them already have them in memory
+        snapshots = sorted(
+            self.directory.glob(f"*{SNAPSHOT_SUFFIX}"),
+            key=lambda path: path.stat().st_mtime_ns,
+        )
+        for path in snapshots[:-MAX_SNAPSHOTS]:
+            path.unlink(missing_ok=True)
+
+    def read(self, hexsha: str, config_class: type[Config]) -> Config:
+        """Load the snapshot of the given revision.
+
+        The caller has to set the ``_hexsha`` and ``_modified`` of the config.
+
+        :raises: BadConfigurationVersionError if there is no such snapshot, e.g.
+            as it was removed after newer revisions were published
+        """
+        try:
+            data = (self.directory / f"{hexsha}{SNAPSHOT_SUFFIX}").read_bytes()
+        except FileNotFoundError as e:
+            raise BadConfigurationVersionError(
+                f"No config snapshot for {hexsha} in {self.directory}"
+            ) from e
+        layout, fields_set, pickles = pickle.loads(data)  # noqa: S301
+
+        subtrees = {}
+        for key, pickled in pickles.items():
+            if (subtree := self._subtrees.get(key)) is None:
+                subtree = pickle.loads(pickled)  # noqa: S301
+            subtrees[key] = subtree
+        self._subtrees = subtrees
+
+        values = {
+            name: (
+                {k: subtrees[key] for k, key in keys.items()}
+                if isinstance(keys, dict)
+                else subtrees[keys]
+            )
+            for name, keys in layout.items()
+        }
+        # The config was validated by the publisher
+        return config_class.model_construct(_fields_set=fields_set, **values)
+
+    def _write_atomic(self, path: Path, data: bytes) -> None:
+        with tempfile.NamedTemporaryFile(
+            dir=self.directory, prefix=".tmp-", delete=False
+        ) as fh:
+            fh.write(data)
+        os.replace(fh.name, path)
+
+
+def _dump(config: Config) -> bytes:
+    """Pickle each sub-tree of the config, see ``ConfigSnapshot.read``."""
+    pickles: dict[str, bytes] = {}
+
+    def add(value: Any) -> str:
+        pickled = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        key = hashlib.sha256(pickled).hexdigest()
+        pickles[key] = pickled
+        return key
+
+    layout: dict[str, str | dict[str, str]] = {}
+    for name in type(config).model_fields:
+        value = getattr(config, name)
+        if isinstance(value, dict):
+            layout[name] = {k: add(v) for k, v in value.items()}
+        else:
+            layout[name] = add(value)
+    return pickle.dumps(
+        (layout, config.model_fields_set, pickles), protocol=pickle.HIGHEST_PROTOCOL
+    )
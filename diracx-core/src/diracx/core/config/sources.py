@@ -6,24 +6,38 @@ This is where all the backend abstraction and the caching logic takes place.
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import hashlib
+import json
 import logging
 import os
 from abc import ABCMeta, abstractmethod
+from collections.abc import AsyncIterator, Mapping, MutableMapping
 from datetime import datetime, timezone
+from functools import cache
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Annotated
+from typing import Annotated, Any, get_args, get_origin
 from urllib.parse import urlparse, urlunparse
 
 import sh
 import yaml
 from cachetools import Cache, LRUCache
-from pydantic import AnyUrl, BeforeValidator, TypeAdapter, UrlConstraints
+from pydantic import (
+    AnyUrl,
+    BaseModel,
+    BeforeValidator,
+    TypeAdapter,
+    UrlConstraints,
+    ValidationError,
+)
 
 from ..exceptions import BadConfigurationVersionError
 from ..extensions import select_from_extension
 from ..utils import TwoLevelCache
+from .git_objects import GitObjectStore
 from .schema import Config
+from .snapshot import ConfigSnapshot
 
 DEFAULT_CONFIG_FILE = "default.yml"
 DEFAULT_GIT_BRANCH = "master"
@@ -31,6 +45,16 @@ DEFAULT_CS_REV_CACHE_SOFT_TTL = 5
 # TODO: Reduce the hard TTL when we have more redundancy around the source of truth
 DEFAULT_CS_REV_CACHE_HARD_TTL = 60 * 60
 DEFAULT_CS_CONTENT_HARD_TTL = 15
+# Enough for the sub-trees of a few revisions of the config
+DEFAULT_CS_SUBTREE_CACHE_SIZE = 1024
+# The snapshot being read might be removed when new revisions are published
+SNAPSHOT_READ_ATTEMPTS = 3
+# The publisher checks the latest revision every soft TTL while it is used,
+# the other processes read the backend if it didn't for this long
+DEFAULT_CS_SNAPSHOT_MAX_AGE = 60
+
+# Use the much faster libyaml based loader when it's available, both are safe
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 logger = logging.getLogger(__name__)
 
@@ -57,6 +81,89 @@ class AnyUrlWithoutHost(AnyUrl):
 ConfigSourceUrl = Annotated[AnyUrlWithoutHost, BeforeValidator(_apply_default_scheme)]
 
 
+def _config_class() -> type[Config]:
+    return select_from_extension(group="diracx", name="config")[0].load()
+
+
+@cache
+def _cacheable_fields(
+    config_class: type[Config],
+) -> dict[str, tuple[bool, type[BaseModel]]]:
+    """Find the fields of the config which can be validated independently.
+
+    :return: mapping of field name -> (whether the field is a mapping of
+        models, model class)
+    """
+    fields = {}
+    for name, field in config_class.model_fields.items():
+        annotation = field.annotation
+        if get_origin(annotation) in (dict, Mapping, MutableMapping):
+            annotation = get_args(annotation)[1]
+            is_mapping = True
+        else:
+            is_mapping = False
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            fields[name] = (is_mapping, annotation)
+    return fields
+
+
+class CachedConfigValidator:
+    """Validate configs, reusing the sub-trees which didn't change.
+
+    The top level models (e.g. ``Resources``) and the values of the top level
+    mappings (e.g. the ``Registry`` of each VO) are validated independently and
+    cached by the hash of their content. When a new revision only changes one
+    VO, only that part of the config is validated again.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CS_SUBTREE_CACHE_SIZE):
+        self._cache: Cache = LRUCache(maxsize=maxsize)
+
+    def validate(self, config_class: type[Config], raw_obj: Any) -> Config:
+        if os.environ.get("DIRAC_COMPAT_ENABLE_CS_CONVERSION") or not isinstance(
+            raw_obj, dict
+        ):
+            # The legacy adaptors modify the raw config while validating it
+            return config_class.model_validate(raw_obj)
+
+        # The defaults must be merged before validating each VO independently,
+        # doing it again when validating the config is then a no-op
+        raw_obj = config_class.ensure_operations_defaults(raw_obj)
+        values = dict(raw_obj)
+        try:
+            for name, (is_mapping, model_class) in _cacheable_fields(
+                config_class
+            ).items():
+                if name not in values:
+                    continue
+                if is_mapping and isinstance(values[name], dict):
+                    values[name] = {
+                        key: self._validate_subtree(model_class, (name, key), value)
+                        for key, value in values[name].items()
+                    }
+                elif not is_mapping:
+                    values[name] = self._validate_subtree(
+                        model_class, (name,), values[name]
+                    )
+            return config_class.model_validate(values)
+        except ValidationError:
+            # Validate the whole config to get errors with the full location
+            return config_class.model_validate(raw_obj)
+
+    def _validate_subtree(
+        self, model_class: type[BaseModel], location: tuple[str, ...], value: Any
+    ) -> BaseModel:
+        try:
+            content = json.dumps(value, default=repr).encode()
+        except TypeError:
+            # e.g. keys which aren't strings
+            return model_class.model_validate(value)
+        key = (model_class, location, hashlib.sha256(content).hexdigest())
+        if (model := self._cache.get(key)) is None:
+            model = self._cache[key] = model_class.model_validate(value)
+        return model
+
+
 class ConfigSource(metaclass=ABCMeta):
     """Abstract class for the configuration source.
 
@@ -85,6 +192,9 @@ class ConfigSource(metaclass=ABCMeta):
         # We keep the last two versions in memory to avoid any potential to flip
         # flop between two versions when it changes.
         self._content_cache: Cache = LRUCache(maxsize=2)
+        self._validator = CachedConfigValidator()
+        # Set when the config is shared with the other processes of the server
+        self._snapshot: ConfigSnapshot | None = None
 
     @abstractmethod
     def latest_revision(self) -> tuple[str, datetime]:
@@ -108,18 +218,29 @@ class ConfigSource(metaclass=ABCMeta):
 
     @classmethod
     def create(cls):
-        return cls.create_from_url(backend_url=os.environ["DIRACX_CONFIG_BACKEND_URL"])
+        return cls.create_from_url(
+            backend_url=os.environ["DIRACX_CONFIG_BACKEND_URL"],
+            snapshot_dir=os.environ.get("DIRACX_CONFIG_SNAPSHOT_DIR"),
+        )
 
     @classmethod
     def create_from_url(
-        cls, *, backend_url: ConfigSourceUrl | Path | str
+        cls,
+        *,
+        backend_url: ConfigSourceUrl | Path | str,
+        snapshot_dir: Path | str | None = None,
     ) -> "ConfigSource":
         """Factory method to produce a concrete instance depending on
         the backend URL scheme.
 
+        If ``snapshot_dir`` is given, the processes using the same directory
+        share the validated config instead of all reading the backend.
         """
         url = TypeAdapter(ConfigSourceUrl).validate_python(str(backend_url))
-        return cls.__registry[url.scheme](backend_url=url)
+        source = cls.__registry[url.scheme](backend_url=url)
+        if snapshot_dir:
+            source._snapshot = ConfigSnapshot(Path(snapshot_dir))
+        return source
 
     def read_config(self) -> Config:
         """Load the configuration from the backend with appropriate caching.
@@ -149,16 +270,62 @@ class ConfigSource(metaclass=ABCMeta):
         This function ensures that the latest revision is loaded into the
         content cache before it is admitted into the revision cache.
         """
+        if self._snapshot is not None and not self._snapshot.is_publisher():
+            for _ in range(SNAPSHOT_READ_ATTEMPTS):
+                latest = self._snapshot.latest_revision(
+                    max_age=DEFAULT_CS_SNAPSHOT_MAX_AGE
+                )
+                if latest is None:
+                    # Nothing was published yet (e.g. the publisher is
+                    # starting) or the publisher doesn't refresh it anymore
+                    break
+                hexsha, modified = latest
+                if hexsha not in self._content_cache:
+                    try:
+                        config = self._snapshot.read(hexsha, _config_class())
+                    except BadConfigurationVersionError:
+                        # Newer revisions were published since latest_revision
+                        # was read and this one was removed, try the new one
+                        continue
+                    config._hexsha = hexsha
+                    config._modified = modified
+                    self._content_cache[hexsha] = config
+                return hexsha
+            else:
+                logger.warning("Failed to read the config snapshot, using the backend")
+
         hexsha, modified = self.latest_revision()
         if hexsha not in self._content_cache:
             self._content_cache[hexsha] = self.read_raw(hexsha, modified)
+        if self._snapshot is not None and self._snapshot.is_publisher():
+            self._snapshot.publish(self._content_cache[hexsha])
         return hexsha
 
+    def validate_config(self, raw_obj: Any, hexsha: str, modified: datetime) -> Config:
+        """Build the Config object from the raw content of the configuration."""
+        config = self._validator.validate(_config_class(), raw_obj)
+        config._hexsha = hexsha
+        config._modified = modified
+        return config
+
     def clear_caches(self):
         """Clear the caches."""
         self._revision_cache.clear()
         self._content_cache.clear()
 
+    def close(self) -> None:
+        """Release what is held by the source, e.g. the snapshot publisher lock."""
+        if self._snapshot is not None:
+            self._snapshot.close()
+
+    @contextlib.asynccontextmanager
+    async def lifetime_function(self) -> AsyncIterator[None]:
+        """Close the source when the application stops."""
+        try:
+            yield
+        finally:
+            self.close()
+
 
 class BaseGitConfigSource(ConfigSource):
     """Base class for the git based config source."""
@@ -208,19 +375,18 @@ class BaseGitConfigSource(ConfigSource):
                 _tty_out=False,
                 _async=False,
             )
-            raw_obj = yaml.safe_load(blob)
         except sh.ErrorReturnCode as e:
             raise BadConfigurationVersionError(
                 f"Error reading configuration: {e}"
             ) from e
+        return self.parse_config(blob, hexsha, modified)
 
-        config_class: Config = select_from_extension(group="diracx", name="config")[
-            0
-        ].load()
-        config = config_class.model_validate(raw_obj)
-        config._hexsha = hexsha
-        config._modified = modified
-        return config
+    def parse_config(
+        self, blob: str | bytes, hexsha: str, modified: datetime
+    ) -> Config:
+        """Validate the content of the configuration file."""
+        raw_obj = yaml.load(blob, Loader=YamlLoader)  # noqa: S506
+        return self.validate_config(raw_obj, hexsha, modified)
 
     def extract_remote_url(self, backend_url: ConfigSourceUrl) -> str:
         """Extract the base URL without the 'git+' prefix and query parameters."""
@@ -265,6 +431,50 @@ class LocalGitConfigSource(BaseGitConfigSource):
         return hash(self.repo_location)
 
 
+class ObjectStoreGitConfigSource(BaseGitConfigSource):
+    """Same as LocalGitConfigSource but without running any ``git`` process.
+
+    The references and objects are read directly from the repository, which
+    avoids starting several subprocesses every time the latest revision is
+    checked. The working tree isn't used so the repository can be bare.
+    """
+
+    scheme = "git+objects"
+
+    def __init__(self, *, backend_url: ConfigSourceUrl) -> None:
+        super().__init__(backend_url=backend_url)
+        if not backend_url.path:
+            raise ValueError("Empty path for ObjectStoreGitConfigSource")
+
+        self.repo_location = Path(backend_url.path)
+        self._store = GitObjectStore(self.repo_location)
+
+    def __hash__(self):
+        return hash(self.repo_location)
+
+    def latest_revision(self) -> tuple[str, datetime]:
+        try:
+            rev = self._store.resolve(self.git_branch)
+            modified = self._store.commit_time(rev)
+        except (LookupError, ValueError) as e:
+            raise BadConfigurationVersionError(
+                f"Error parsing latest revision: {e}"
+            ) from e
+        logger.debug("Latest revision for %s is %s with mtime %s", self, rev, modified)
+        return rev, modified
+
+    def read_raw(self, hexsha: str, modified: datetime) -> Config:
+        """:param: hexsha commit hash"""
+        logger.debug("Reading %s for %s with mtime %s", self, hexsha, modified)
+        try:
+            blob = self._store.read_file(hexsha, DEFAULT_CONFIG_FILE)
+        except (LookupError, ValueError) as e:
+            raise BadConfigurationVersionError(
+                f"Error reading configuration: {e}"
+            ) from e
+        return self.parse_config(blob, hexsha, modified)
+
+
 class RemoteGitConfigSource(BaseGitConfigSource):
     """Use a remote directory as a config source."""
 
@@ -48,6 +48,17 @@ class SortDirection(StrEnum):
     DESC = "desc"
 
 
+class CountStrategy(StrEnum):
+    """How the total number of results of a search is obtained."""
+
+    # Count all the matching rows
+    EXACT = "exact"
+    # Use the row estimate of the query planner
+    ESTIMATED = "estimated"
+    # Reuse a recent count of the same search
+    CACHED = "cached"
+
+
 # TODO: TypedDict vs pydantic?
 class SortSpec(TypedDict):
     parameter: str
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import pytest
+
+from diracx.core.config import Config
+from diracx.core.properties import (
+    JOB_SHARING,
+    NORMAL_USER,
+    PRODUCTION_MANAGEMENT,
+)
+
+SUB1 = "b824d4dc-1f9d-4ee8-8df5-c0ae55d46041"
+SUB2 = "c935e5ed-2g0e-5ff9-9eg6-d1bf66e57152"
+
+
+def make_config() -> Config:
+    return Config.model_validate(
+        {
+            "DIRAC": {},
+            "Registry": {
+                "lhcb": {
+                    "DefaultGroup": "lhcb_user",
+                    "IdP": {"URL": "https://idp.invalid", "ClientID": "test"},
+                    "Users": {
+                        SUB1: {"PreferedUsername": "chaen"},
+                        SUB2: {"PreferedUsername": "albdr"},
+                        "duplicate": {"PreferedUsername": "chaen"},
+                    },
+                    "Groups": {
+                        "lhcb_user": {
+                            "Properties": [NORMAL_USER],
+                            "Users": [SUB1, SUB2],
+                        },
+                        "lhcb_prmgr": {
+                            "Properties": [PRODUCTION_MANAGEMENT, JOB_SHARING],
+                            "Users": [SUB1],
+                        },
+                    },
+                }
+            },
+            "Operations": {
+                "Defaults": {"JobDescription": {"MaxCPUTime": 1234}},
+            },
+        }
+    )
+
+
+def test_registry_lookups():
+    config = make_config()
+    index = config.index
+    assert config.index is index
+
+    assert index.subs_by_preferred_username["lhcb"] == {
+        "chaen": SUB1,
+        "albdr": SUB2,
+    }
+    assert config.Registry["lhcb"].sub_from_preferred_username("albdr") == SUB2
+    with pytest.raises(KeyError):
+        config.Registry["lhcb"].sub_from_preferred_username("unknown")
+    assert index.user_groups["lhcb"] == {
+        SUB1: ("lhcb_user", "lhcb_prmgr"),
+        SUB2: ("lhcb_user",),
+    }
+    assert index.user_properties["lhcb"] == {
+        SUB1: {NORMAL_USER, PRODUCTION_MANAGEMENT, JOB_SHARING},
+        SUB2: {NORMAL_USER},
+    }
+    # Users without groups have no properties
+    assert "duplicate" not in index.user_properties["lhcb"]
+
+
+def test_job_configs():
+    config = make_config()
+    manifest_config = config.index.job_manifest_configs["lhcb"]
+    assert manifest_config["maxForGroup"]["CPUTime"] == 1234
+    assert config.index.job_manifest_configs["lhcb"] is manifest_config
+    # They are shared so they can't be modified
+    with pytest.raises(TypeError):
+        manifest_config["maxForGroup"]["CPUTime"] = 1  # type: ignore[index]
+    with pytest.raises(TypeError):
+        manifest_config["maxInputData"] = 1  # type: ignore[index]
+
+    prepare_config = config.index.check_and_prepare_job_configs["lhcb"]
+    assert prepare_config["defaultCPUTimeForOwnerGroup"] == 86400
+    assert prepare_config["getDIRACPlatform"].keywords["config"] is config
+    with pytest.raises(TypeError):
+        prepare_config["defaultCPUTimeForOwnerGroup"] = 1  # type: ignore[index]
+
+
+def test_index_is_not_shared():
+    config = make_config()
+    original_index = config.index
+    subs = original_index.subs_by_preferred_username
+
+    # The index doesn't change how configs are compared
+    assert config == make_config()
+
+    copied = config.model_copy(
+        update={
+            "Registry": {
+                "lhcb": config.Registry["lhcb"].model_copy(
+                    update={"Users": {SUB2: config.Registry["lhcb"].Users[SUB2]}}
+                )
+            }
+        }
+    )
+    assert copied.index is not original_index
+    assert copied.index.subs_by_preferred_username["lhcb"] == {"albdr": SUB2}
+    assert config.index.subs_by_preferred_username is subs
@@ -1,12 +1,33 @@
 from __future__ import annotations
 
+import copy
 import datetime
+import os
+import secrets
+import shutil
+import time
 from urllib import request
 
 import pytest
+import sh
+import yaml
+from pydantic import ValidationError
 
-from diracx.core.config import ConfigSource, RemoteGitConfigSource
+from diracx.core.config import (
+    ConfigSource,
+    LocalGitConfigSource,
+    ObjectStoreGitConfigSource,
+    RemoteGitConfigSource,
+)
+from diracx.core.config.git_objects import GitObjectNotFoundError, GitObjectStore
 from diracx.core.config.schema import Config
+from diracx.core.config.snapshot import ConfigSnapshot
+from diracx.core.config.sources import (
+    DEFAULT_CS_SNAPSHOT_MAX_AGE,
+    CachedConfigValidator,
+    YamlLoader,
+)
+from diracx.core.exceptions import BadConfigurationVersionError
 
 # The diracx-chart contains a CS example
 TEST_REPO = "git+https://github.com/DIRACGrid/diracx-charts.git"
@@ -36,3 +57,377 @@ def test_remote_git_config_source(monkeypatch, repo_url):
     assert isinstance(modified, datetime.datetime)
     result = remote_conf.read_raw(hexsha, modified)
     assert isinstance(result, Config)
+
+
+def git(repo, *args) -> str:
+    return sh.git(*args, _cwd=repo, _tty_out=False, _async=False).strip()
+
+
+@pytest.fixture
+def git_repo(tmp_path):
+    """Repository with enough history for git gc to produce deltas."""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    git(repo, "init", "--initial-branch=master")
+    git(repo, "config", "user.name", "Test")
+    git(repo, "config", "user.email", "test@example.invalid")
+    lines = [secrets.token_hex(32) for _ in range(2000)]
+    for i in range(5):
+        lines[i * 100] = f"changed {i}"
+        (repo / "default.yml").write_text("\n".join(lines))
+        (repo / "sub" / "dir").mkdir(parents=True, exist_ok=True)
+        (repo / "sub" / "dir" / "file.txt").write_text(f"version {i}")
+        git(repo, "add", ".")
+        git(repo, "commit", "-m", f"Commit {i}", f"--date=@{1700000000 + i}")
+    git(repo, "tag", "-a", "v1", "-m", "Annotated tag", "HEAD~1")
+    git(repo, "branch", "other", "HEAD~2")
+    return repo
+
+
+def check_store(repo):
+    store = GitObjectStore(repo)
+    for name in ["master", "HEAD", "refs/heads/other", "other", "v1"]:
+        hexsha = store.resolve(name)
+        assert hexsha == git(repo, "rev-parse", f"{name}^{{commit}}")
+        assert store.commit_time(hexsha) == datetime.datetime.fromtimestamp(
+            int(git(repo, "show", "-s", "--format=%ct", hexsha)),
+            tz=datetime.timezone.utc,
+        )
+        for path in ["default.yml", "sub/dir/file.txt"]:
+            expected = sh.git.show(
+                f"{hexsha}:{path}", _cwd=repo, _tty_out=False, _return_cmd=True
+            ).stdout
+            assert store.read_file(hexsha, path) == expected
+
+    with pytest.raises(GitObjectNotFoundError):
+        store.resolve("missing")
+    with pytest.raises(GitObjectNotFoundError):
+        store.read_file(store.resolve("master"), "missing.yml")
+
+
+def test_git_object_store(git_repo):
+    # Loose objects and references
+    check_store(git_repo)
+
+    # Pack files with deltas and packed references
+    git(git_repo, "gc", "--aggressive", "--prune=now")
+    assert not list((git_repo / ".git" / "refs" / "heads").iterdir())
+    (pack,) = (git_repo / ".git" / "objects" / "pack").glob("*.idx")
+    assert "chain length" in git(git_repo, "verify-pack", "-v", pack)
+    check_store(git_repo)
+
+    # Bare repositories
+    shutil.move(git_repo / ".git", git_repo.parent / "bare.git")
+    check_store(git_repo.parent / "bare.git")
+
+
+def test_git_object_store_new_pack(git_repo):
+    store = GitObjectStore(git_repo)
+    git(git_repo, "gc", "--prune=now")
+    old_head = store.resolve("master")
+    assert store.read_file(old_head, "sub/dir/file.txt") == b"version 4"
+
+    # Objects from packs created after the first read are found
+    (git_repo / "default.yml").write_text("new")
+    git(git_repo, "commit", "-am", "New commit")
+    git(git_repo, "repack", "-d")
+    new_head = store.resolve("master")
+    assert new_head != old_head
+    assert store.read_file(new_head, "default.yml") == b"new"
+
+
+def test_object_store_config_source(with_config_repo):
+    local = ConfigSource.create_from_url(backend_url=f"git+file://{with_config_repo}")
+    objects = ConfigSource.create_from_url(
+        backend_url=f"git+objects://{with_config_repo}?branch=master"
+    )
+    assert isinstance(local, LocalGitConfigSource)
+    assert isinstance(objects, ObjectStoreGitConfigSource)
+
+    hexsha, modified = objects.latest_revision()
+    assert (hexsha, modified) == local.latest_revision()
+    config = objects.read_raw(hexsha, modified)
+    assert config == local.read_raw(hexsha, modified)
+    assert config._hexsha == hexsha
+    assert objects.read_config() == config
+
+    with pytest.raises(BadConfigurationVersionError):
+        objects.read_raw("0" * 40, modified)
+    missing_branch = ConfigSource.create_from_url(
+        backend_url=f"git+objects://{with_config_repo}?branch=missing"
+    )
+    with pytest.raises(BadConfigurationVersionError):
+        missing_branch.latest_revision()
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("n_calls", [100])
+def test_benchmark_latest_revision(git_repo, n_calls, record_property):
+    git(git_repo, "gc", "--prune=now")
+    sources = {
+        "subprocess": ConfigSource.create_from_url(
+            backend_url=f"git+file://{git_repo}"
+        ),
+        "objects": ConfigSource.create_from_url(
+            backend_url=f"git+objects://{git_repo}"
+        ),
+    }
+    expected = sources["subprocess"].latest_revision()
+    for name, source in sources.items():
+        assert source.latest_revision() == expected
+        start = time.perf_counter()
+        for _ in range(n_calls):
+            source.latest_revision()
+        duration = (time.perf_counter() - start) / n_calls
+        record_property(f"latest_revision_{name}", duration)
+        print(f"{name:>10}: {duration * 1000:.3f} ms per call")
+
+
+def make_raw_config(n_users: int, vos=("lhcb", "gridpp", "dteam")):
+    """Synthetic config with the users spread over several VOs."""
+    registry = {}
+    for i, vo in enumerate(vos):
+        users = {
+            f"{vo}-{j}": {
+                "PreferedUsername": f"user{j}",
+                "DNs": [f"/DC=ch/DC=cern/CN=user{j}"],
+                "Email": f"user{j}@example.com",
+            }
+            for j in range(i, n_users, len(vos))
+        }
+        registry[vo] = {
+            "DefaultGroup": f"{vo}_user",
+            "IdP": {"URL": "https://idp.invalid", "ClientID": vo},
+            "Users": users,
+            "Groups": {
+                f"{vo}_user": {"Properties": ["NormalUser"], "Users": list(users)}
+            },
+        }
+    return {
+        "DIRAC": {},
+        "Registry": registry,
+        "Operations": {
+            "Defaults": {"JobDescription": {"MaxCPUTime": 1000}},
+            "lhcb": {"JobDescription": {"DefaultPriority": 3}},
+        },
+        "Resources": {"Computing": {"OSCompatibility": {"el9": ["el8"]}}},
+    }
+
+
+def test_cached_config_validator():
+    validator = CachedConfigValidator()
+    raw = make_raw_config(30)
+    config = validator.validate(Config, make_raw_config(30))
+    assert config == Config.model_validate(make_raw_config(30))
+    assert config.Operations["lhcb"].JobDescription.MaxCPUTime == 1000
+    assert config.Operations["lhcb"].JobDescription.DefaultPriority == 3
+    assert config.Operations["dteam"].JobDescription.MaxCPUTime == 1000
+
+    # Only the VO which changed is validated again
+    raw["Registry"]["gridpp"]["Users"]["gridpp-1"]["PreferedUsername"] = "changed"
+    new_config = validator.validate(Config, raw)
+    assert new_config == Config.model_validate(make_raw_config(30) | raw)
+    assert new_config.Registry["lhcb"] is config.Registry["lhcb"]
+    assert new_config.Resources is config.Resources
+    assert new_config.Registry["gridpp"] is not config.Registry["gridpp"]
+    assert new_config.Registry["gridpp"].Users["gridpp-1"].PreferedUsername == (
+        "changed"
+    )
+
+    # Errors still report the full location
+    raw = make_raw_config(30)
+    raw["Registry"]["dteam"]["Users"]["dteam-2"]["Email"] = "invalid"
+    with pytest.raises(ValidationError, match="Registry.dteam.Users.dteam-2.Email"):
+        validator.validate(Config, raw)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("n_users", [10_000])
+def test_benchmark_config_validation(n_users, record_property):
+    raw_yaml = yaml.safe_dump(make_raw_config(n_users))
+    raw = make_raw_config(n_users)
+    raw["Registry"]["dteam"]["Users"]["dteam-2"]["PreferedUsername"] = "changed"
+    changed_yaml = yaml.safe_dump(raw)
+
+    start = time.perf_counter()
+    expected = Config.model_validate(yaml.safe_load(raw_yaml))
+    baseline = time.perf_counter() - start
+
+    validator = CachedConfigValidator()
+    start = time.perf_counter()
+    config = validator.validate(Config, yaml.load(raw_yaml, Loader=YamlLoader))  # noqa: S506
+    cold = time.perf_counter() - start
+    assert config == expected
+
+    start = time.perf_counter()
+    validator.validate(Config, yaml.load(changed_yaml, Loader=YamlLoader))  # noqa: S506
+    one_vo_changed = time.perf_counter() - start
+
+    for name, duration in [
+        ("baseline", baseline),
+        ("cold", cold),
+        ("one_vo_changed", one_vo_changed),
+    ]:
+        record_property(f"config_validation_{n_users}_{name}", duration)
+        print(f"{name:>15}: {duration:.3f}s")
+
+
+@pytest.fixture
+def config_repo(tmp_path, with_config_repo):
+    """Copy of the test config repository which can be modified."""
+    repo = tmp_path / "cs"
+    shutil.copytree(with_config_repo, repo)
+    git(repo, "config", "user.name", "Test")
+    git(repo, "config", "user.email", "test@example.invalid")
+    return repo
+
+
+def refresh(source: ConfigSource) -> Config:
+    source._revision_cache.clear()
+    return source.read_config()
+
+
+def test_config_snapshot(tmp_path, config_repo, monkeypatch):
+    snapshot_dir = tmp_path / "snapshot"
+    publisher, follower = (
+        ConfigSource.create_from_url(
+            backend_url=f"git+objects://{config_repo}", snapshot_dir=snapshot_dir
+        )
+        for _ in range(2)
+    )
+    config = refresh(publisher)
+
+    # The follower doesn't read the backend
+    def unexpected_read(*args):
+        raise AssertionError("The backend shouldn't be read")
+
+    monkeypatch.setattr(follower, "latest_revision", unexpected_read)
+    monkeypatch.setattr(follower, "read_raw", unexpected_read)
+    followed = refresh(follower)
+    assert followed == config
+    assert (followed._hexsha, followed._modified) == (
+        config._hexsha,
+        config._modified,
+    )
+
+    # New revisions are published
+    default_yml = config_repo / "default.yml"
+    raw = yaml.safe_load(default_yml.read_text())
+    for priority in range(5):
+        raw["Operations"] = {"Defaults": {"JobDescription": {"MaxPriority": priority}}}
+        default_yml.write_text(yaml.safe_dump(raw))
+        git(config_repo, "commit", "-am", f"Set MaxPriority to {priority}")
+        config = refresh(publisher)
+        previous, followed = followed, refresh(follower)
+        assert followed._hexsha == config._hexsha
+        assert followed.Operations["lhcb"].JobDescription.MaxPriority == priority
+        # The sub-trees which didn't change are reused (the first commit
+        # changes the order of the keys in the YAML file)
+        if priority > 0:
+            assert followed.Registry["lhcb"] is previous.Registry["lhcb"]
+        assert followed.index.user_groups == config.index.user_groups
+    # Only the most recent snapshots are kept
+    assert len(list(snapshot_dir.glob("*.pickle"))) == 2
+
+    # The snapshot is removed after the follower found it was the latest one
+    git(config_repo, "commit", "--allow-empty", "-m", "Another commit")
+    config = refresh(publisher)
+    read = follower._snapshot.read
+    misses = []
+
+    def read_removed_once(hexsha, config_class):
+        if not misses:
+            misses.append(hexsha)
+            git(config_repo, "commit", "--allow-empty", "-m", "Newer commit")
+            refresh(publisher)
+            (snapshot_dir / f"{hexsha}.pickle").unlink()
+        return read(hexsha, config_class)
+
+    monkeypatch.setattr(follower._snapshot, "read", read_removed_once)
+    assert misses == []
+    followed = refresh(follower)
+    assert misses == [config._hexsha]
+    assert followed._hexsha == git(config_repo, "rev-parse", "HEAD")
+
+    # Another process takes over when the publisher stops
+    publisher.close()
+    monkeypatch.undo()
+    git(config_repo, "commit", "--allow-empty", "-m", "Empty commit")
+    assert refresh(follower)._hexsha == git(config_repo, "rev-parse", "HEAD")
+    assert follower._snapshot.latest_revision()[0] == refresh(follower)._hexsha
+    follower.close()
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("n_users", [10_000])
+def test_benchmark_config_snapshot(tmp_path, n_users, record_property):
+    validator = CachedConfigValidator()
+    snapshot = ConfigSnapshot(tmp_path / "snapshot")
+    raw = make_raw_config(n_users)
+    configs = []
+    for hexsha in ["a", "b"]:
+        config = validator.validate(Config, copy.deepcopy(raw))
+        config._hexsha = hexsha
+        config._modified = datetime.datetime.now(tz=datetime.timezone.utc)
+        snapshot.publish(config)
+        configs.append(config)
+        raw["Registry"]["dteam"]["Users"]["dteam-2"]["PreferedUsername"] = "changed"
+
+    start = time.perf_counter()
+    Config.model_validate_json(configs[0].model_dump_json())
+    json_validation = time.perf_counter() - start
+
+    reader = ConfigSnapshot(tmp_path / "snapshot")
+    start = time.perf_counter()
+    loaded = [reader.read("a", Config)]
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded.append(reader.read("b", Config))
+    one_vo_changed = time.perf_counter() - start
+
+    for config, expected in zip(loaded, configs, strict=True):
+        assert config.model_dump() == expected.model_dump()
+
+    for name, duration in [
+        ("json_validation", json_validation),
+        ("cold", cold),
+        ("one_vo_changed", one_vo_changed),
+    ]:
+        record_property(f"config_snapshot_{n_users}_{name}", duration)
+        print(f"{name:>15}: {duration:.3f}s")
+
+
+def test_config_snapshot_permissions(tmp_path):
+    snapshot_dir = tmp_path / "snapshot"
+    snapshot_dir.mkdir(mode=0o777)
+    snapshot_dir.chmod(0o777)
+    with pytest.raises(PermissionError, match="only be writable"):
+        ConfigSnapshot(snapshot_dir)
+
+
+def test_config_snapshot_stale(tmp_path, config_repo):
+    snapshot_dir = tmp_path / "snapshot"
+    publisher, follower = (
+        ConfigSource.create_from_url(
+            backend_url=f"git+objects://{config_repo}", snapshot_dir=snapshot_dir
+        )
+        for _ in range(2)
+    )
+    config = refresh(publisher)
+    assert refresh(follower)._hexsha == config._hexsha
+
+    # The publisher is still running but stopped refreshing the snapshot
+    git(config_repo, "commit", "--allow-empty", "-m", "Empty commit")
+    latest = snapshot_dir / "latest.json"
+    stale = time.time() - DEFAULT_CS_SNAPSHOT_MAX_AGE - 1
+    os.utime(latest, (stale, stale))
+    assert refresh(follower)._hexsha == git(config_repo, "rev-parse", "HEAD")
+
+    # Refreshing the publisher marks the snapshot as up to date again
+    refresh(publisher)
+    refresh(publisher)
+    assert latest.stat().st_mtime > stale + 1
+    assert follower._snapshot.latest_revision(max_age=DEFAULT_CS_SNAPSHOT_MAX_AGE)
+    publisher.close()
+    follower.close()
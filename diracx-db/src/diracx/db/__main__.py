@@ -21,9 +21,40 @@ def parse_args():
     )
     init_os_parser.set_defaults(func=init_os)
 
+    check_job_summary_parser = subparsers.add_parser(
+        "check-job-summary",
+        help="Compare the job summary counters of the JobDB with the jobs",
+    )
+    check_job_summary_parser.add_argument(
+        "--fix", action="store_true", help="Rebuild the counters if they differ"
+    )
+    check_job_summary_parser.set_defaults(func=check_job_summary)
+
+    fold_job_summary_parser = subparsers.add_parser(
+        "fold-job-summary",
+        help="Fold the pending changes of the job summary counters of the JobDB",
+    )
+    fold_job_summary_parser.set_defaults(func=fold_job_summary)
+
+    expire_job_logging_parser = subparsers.add_parser(
+        "expire-job-logging",
+        help=(
+            "Remove the old records of the removed jobs from the JobLoggingDB "
+            "and prepare the next partitions"
+        ),
+    )
+    expire_job_logging_parser.add_argument(
+        "--retention-days",
+        type=int,
+        required=True,
+        help="Records older than this are removed",
+    )
+    expire_job_logging_parser.set_defaults(func=expire_job_logging)
+
     args = parser.parse_args()
     logger.setLevel(logging.INFO)
-    asyncio.run(args.func())
+    kwargs = {k: v for k, v in vars(args).items() if k != "func"}
+    asyncio.run(args.func(**kwargs))
 
 
 async def init_sql():
@@ -53,5 +84,69 @@ async def init_os():
             await db.create_index_template()
 
 
+async def check_job_summary(fix: bool):
+    from diracx.db.sql import JobDB
+
+    db = JobDB.available_implementations("JobDB")[0](JobDB.available_urls()["JobDB"])
+    async with db.engine_context(), db:
+        differences = await db.check_summary(fix=fix)
+    for key, (n_jobs, counter) in sorted(differences.items()):
+        logger.warning(
+            "%s: %d jobs but the counter is %d",
+            dict(zip(db.summary_columns, key)),
+            n_jobs,
+            counter,
+        )
+    if differences and not fix:
+        raise SystemExit(f"Found {len(differences)} inconsistent counters")
+
+
+async def fold_job_summary():
+    from diracx.db.sql import JobDB
+
+    db = JobDB.available_implementations("JobDB")[0](JobDB.available_urls()["JobDB"])
+    if not db.summary_counters_enabled:
+        raise SystemExit("The job summary counters are not enabled")
+    total = 0
+    async with db.engine_context():
+        while True:
+            # Use a transaction per batch to keep the locks short
+            async with db:
+                n_folded = await db.fold_summary()
+            total += n_folded
+            if n_folded < db.summary_fold_batch_size:
+                break
+    logger.info("Folded %d job summary changes", total)
+
+
+async def expire_job_logging(retention_days: int):
+    from datetime import UTC, datetime, timedelta
+
+    from dateutil.relativedelta import relativedelta
+
+    from diracx.db.sql import JobDB, JobLoggingDB
+    from diracx.db.sql.job_logging.db import PARTITION_MONTHS_AHEAD
+
+    job_db = JobDB.available_implementations("JobDB")[0](
+        JobDB.available_urls()["JobDB"]
+    )
+    async with job_db.engine_context(), job_db:
+        # Only the history of the jobs which were removed is expired
+        first_live_job_id = await job_db.get_first_job_id()
+
+    db = JobLoggingDB.available_implementations("JobLoggingDB")[0](
+        JobLoggingDB.available_urls()["JobLoggingDB"]
+    )
+    now = datetime.now(tz=UTC)
+    before = now - timedelta(days=retention_days)
+    async with db.engine_context():
+        # The partitions have to be changed before any transaction uses
+        # LoggingInfo, the DDL would wait for it to finish otherwise
+        await db.drop_expired_partitions(before, first_live_job_id=first_live_job_id)
+        await db.extend_partitions(now + relativedelta(months=PARTITION_MONTHS_AHEAD))
+        async with db:
+            await db.expire_records(before, first_live_job_id=first_live_job_id)
+
+
 if __name__ == "__main__":
     parse_args()
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+from collections.abc import Iterable
 from datetime import UTC, datetime
+from typing import Any
 
 from diracx.db.os.utils import BaseOSDB
 
@@ -41,3 +43,20 @@ class JobParametersDB(BaseOSDB):
             **document,
         }
         return super().upsert(vo, doc_id, document)
+
+    async def bulk_upsert(
+        self,
+        documents: Iterable[tuple[str, int, Any]],
+        *,
+        chunk_size: int = 500,
+        max_concurrent_chunks: int = 4,
+    ) -> None:
+        timestamp = int(datetime.now(tz=UTC).timestamp() * 1000)
+        await super().bulk_upsert(
+            (
+                (vo, doc_id, {"JobID": doc_id, "timestamp": timestamp, **document})
+                for vo, doc_id, document in documents
+            ),
+            chunk_size=chunk_size,
+            max_concurrent_chunks=max_concurrent_chunks,
+        )
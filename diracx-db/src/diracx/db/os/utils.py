@@ -2,14 +2,17 @@ from __future__ import annotations
 
 __all__ = ("BaseOSDB",)
 
+import asyncio
 import contextlib
 import json
 import logging
 import os
 from abc import ABCMeta, abstractmethod
-from collections.abc import AsyncIterator
+from collections import defaultdict
+from collections.abc import AsyncIterator, Iterable
 from contextvars import ContextVar
 from datetime import datetime
+from itertools import islice
 from typing import Any, Self
 
 from opensearchpy import AsyncOpenSearch
@@ -29,6 +32,16 @@ class OpenSearchDBUnavailableError(DBUnavailableError, OpenSearchDBError):
     pass
 
 
+class OpenSearchBulkUpsertError(OpenSearchDBError):
+    """Raised when some of the documents of a bulk upsert could not be written."""
+
+    def __init__(self, errors: dict[int, Any]):
+        self.errors = errors
+        super().__init__(
+            f"Failed to upsert {len(errors)} document(s): {sorted(errors)[:10]}"
+        )
+
+
 class BaseOSDB(metaclass=ABCMeta):
     """This should be the base class of all the OpenSearch DiracX DBs.
 
@@ -197,6 +210,68 @@ class BaseOSDB(metaclass=ABCMeta):
             response,
         )
 
+    async def bulk_upsert(
+        self,
+        documents: Iterable[tuple[str, int, Any]],
+        *,
+        chunk_size: int = 500,
+        max_concurrent_chunks: int = 4,
+    ) -> None:
+        """Upsert many documents using the ``_bulk`` API.
+
+        Documents are grouped by index and sent in chunks of at most
+        ``chunk_size`` documents, with at most ``max_concurrent_chunks``
+        requests in flight at any time. Several documents with the same
+        ``doc_id`` are merged, as if they had been upserted one after another.
+
+        :param documents: iterable of ``(vo, doc_id, document)``
+        :raises OpenSearchBulkUpsertError: once all the chunks have been sent,
+            if any document failed to be written
+        """
+        by_index: defaultdict[str, dict[int, dict[str, Any]]] = defaultdict(dict)
+        for vo, doc_id, document in documents:
+            by_index[self.index_name(vo, doc_id)].setdefault(doc_id, {}).update(
+                document
+            )
+
+        errors: dict[int, Any] = {}
+        semaphore = asyncio.Semaphore(max_concurrent_chunks)
+
+        async def send_chunk(index_name: str, chunk: list[tuple[int, dict]]):
+            body: list[dict[str, Any]] = []
+            for doc_id, document in chunk:
+                body.append(
+                    {
+                        "update": {
+                            "_index": index_name,
+                            "_id": doc_id,
+                            "retry_on_conflict": 10,
+                        }
+                    }
+                )
+                body.append({"doc": document, "doc_as_upsert": True})
+            async with semaphore:
+                response = await self.client.bulk(body=body)
+            logger.debug(
+                "Bulk upserted %d documents in index %s (errors=%s)",
+                len(chunk),
+                index_name,
+                response["errors"],
+            )
+            if response["errors"]:
+                for (doc_id, _), item in zip(chunk, response["items"]):
+                    if error := item["update"].get("error"):
+                        errors[doc_id] = error
+
+        async with asyncio.TaskGroup() as tg:
+            for index_name, index_documents in by_index.items():
+                it = iter(index_documents.items())
+                while chunk := list(islice(it, chunk_size)):
+                    tg.create_task(send_chunk(index_name, chunk))
+
+        if errors:
+            raise OpenSearchBulkUpsertError(errors)
+
     async def search(
         self, parameters, search, sorts, *, per_page: int = 100, page: int | None = None
     ) -> list[dict[str, Any]]:
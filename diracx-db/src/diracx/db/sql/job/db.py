@@ -1,11 +1,28 @@
 from __future__ import annotations
 
-__all__ = ["JobDB"]
+__all__ = ["JobDB", "JobDBSettings"]
 
+from collections import Counter, defaultdict
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING, Any, Iterable
-
-from sqlalchemy import bindparam, case, delete, literal, select, update
+from functools import partial
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterable, Mapping
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    Table,
+    bindparam,
+    delete,
+    func,
+    insert,
+    select,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection
 
 if TYPE_CHECKING:
     from sqlalchemy.sql.elements import BindParameter
@@ -14,7 +31,7 @@ from sqlalchemy.sql import expression
 from diracx.core.exceptions import InvalidQueryError
 from diracx.core.models import JobCommand, SearchSpec, SortSpec
 
-from ..utils import BaseSQLDB, _get_columns
+from ..utils import BaseSQLDB, _get_columns, apply_search_filters
 from ..utils.functions import utcnow
 from .schema import (
     HeartBeatLoggingInfo,
@@ -23,9 +40,22 @@ from .schema import (
     JobDBBase,
     JobJDLs,
     Jobs,
+    JobSummary,
+    JobSummaryDelta,
 )
 
 
+class JobDBSettings(BaseSettings):
+    """Settings for the databases of the jobs (JobDB and JobLoggingDB)."""
+
+    model_config = SettingsConfigDict(env_prefix="DIRACX_DB_JOBS_")
+
+    # Set once DiracX is the only writer of the JobDB and JobLoggingDB (i.e.
+    # DIRAC doesn't write to them anymore). Only then can the tables derived
+    # from the jobs (e.g. the job summary counters) be trusted.
+    sole_writer: bool = False
+
+
 class JobDB(BaseSQLDB):
     metadata = JobDBBase.metadata
 
@@ -44,12 +74,183 @@ class JobDB(BaseSQLDB):
     # to find a way to make it dynamic
     jdl_2_db_parameters = ["JobName", "JobType", "JobGroup"]
 
+    # Minimum number of jobs for which set_job_attributes uses a temporary
+    # table rather than executemany on MySQL
+    temp_table_update_threshold = 10
+
+    # Columns of the Jobs table by which the JobSummary table counts the jobs
+    summary_columns = tuple(c.name for c in JobSummary.__table__.primary_key.columns)
+    # Maximum number of JobSummaryDelta rows folded in one transaction
+    summary_fold_batch_size = 10_000
+
+    def __init__(self, db_url: str, *, sole_writer: bool | None = None) -> None:
+        """:param sole_writer: defaults to ``JobDBSettings.sole_writer``"""
+        super().__init__(db_url)
+        if sole_writer is None:
+            sole_writer = JobDBSettings().sole_writer
+        # The JobSummary counters can only be trusted when nothing else changes
+        # the jobs, so they are neither maintained nor used otherwise
+        self.summary_counters_enabled = sole_writer
+
+    @classmethod
+    async def post_create(cls, conn: AsyncConnection) -> None:
+        """Fill the JobSummary table if the counters have just been enabled."""
+        if not JobDBSettings().sole_writer:
+            return
+        if (await conn.execute(select(JobSummary.vo).limit(1))).first() is None:
+            await _rebuild_summary(conn)
+
     async def summary(
-        self, group_by: list[str], search: list[SearchSpec]
+        self,
+        group_by: list[str],
+        search: list[SearchSpec],
+        *,
+        use_counters: bool = False,
     ) -> list[dict[str, str | int]]:
-        """Get a summary of the jobs."""
+        """Get a summary of the jobs.
+
+        :param use_counters: when the JobSummary counters are enabled and the
+            grouping and the filters only use their columns, use them rather
+            than scanning the Jobs table. This must only be used for
+            informational summaries, e.g. not for checking permissions.
+        """
+        summary_columns = set(self.summary_columns)
+        if (
+            use_counters
+            and self.summary_counters_enabled
+            and group_by
+            and summary_columns.issuperset(group_by)
+            and summary_columns.issuperset(s["parameter"] for s in search)
+        ):
+            counters = _summary_counters().subquery()
+            columns = _get_columns(counters, group_by)
+            stmt = select(*columns, func.sum(counters.c.Count).label("count"))
+            stmt = apply_search_filters(counters.c.__getitem__, stmt, search)
+            stmt = stmt.group_by(*columns).having(func.sum(counters.c.Count) > 0)
+            return [
+                {**row._mapping, "count": int(row.count)}
+                async for row in await self.conn.stream(stmt)
+            ]
         return await self._summary(table=Jobs, group_by=group_by, search=search)
 
+    async def fold_summary(self) -> int:
+        """Fold the oldest pending JobSummaryDelta rows into the JobSummary counters.
+
+        The summaries take the pending changes into account, this only keeps
+        the JobSummaryDelta table small. It is meant to be called periodically
+        (see ``python -m diracx.db fold-job-summary``) by a single process.
+
+        :return: the number of JobSummaryDelta rows which were folded, at most
+            ``summary_fold_batch_size``
+        """
+        rows = (
+            await self.conn.execute(
+                select(
+                    JobSummaryDelta.delta_id,
+                    JobSummaryDelta.count,
+                    *_get_columns(JobSummaryDelta.__table__, self.summary_columns),
+                )
+                .order_by(JobSummaryDelta.delta_id)
+                .limit(self.summary_fold_batch_size)
+                .with_for_update()
+            )
+        ).all()
+        if not rows:
+            return 0
+        deltas: Counter[tuple[str, ...]] = Counter()
+        for _, count, *key in rows:
+            deltas[tuple(key)] += count
+        values = [
+            dict(zip(self.summary_columns, key), Count=delta)
+            # Always update the rows in the same order to avoid deadlocks
+            for key, delta in sorted(deltas.items())
+            if delta
+        ]
+        if values:
+            if self.conn.dialect.name == "mysql":
+                stmt = mysql.insert(JobSummary).values(values)
+                stmt = stmt.on_duplicate_key_update(
+                    Count=JobSummary.count + stmt.inserted.Count
+                )
+            else:
+                dialect = (
+                    postgresql if self.conn.dialect.name == "postgresql" else sqlite
+                )
+                stmt = dialect.insert(JobSummary).values(values)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=list(self.summary_columns),
+                    set_={"Count": JobSummary.count + stmt.excluded.Count},
+                )
+            await self.conn.execute(stmt)
+        # Delete the rows by id as the ids aren't committed in order
+        await self.conn.execute(
+            delete(JobSummaryDelta).where(
+                JobSummaryDelta.delta_id.in_([row.DeltaID for row in rows])
+            )
+        )
+        return len(rows)
+
+    async def check_summary(
+        self, fix: bool = False
+    ) -> dict[tuple[str, ...], tuple[int, int]]:
+        """Compare the JobSummary counters with the content of the Jobs table.
+
+        :param fix: rebuild the JobSummary table if it is inconsistent
+        :return: mapping of the summary key (see ``summary_columns``) to the
+            number of jobs and the value of the counter, for the keys where they
+            differ
+        """
+        columns = _summary_key_columns()
+        expected = {
+            tuple(row[:-1]): row[-1]
+            for row in await self.conn.execute(
+                select(*columns, func.count()).group_by(*columns)
+            )
+        }
+        counters = _summary_counters().subquery()
+        key_columns = _get_columns(counters, self.summary_columns)
+        stored = {
+            tuple(row[:-1]): int(row[-1])
+            for row in await self.conn.execute(
+                select(*key_columns, func.sum(counters.c.Count))
+                .group_by(*key_columns)
+                .having(func.sum(counters.c.Count) != 0)
+            )
+        }
+        differences = {
+            key: (expected.get(key, 0), stored.get(key, 0))
+            for key in expected.keys() | stored.keys()
+            if expected.get(key, 0) != stored.get(key, 0)
+        }
+        if differences and fix:
+            await _rebuild_summary(self.conn)
+        return differences
+
+    async def _get_summary_keys(self, job_ids: Iterable[int]) -> list[tuple[str, ...]]:
+        """Get the JobSummary key of each job, locking the jobs until the end of
+        the transaction so that the changes are recorded consistently.
+        """
+        stmt = (
+            select(*_summary_key_columns())
+            .where(Jobs.job_id.in_(job_ids))
+            .with_for_update()
+        )
+        return [tuple(row) for row in await self.conn.execute(stmt)]
+
+    async def _record_summary_changes(
+        self, removed: Iterable[tuple[str, ...]], added: Iterable[tuple[str, ...]]
+    ) -> None:
+        """Append the changes of job keys to the JobSummaryDelta table."""
+        deltas = Counter(added)
+        deltas.subtract(removed)
+        values = [
+            dict(zip(self.summary_columns, key), Count=delta)
+            for key, delta in deltas.items()
+            if delta
+        ]
+        if values:
+            await self.conn.execute(insert(JobSummaryDelta), values)
+
     async def search(
         self,
         parameters: list[str] | None,
@@ -59,7 +260,8 @@ class JobDB(BaseSQLDB):
         distinct: bool = False,
         per_page: int = 100,
         page: int | None = None,
-    ) -> tuple[int, list[dict[Any, Any]]]:
+        count: bool = True,
+    ) -> tuple[int | None, list[dict[Any, Any]]]:
         """Search for jobs in the database."""
         return await self._search(
             table=Jobs,
@@ -69,6 +271,73 @@ class JobDB(BaseSQLDB):
             distinct=distinct,
             per_page=per_page,
             page=page,
+            count=count,
+        )
+
+    def search_stream(
+        self,
+        parameters: list[str] | None,
+        search: list[SearchSpec],
+        sorts: list[SortSpec],
+        *,
+        distinct: bool = False,
+        per_page: int = 100,
+        page: int | None = None,
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Search for jobs in the database, yielding them in batches."""
+        return self._search_stream(
+            table=Jobs,
+            parameters=parameters,
+            search=search,
+            sorts=sorts,
+            distinct=distinct,
+            per_page=per_page,
+            page=page,
+        )
+
+    async def count(
+        self,
+        parameters: list[str] | None,
+        search: list[SearchSpec],
+        *,
+        distinct: bool = False,
+    ) -> int:
+        """Count the jobs matching a search."""
+        return await self._count(
+            table=Jobs, parameters=parameters, search=search, distinct=distinct
+        )
+
+    async def estimate_count(
+        self,
+        parameters: list[str] | None,
+        search: list[SearchSpec],
+        *,
+        distinct: bool = False,
+    ) -> int | None:
+        """Estimate the number of jobs matching a search, None if unavailable."""
+        return await self._estimate_count(
+            table=Jobs, parameters=parameters, search=search, distinct=distinct
+        )
+
+    async def search_with_cursor(
+        self,
+        parameters: list[str] | None,
+        search: list[SearchSpec],
+        sorts: list[SortSpec],
+        *,
+        per_page: int = 100,
+        cursor: str | None = None,
+        count: bool = True,
+    ) -> tuple[int | None, list[dict[Any, Any]], str | None]:
+        """Search for jobs in the database using keyset pagination."""
+        return await self._search_with_cursor(
+            table=Jobs,
+            parameters=parameters,
+            search=search,
+            sorts=sorts,
+            per_page=per_page,
+            cursor=cursor,
+            count=count,
         )
 
     async def create_job(self, compressed_original_jdl: str):
@@ -82,8 +351,20 @@ class JobDB(BaseSQLDB):
         )
         return result.lastrowid
 
+    async def get_first_job_id(self) -> int | None:
+        """Return the JobID of the oldest job in the DB, None if it has no jobs.
+
+        JobIDs are allocated in increasing order, so every job with a lower
+        JobID has been removed.
+        """
+        return await self.conn.scalar(select(func.min(JobJDLs.job_id)))
+
     async def delete_jobs(self, job_ids: list[int]):
         """Delete jobs from the database."""
+        if self.summary_counters_enabled:
+            await self._record_summary_changes(
+                await self._get_summary_keys(job_ids), []
+            )
         stmt = delete(JobJDLs).where(JobJDLs.job_id.in_(job_ids))
         await self.conn.execute(stmt)
 
@@ -113,6 +394,11 @@ class JobDB(BaseSQLDB):
                 for job_id, attrs in jobs_to_update.items()
             ],
         )
+        if self.summary_counters_enabled:
+            # Read the keys back to take the column defaults into account
+            await self._record_summary_changes(
+                [], await self._get_summary_keys(jobs_to_update)
+            )
 
     async def update_job_jdls(self, jdls_to_update: dict[int, str]):
         """Used to update the JDL, typically just after inserting the original JDL, or rescheduling, for example."""
@@ -130,44 +416,110 @@ class JobDB(BaseSQLDB):
         )
 
     async def set_job_attributes(self, job_data):
-        """Update the parameters of the given jobs."""
+        """Update the parameters of the given jobs.
+
+        The jobs are grouped by the set of columns they update so that each group
+        is a single parametrised UPDATE statement, which is executed with
+        executemany. On MySQL, where executemany is a loop over the rows, large
+        groups are instead loaded into a temporary table and applied with a
+        single joined UPDATE.
+
+        Values can be SQL functions (e.g. ``utcnow()``), in which case they are
+        rendered in the statement rather than bound.
+        """
         # TODO: add myDate and force parameters.
 
         if not job_data:
             # nothing to do!
             raise ValueError("job_data is empty")
 
-        for job_id in job_data.keys():
-            if "Status" in job_data[job_id]:
-                job_data[job_id].update(
-                    {"LastUpdateTime": datetime.now(tz=timezone.utc)}
-                )
-        columns = set(key for attrs in job_data.values() for key in attrs.keys())
-        case_expressions = {
-            column: case(
-                *[
-                    (
-                        Jobs.__table__.c.JobID == job_id,
-                        # Since the setting of the new column value is obscured by the CASE statement,
-                        # ensure that SQLAlchemy renders the new column value with the correct type
-                        literal(attrs[column], type_=Jobs.__table__.c[column].type)
-                        if not isinstance(attrs[column], expression.FunctionElement)
-                        else attrs[column],
+        now = datetime.now(tz=timezone.utc)
+        sql_functions: list[expression.FunctionElement] = []
+        groups: defaultdict[tuple[tuple[str, int | None], ...], list[dict[str, Any]]]
+        groups = defaultdict(list)
+        for job_id, attrs in job_data.items():
+            if not attrs:
+                continue
+            if "Status" in attrs:
+                attrs = attrs | {"LastUpdateTime": now}
+            key = []
+            params = {"b_JobID": job_id}
+            for column, value in sorted(attrs.items()):
+                if isinstance(value, expression.FunctionElement):
+                    # Jobs can only share a statement if they use the same function
+                    i = next(
+                        (i for i, f in enumerate(sql_functions) if f.compare(value)),
+                        None,
                     )
-                    for job_id, attrs in job_data.items()
-                    if column in attrs
-                ],
-                else_=getattr(Jobs.__table__.c, column),  # Retain original value
+                    if i is None:
+                        i = len(sql_functions)
+                        sql_functions.append(value)
+                    key.append((column, i))
+                else:
+                    key.append((column, None))
+                    params[f"b_{column}"] = value
+            groups[tuple(key)].append(params)
+
+        summary_job_ids = [
+            job_id
+            for job_id, attrs in job_data.items()
+            if attrs and not attrs.keys().isdisjoint(self.summary_columns)
+        ]
+        if summary_job_ids and self.summary_counters_enabled:
+            previous_keys = await self._get_summary_keys(summary_job_ids)
+        else:
+            summary_job_ids = []
+
+        use_temp_table = self.conn.dialect.name == "mysql"
+        for key, params in groups.items():
+            columns = _get_columns(Jobs.__table__, [column for column, _ in key])
+            functions = {column: sql_functions[i] for column, i in key if i is not None}
+            if use_temp_table and len(params) >= self.temp_table_update_threshold:
+                await self._update_jobs_from_temp_table(columns, functions, params)
+                continue
+            values = {
+                c.name: functions.get(c.name, bindparam(f"b_{c.name}", type_=c.type))
+                for c in columns
+            }
+            stmt = (
+                update(Jobs).where(Jobs.job_id == bindparam("b_JobID")).values(**values)
             )
-            for column in columns
-        }
+            await self.conn.execute(stmt, params)
 
-        stmt = (
-            Jobs.__table__.update()
-            .values(**case_expressions)
-            .where(Jobs.__table__.c.JobID.in_(job_data.keys()))
+        if summary_job_ids:
+            await self._record_summary_changes(
+                previous_keys, await self._get_summary_keys(summary_job_ids)
+            )
+
+    async def _update_jobs_from_temp_table(
+        self,
+        columns: list[Column],
+        functions: Mapping[str, expression.FunctionElement],
+        params: list[dict[str, Any]],
+    ) -> None:
+        """Apply the same column updates to many jobs with a joined UPDATE."""
+        bound_columns = [c for c in columns if c.name not in functions]
+        temp_table = Table(
+            "job_attribute_updates",
+            MetaData(),
+            Column("b_JobID", Integer, primary_key=True),
+            *(Column(f"b_{c.name}", c.type) for c in bound_columns),
+            prefixes=["TEMPORARY"],
         )
-        await self.conn.execute(stmt)
+        await self.conn.run_sync(partial(temp_table.create, checkfirst=True))
+        try:
+            await self.conn.execute(insert(temp_table), params)
+            stmt = (
+                update(Jobs)
+                .where(Jobs.job_id == temp_table.c.b_JobID)
+                .values(
+                    **{c.name: temp_table.c[f"b_{c.name}"] for c in bound_columns},
+                    **functions,
+                )
+            )
+            await self.conn.execute(stmt)
+        finally:
+            await self.conn.run_sync(partial(temp_table.drop, checkfirst=True))
 
     async def get_job_jdls(self, job_ids, original: bool = False) -> dict[int, str]:
         """Get the JDLs for the given jobs."""
@@ -261,6 +613,58 @@ class JobDB(BaseSQLDB):
         ]
         await self.conn.execute(HeartBeatLoggingInfo.__table__.insert().values(values))
 
+    async def add_heartbeats(
+        self, heartbeats: Mapping[int, tuple[datetime, Mapping[str, Any]]]
+    ) -> None:
+        """Record the heartbeats of many jobs at once.
+
+        The HeartBeatTime of all the jobs is updated with a single executemany
+        UPDATE and all the dynamic data is stored with a single multi-row INSERT
+        into the HeartBeatLoggingInfo table.
+
+        :param heartbeats: mapping of job_id -> (heartbeat_time, dynamic_data)
+        """
+        if not heartbeats:
+            return
+        if (
+            extra_fields := {
+                key for _, dynamic_data in heartbeats.values() for key in dynamic_data
+            }
+            - self.heartbeat_fields
+        ):
+            raise InvalidQueryError(
+                f"Not allowed to store heartbeat data for: {extra_fields}. "
+                f"Allowed keys are: {self.heartbeat_fields}"
+            )
+
+        stmt = (
+            update(Jobs)
+            .where(Jobs.job_id == bindparam("job_id"))
+            .values(HeartBeatTime=bindparam("heartbeat_time"))
+        )
+        await self.conn.execute(
+            stmt,
+            [
+                {"job_id": job_id, "heartbeat_time": heartbeat_time}
+                for job_id, (heartbeat_time, _) in heartbeats.items()
+            ],
+        )
+
+        values = [
+            {
+                "JobID": job_id,
+                "Name": key,
+                "Value": value,
+                "HeartBeatTime": heartbeat_time,
+            }
+            for job_id, (heartbeat_time, dynamic_data) in heartbeats.items()
+            for key, value in dynamic_data.items()
+        ]
+        if values:
+            await self.conn.execute(
+                HeartBeatLoggingInfo.__table__.insert().values(values)
+            )
+
     async def get_job_commands(self, job_ids: Iterable[int]) -> list[JobCommand]:
         """Get a command to be passed to the job together with the next heartbeat.
 
@@ -286,3 +690,35 @@ class JobDB(BaseSQLDB):
             JobCommand(job_id=cmd.JobID, command=cmd.Command, arguments=cmd.Arguments)
             for cmd in commands
         ]
+
+
+def _summary_key_columns() -> list[Column]:
+    """The columns of the Jobs table forming the key of the JobSummary table."""
+    return [Jobs.__table__.c[name] for name in JobDB.summary_columns]
+
+
+def _summary_counters():
+    """The JobSummary counters together with the changes not folded yet."""
+    return union_all(
+        select(
+            *_get_columns(JobSummary.__table__, JobDB.summary_columns),
+            JobSummary.count.label("Count"),
+        ),
+        select(
+            *_get_columns(JobSummaryDelta.__table__, JobDB.summary_columns),
+            JobSummaryDelta.count.label("Count"),
+        ),
+    )
+
+
+async def _rebuild_summary(conn: AsyncConnection) -> None:
+    """Recompute all the JobSummary counters from the Jobs table."""
+    columns = _summary_key_columns()
+    await conn.execute(delete(JobSummaryDelta))
+    await conn.execute(delete(JobSummary))
+    await conn.execute(
+        insert(JobSummary).from_select(
+            [*JobDB.summary_columns, "Count"],
+            select(*columns, func.count()).group_by(*columns),
+        )
+    )
@@ -107,6 +107,46 @@ class Jobs(JobDBBase):
     )
 
 
+class JobSummary(JobDBBase):
+    """Number of jobs for each combination of the most common summary dimensions.
+
+    Only used when DiracX is the only writer of the JobDB (see
+    ``JobDBSettings.sole_writer``). The changes made by the ``JobDB`` methods
+    which create, update and delete jobs are appended to ``JobSummaryDelta``
+    and periodically folded into this table by ``JobDB.fold_summary``. Jobs
+    modified by other means are not accounted for, see ``JobDB.check_summary``.
+    """
+
+    __tablename__ = "JobSummary"
+    vo = Column("VO", String(32), primary_key=True)
+    owner_group = Column("OwnerGroup", String(128), primary_key=True)
+    owner = Column("Owner", String(64), primary_key=True)
+    job_group = Column("JobGroup", String(32), primary_key=True)
+    job_type = Column("JobType", String(32), primary_key=True)
+    site = Column("Site", String(100), primary_key=True)
+    status = Column("Status", String(32), primary_key=True)
+    count = Column("Count", Integer, default=0)
+
+
+class JobSummaryDelta(JobDBBase):
+    """Changes to the JobSummary counters which haven't been folded yet.
+
+    Rows are only ever inserted by the transactions changing jobs, so that
+    they don't all wait for the lock of the same counter.
+    """
+
+    __tablename__ = "JobSummaryDelta"
+    delta_id = Column("DeltaID", Integer, autoincrement=True, primary_key=True)
+    vo = Column("VO", String(32))
+    owner_group = Column("OwnerGroup", String(128))
+    owner = Column("Owner", String(64))
+    job_group = Column("JobGroup", String(32))
+    job_type = Column("JobType", String(32))
+    site = Column("Site", String(100))
+    status = Column("Status", String(32))
+    count = Column("Count", Integer)
+
+
 class JobJDLs(JobDBBase):
     __tablename__ = "JobJDLs"
     job_id = Column("JobID", Integer, autoincrement=True, primary_key=True)
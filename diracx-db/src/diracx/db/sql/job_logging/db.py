@@ -1,15 +1,51 @@
 from __future__ import annotations
 
-from collections import defaultdict
-from datetime import datetime, timezone
-from typing import Iterable
+import logging
+from collections import Counter, defaultdict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import UTC, datetime, timezone
+from itertools import pairwise
+from typing import Iterable, Mapping
 
-from sqlalchemy import delete, func, select
+from dateutil.relativedelta import relativedelta
+from dateutil.rrule import MONTHLY, rrule
+from sqlalchemy import case, delete, func, insert, select, text
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection
 
-from diracx.core.models import JobLoggingRecord, JobStatusReturn
+from diracx.core.models import JobLoggingRecord
 
+from ..job.db import JobDBSettings
 from ..utils import BaseSQLDB
-from .schema import JobLoggingDBBase, LoggingInfo
+from .schema import (
+    JobLoggingDBBase,
+    LoggingInfo,
+    LoggingInfoCounter,
+    LoggingInfoStatusTime,
+    MagicEpochDateTime,
+)
+
+# Number of months for which LoggingInfo partitions are created in advance
+PARTITION_MONTHS_AHEAD = 24
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class LoggingInfoRecord:
+    """Entry of the status history of a job.
+
+    This is a lightweight equivalent of ``JobStatusReturn``, which is serialized
+    to the same JSON without validating each of the (possibly many) records.
+    """
+
+    Status: str
+    MinorStatus: str
+    ApplicationStatus: str
+    StatusTime: datetime
+    Source: str
 
 
 class JobLoggingDB(BaseSQLDB):
@@ -17,30 +53,93 @@ class JobLoggingDB(BaseSQLDB):
 
     metadata = JobLoggingDBBase.metadata
 
+    def __init__(self, db_url: str, *, sole_writer: bool | None = None) -> None:
+        """:param sole_writer: defaults to ``JobDBSettings.sole_writer``"""
+        super().__init__(db_url)
+        if sole_writer is None:
+            sole_writer = JobDBSettings().sole_writer
+        # LoggingInfoStatusTime is only complete if nothing else writes to
+        # LoggingInfo, so it is neither maintained nor used otherwise. The
+        # SeqNums also only have to be checked against the existing records
+        # if something else writes to LoggingInfo.
+        self.sole_writer = sole_writer
+
+    @classmethod
+    async def post_create(cls, conn: AsyncConnection) -> None:
+        """Fill the LoggingInfoCounter and LoggingInfoStatusTime tables if they
+        have just been added to an existing DB (or, for the latter, enabled).
+
+        On MySQL, the LoggingInfo table is also partitioned by month of
+        StatusTimeOrder so that old records can be expired efficiently, see
+        ``expire_records``. Like for the RefreshTokens of the AuthDB, this is only
+        done automatically if the table is empty, existing tables have to be
+        migrated manually (see the documentation of the databases).
+
+        As StatusTimeOrder has to be part of every unique key of a partitioned
+        table, (JobID, SeqNum) is then no longer enforced to be unique by the DB.
+        ``insert_records`` relies on LoggingInfoCounter instead, which never
+        allocates a SeqNum lower than the largest one of the job.
+        """
+        if conn.dialect.name == "mysql" and not await _get_partitions(conn):
+            start_date = datetime.now(tz=UTC).replace(
+                day=1, hour=0, minute=0, second=0, microsecond=0
+            )
+            end_date = start_date + relativedelta(months=PARTITION_MONTHS_AHEAD)
+            # StatusTimeOrder has to be part of the primary key to partition on it
+            alter_query = text(
+                "ALTER TABLE LoggingInfo DROP PRIMARY KEY, "
+                "ADD PRIMARY KEY (JobID, SeqNum, StatusTimeOrder) "
+                "PARTITION BY RANGE (FLOOR(StatusTimeOrder)) "
+                f"({_monthly_partitions(start_date, end_date)})"
+            )
+            if (await conn.execute(select(LoggingInfo.job_id).limit(1))).first():
+                logger.warning(
+                    "LoggingInfo is not partitioned as it isn't empty, migrate it "
+                    "manually with the following query: %s",
+                    alter_query,
+                )
+            else:
+                await conn.execute(alter_query)
+
+        if not (await conn.execute(select(LoggingInfoCounter.job_id).limit(1))).first():
+            await conn.execute(
+                insert(LoggingInfoCounter).from_select(
+                    ["JobID", "LastSeqNum"],
+                    select(LoggingInfo.job_id, func.max(LoggingInfo.seq_num)).group_by(
+                        LoggingInfo.job_id
+                    ),
+                )
+            )
+        if (
+            JobDBSettings().sole_writer
+            and not (
+                await conn.execute(select(LoggingInfoStatusTime.job_id).limit(1))
+            ).first()
+        ):
+            await conn.execute(
+                insert(LoggingInfoStatusTime).from_select(
+                    ["JobID", "Status", "StatusTimeOrder"],
+                    _latest_status_times_stmt(),
+                )
+            )
+
     async def insert_records(
         self,
         records: list[JobLoggingRecord],
     ):
-        """Bulk insert entries to the JobLoggingDB table."""
-        # First, fetch the maximum SeqNums for the given job_ids
-        seqnum_stmt = (
-            select(
-                LoggingInfo.job_id, func.coalesce(func.max(LoggingInfo.seq_num) + 1, 1)
-            )
-            .where(LoggingInfo.job_id.in_([record.job_id for record in records]))
-            .group_by(LoggingInfo.job_id)
+        """Bulk insert entries to the JobLoggingDB table.
+
+        The SeqNums are allocated from the LoggingInfoCounter table, which
+        serialises concurrent insertions for the same job rather than having them
+        collide on the primary key.
+        """
+        seqnums = await self._allocate_seq_nums(
+            Counter(record.job_id for record in records)
         )
 
-        seqnums = {
-            jid: seqnum for jid, seqnum in (await self.conn.execute(seqnum_stmt))
-        }
-        # IF a seqnum is not found, then assume it does not exist and the first sequence number is 1.
         # https://docs.sqlalchemy.org/en/20/orm/queryguide/dml.html#orm-bulk-insert-statements
         values = []
         for record in records:
-            if record.job_id not in seqnums:
-                seqnums[record.job_id] = 1
-
             values.append(
                 {
                     "JobID": record.job_id,
@@ -59,13 +158,116 @@ class JobLoggingDB(BaseSQLDB):
             LoggingInfo.__table__.insert(),
             values,
         )
+        if self.sole_writer:
+            await self._update_status_times(records)
+
+    async def _allocate_seq_nums(self, counts: Mapping[int, int]) -> dict[int, int]:
+        """Reserve ``counts[job_id]`` consecutive SeqNums for each job.
+
+        The counters are incremented without being read first and stay locked
+        until the end of the transaction. Unless DiracX is the sole writer,
+        other writers of LoggingInfo (e.g. DIRAC) don't update the counters,
+        so the new SeqNums are also made to come after the largest one
+        already used by the job.
+
+        :return: the first reserved SeqNum of each job
+        """
+        # Always update the rows in the same order to avoid deadlocks
+        if self.sole_writer:
+            values = [
+                {"JobID": job_id, "LastSeqNum": count}
+                for job_id, count in sorted(counts.items())
+            ]
+        else:
+            values = [
+                {"JobID": job_id, "LastSeqNum": _max_seq_num(job_id) + count}
+                for job_id, count in sorted(counts.items())
+            ]
+        if self.conn.dialect.name == "mysql":
+            stmt = mysql.insert(LoggingInfoCounter).values(values)
+            inserted = stmt.inserted
+            greatest = func.greatest
+        else:
+            if self.conn.dialect.name == "postgresql":
+                dialect, greatest = postgresql, func.greatest
+            else:
+                # The multi-argument max() of SQLite is a scalar function
+                dialect, greatest = sqlite, func.max
+            stmt = dialect.insert(LoggingInfoCounter).values(values)
+            inserted = stmt.excluded
+        if self.sole_writer:
+            last_seq_num = LoggingInfoCounter.last_seq_num + inserted.LastSeqNum
+        else:
+            # The inserted LastSeqNum is MAX(SeqNum) + count, so this sets the
+            # counter to GREATEST(LastSeqNum, MAX(SeqNum)) + count
+            last_seq_num = greatest(
+                LoggingInfoCounter.last_seq_num
+                + case(counts, value=LoggingInfoCounter.job_id),
+                inserted.LastSeqNum,
+            )
+        if self.conn.dialect.name == "mysql":
+            await self.conn.execute(
+                stmt.on_duplicate_key_update(LastSeqNum=last_seq_num)
+            )
+            # MySQL doesn't support RETURNING but the rows are locked by this
+            # transaction so they can be read back safely
+            rows = await self.conn.execute(
+                select(
+                    LoggingInfoCounter.job_id, LoggingInfoCounter.last_seq_num
+                ).where(LoggingInfoCounter.job_id.in_(counts))
+            )
+        else:
+            rows = await self.conn.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["JobID"], set_={"LastSeqNum": last_seq_num}
+                ).returning(LoggingInfoCounter.job_id, LoggingInfoCounter.last_seq_num)
+            )
+        return {job_id: last - counts[job_id] + 1 for job_id, last in rows}
+
+    async def _update_status_times(self, records: list[JobLoggingRecord]) -> None:
+        """Keep the most recent time of each status in LoggingInfoStatusTime."""
+        latest: dict[tuple[int, str], datetime] = {}
+        for record in records:
+            key = (record.job_id, record.status)
+            if key not in latest or latest[key] < record.date:
+                latest[key] = record.date
+        # Always update the rows in the same order to avoid deadlocks
+        values = [
+            {"JobID": job_id, "Status": status, "StatusTimeOrder": date}
+            for (job_id, status), date in sorted(latest.items())
+        ]
+        if self.conn.dialect.name == "mysql":
+            stmt = mysql.insert(LoggingInfoStatusTime).values(values)
+            stmt = stmt.on_duplicate_key_update(
+                StatusTimeOrder=func.greatest(
+                    LoggingInfoStatusTime.status_time_order,
+                    stmt.inserted.StatusTimeOrder,
+                )
+            )
+        else:
+            if self.conn.dialect.name == "postgresql":
+                dialect, greatest = postgresql, func.greatest
+            else:
+                # The multi-argument max() of SQLite is a scalar function
+                dialect, greatest = sqlite, func.max
+            stmt = dialect.insert(LoggingInfoStatusTime).values(values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["JobID", "Status"],
+                set_={
+                    "StatusTimeOrder": greatest(
+                        LoggingInfoStatusTime.status_time_order,
+                        stmt.excluded.StatusTimeOrder,
+                    )
+                },
+            )
+        await self.conn.execute(stmt)
 
-    async def get_records(self, job_ids: list[int]) -> dict[int, JobStatusReturn]:
-        """Returns a Status,MinorStatus,ApplicationStatus,StatusTime,Source tuple
+    async def get_records(
+        self, job_ids: list[int]
+    ) -> defaultdict[int, list[LoggingInfoRecord]]:
+        """Returns a Status,MinorStatus,ApplicationStatus,StatusTime,Source record
         for each record found for job specified by its jobID in historical order.
         """
-        # We could potentially use a group_by here, but we need to post-process the
-        # results later.
         stmt = (
             select(
                 LoggingInfo.job_id,
@@ -78,9 +280,8 @@ class JobLoggingDB(BaseSQLDB):
             .where(LoggingInfo.job_id.in_(job_ids))
             .order_by(LoggingInfo.status_time_order, LoggingInfo.status_time)
         )
-        rows = await self.conn.execute(stmt)
 
-        values = defaultdict(list)
+        res: defaultdict[int, list[LoggingInfoRecord]] = defaultdict(list)
         for (
             job_id,
             status,
@@ -88,65 +289,223 @@ class JobLoggingDB(BaseSQLDB):
             application_status,
             status_time,
             status_source,
-        ) in rows:
-            values[job_id].append(
-                [
+        ) in await self.conn.execute(stmt):
+            history = res[job_id]
+            if history:
+                # We replace "idem" values by the value previously stated
+                previous = history[-1]
+                if status == "idem":
+                    status = previous.Status
+                if minor_status == "idem":
+                    minor_status = previous.MinorStatus
+                if application_status == "idem":
+                    application_status = previous.ApplicationStatus
+            elif application_status == "idem":
+                # If no value has been set for the application status in the
+                # first place, we put this status to unknown
+                application_status = "Unknown"
+            history.append(
+                LoggingInfoRecord(
                     status,
                     minor_status,
                     application_status,
                     status_time.replace(tzinfo=timezone.utc),
                     status_source,
-                ]
-            )
-
-        # If no value has been set for the application status in the first place,
-        # We put this status to unknown
-        res: dict = defaultdict(list)
-        for job_id, history in values.items():
-            if history[0][2] == "idem":
-                history[0][2] = "Unknown"
-
-            # We replace "idem" values by the value previously stated
-            for i in range(1, len(history)):
-                for j in range(3):
-                    if history[i][j] == "idem":
-                        history[i][j] = history[i - 1][j]
-
-            # And we replace arrays with tuples
-            for (
-                status,
-                minor_status,
-                application_status,
-                status_time,
-                status_source,
-            ) in history:
-                res[job_id].append(
-                    JobStatusReturn(
-                        Status=status,
-                        MinorStatus=minor_status,
-                        ApplicationStatus=application_status,
-                        StatusTime=status_time,
-                        Source=status_source,
-                    )
                 )
-
+            )
         return res
 
     async def delete_records(self, job_ids: list[int]):
         """Delete logging records for given jobs."""
         stmt = delete(LoggingInfo).where(LoggingInfo.job_id.in_(job_ids))
         await self.conn.execute(stmt)
+        for table in (LoggingInfoCounter, LoggingInfoStatusTime):
+            stmt = delete(table).where(table.job_id.in_(job_ids))
+            await self.conn.execute(stmt)
+
+    async def drop_expired_partitions(
+        self, before: datetime, *, first_live_job_id: int | None
+    ) -> None:
+        """Drop the monthly LoggingInfo partitions which entirely predate ``before``.
+
+        The history of the jobs which are still in the JobDB is kept: a
+        partition is only dropped if all its records belong to jobs older than
+        ``first_live_job_id``, the oldest job of the JobDB (None if it has no
+        jobs). This does nothing if LoggingInfo isn't partitioned.
+
+        This must be called outside of any transaction, see ``_ddl_connection``.
+        """
+        async with self._ddl_connection() as conn:
+            bound = _partition_bound(before)
+            expired = []
+            for name, limit in await _get_partitions(conn):
+                if limit == "MAXVALUE" or int(limit) > bound:
+                    break
+                # The partition names come from the information_schema
+                last_job_id = await conn.scalar(
+                    text(f"SELECT MAX(JobID) FROM LoggingInfo PARTITION ({name})")  # noqa: S608
+                )
+                if (
+                    first_live_job_id is not None
+                    and last_job_id is not None
+                    and last_job_id >= first_live_job_id
+                ):
+                    logger.warning(
+                        "Keeping LoggingInfo partition %s as job %d might still exist",
+                        name,
+                        last_job_id,
+                    )
+                    continue
+                expired.append(name)
+            if expired:
+                logger.info("Dropping LoggingInfo partitions %s", expired)
+                await conn.execute(
+                    text(f"ALTER TABLE LoggingInfo DROP PARTITION {','.join(expired)}")
+                )
+
+    async def extend_partitions(self, until: datetime) -> None:
+        """Make sure that LoggingInfo has monthly partitions until ``until``.
+
+        This does nothing if LoggingInfo isn't partitioned. Like
+        ``drop_expired_partitions``, this must be called outside of any
+        transaction.
+        """
+        async with self._ddl_connection() as conn:
+            partitions = await _get_partitions(conn)
+            if not partitions or partitions[-1][1] != "MAXVALUE" or len(partitions) < 2:
+                return
+            last_month = datetime.fromtimestamp(
+                int(partitions[-2][1]) + MagicEpochDateTime.MAGIC_EPOC_NUMBER, tz=UTC
+            )
+            if last_month >= until:
+                return
+            new_partitions = _monthly_partitions(last_month, until)
+            await conn.execute(
+                text(
+                    "ALTER TABLE LoggingInfo REORGANIZE PARTITION p_future "
+                    f"INTO ({new_partitions})"
+                )
+            )
+
+    async def expire_records(
+        self, before: datetime, *, first_live_job_id: int | None
+    ) -> None:
+        """Delete the records older than ``before`` of the jobs which are no
+        longer in the JobDB, i.e. which are older than ``first_live_job_id``.
+
+        If LoggingInfo is partitioned, the records are expired by
+        ``drop_expired_partitions`` instead. In both cases, the
+        LoggingInfoCounter and LoggingInfoStatusTime rows of the removed jobs
+        which have no records left are deleted.
+        """
+        if not await _get_partitions(self.conn):
+            stmt = delete(LoggingInfo).where(LoggingInfo.status_time_order < before)
+            if first_live_job_id is not None:
+                stmt = stmt.where(LoggingInfo.job_id < first_live_job_id)
+            await self.conn.execute(stmt)
+        for table in (LoggingInfoCounter, LoggingInfoStatusTime):
+            stmt = delete(table).where(
+                ~select(LoggingInfo.job_id)
+                .where(LoggingInfo.job_id == table.job_id)
+                .exists()
+            )
+            if first_live_job_id is not None:
+                stmt = stmt.where(table.job_id < first_live_job_id)
+            await self.conn.execute(stmt)
+
+    @asynccontextmanager
+    async def _ddl_connection(self) -> AsyncIterator[AsyncConnection]:
+        """Connection to change the partitions of LoggingInfo.
+
+        MySQL implicitly commits the current transaction before any DDL, and the
+        DDL waits for all the transactions which used LoggingInfo to finish.
+        Running it while a transaction of this DB is open would either break its
+        atomicity or wait for it forever, so this is forbidden.
+        """
+        assert self._conn.get() is None, (
+            "The LoggingInfo partitions can't be changed within a transaction"
+        )
+        async with self.engine.connect() as conn:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            yield conn
 
     async def get_wms_time_stamps(
         self, job_ids: Iterable[int]
     ) -> dict[int, dict[str, datetime]]:
         """Get TimeStamps for job MajorState transitions for multiple jobs at once
         return a {JobID: {State:timestamp}} dictionary.
+
+        When DiracX is the only writer of the DB, the time stamps are read from
+        the LoggingInfoStatusTime table and the history of the jobs which aren't
+        tracked there (e.g. records written before it was enabled) is scanned
+        instead. Otherwise the history of all the jobs is scanned.
         """
+        job_ids = set(job_ids)
         result: defaultdict[int, dict[str, datetime]] = defaultdict(dict)
-        stmt = select(
-            LoggingInfo.job_id, LoggingInfo.status, LoggingInfo.status_time_order
-        ).where(LoggingInfo.job_id.in_(job_ids))
-        for job_id, event, etime in await self.conn.execute(stmt):
-            result[job_id][event] = etime
+        if self.sole_writer:
+            stmt = select(
+                LoggingInfoStatusTime.job_id,
+                LoggingInfoStatusTime.status,
+                LoggingInfoStatusTime.status_time_order,
+            ).where(LoggingInfoStatusTime.job_id.in_(job_ids))
+            for job_id, event, etime in await self.conn.execute(stmt):
+                result[job_id][event] = etime
+
+        if untracked := job_ids - result.keys():
+            stmt = _latest_status_times_stmt().where(LoggingInfo.job_id.in_(untracked))
+            for job_id, event, etime in await self.conn.execute(stmt):
+                result[job_id][event] = etime
         return dict(result)
+
+
+def _partition_bound(date: datetime) -> int:
+    """Value of FLOOR(StatusTimeOrder) corresponding to ``date``."""
+    return int(date.timestamp()) - MagicEpochDateTime.MAGIC_EPOC_NUMBER
+
+
+def _monthly_partitions(start_date: datetime, end_date: datetime) -> str:
+    """Definition of the monthly partitions from ``start_date`` to ``end_date``.
+
+    The partitions are named p_<year>_<month> and are followed by p_future.
+    """
+    dates = list(rrule(MONTHLY, dtstart=start_date, until=end_date))
+    partition_list = [
+        f"PARTITION p_{name.year}_{name.month} "
+        f"VALUES LESS THAN ({_partition_bound(limit)})"
+        for name, limit in pairwise(dates)
+    ]
+    partition_list.append("PARTITION p_future VALUES LESS THAN (MAXVALUE)")
+    return ",".join(partition_list)
+
+
+async def _get_partitions(conn: AsyncConnection) -> list[tuple[str, str]]:
+    """Names and upper bounds of the LoggingInfo partitions, in order.
+
+    This is always empty if the DB isn't MySQL.
+    """
+    if conn.dialect.name != "mysql":
+        return []
+    query = text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION "
+        "FROM information_schema.partitions "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'LoggingInfo' "
+        "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION"
+    )
+    return [(name, limit) for name, limit in await conn.execute(query)]
+
+
+def _max_seq_num(job_id):
+    """Largest SeqNum used by the records of a job, 0 if it has none."""
+    return (
+        select(func.coalesce(func.max(LoggingInfo.seq_num), 0))
+        .where(LoggingInfo.job_id == job_id)
+        .scalar_subquery()
+    )
+
+
+def _latest_status_times_stmt():
+    return select(
+        LoggingInfo.job_id,
+        LoggingInfo.status,
+        func.max(LoggingInfo.status_time_order),
+    ).group_by(LoggingInfo.job_id, LoggingInfo.status)
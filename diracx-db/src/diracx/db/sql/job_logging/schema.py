@@ -62,3 +62,33 @@ class LoggingInfo(JobLoggingDBBase):
     status_time_order = Column("StatusTimeOrder", MagicEpochDateTime, default=0)
     source = Column("StatusSource", String(32), default="Unknown")
     __table_args__ = (PrimaryKeyConstraint("JobID", "SeqNum"),)
+
+
+class LoggingInfoCounter(JobLoggingDBBase):
+    """Last SeqNum allocated to the LoggingInfo records of each job.
+
+    This allows ``JobLoggingDB.insert_records`` to allocate SeqNums atomically,
+    the row of a job serialising the concurrent insertions. As other writers of
+    LoggingInfo don't update it, the largest SeqNum of the job is still taken
+    into account.
+    """
+
+    __tablename__ = "LoggingInfoCounter"
+    job_id = Column("JobID", Integer, primary_key=True, autoincrement=False)
+    last_seq_num = Column("LastSeqNum", Integer)
+
+
+class LoggingInfoStatusTime(JobLoggingDBBase):
+    """Most recent StatusTimeOrder of each Status reached by a job.
+
+    This is maintained by ``JobLoggingDB.insert_records`` so that the time of the
+    last major status change of a job can be found without reading its history.
+    As the statuses written by DIRAC would be missing, it is only maintained and
+    used once DiracX is the only writer (see ``JobDBSettings.sole_writer``).
+    """
+
+    __tablename__ = "LoggingInfoStatusTime"
+    job_id = Column("JobID", Integer)
+    status = Column("Status", String(32))
+    status_time_order = Column("StatusTimeOrder", MagicEpochDateTime)
+    __table_args__ = (PrimaryKeyConstraint("JobID", "Status"),)
@@ -1,25 +1,32 @@
 from __future__ import annotations
 
 import logging
+from collections.abc import AsyncIterator, Iterable, Mapping
 from contextlib import asynccontextmanager
 from functools import partial
 from typing import Any, AsyncGenerator
 
+from cachetools import Cache, LRUCache, TTLCache
 from sqlalchemy import (
     BigInteger,
     Column,
     Executable,
+    Integer,
     MetaData,
+    String,
     Table,
     and_,
     delete,
+    event,
     exists,
+    func,
     insert,
-    literal,
     or_,
     select,
+    tuple_,
     update,
 )
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.exc import IntegrityError, NoResultFound
 
 from diracx.core.exceptions import (
@@ -36,6 +43,12 @@ from .schema import SandBoxes, SBEntityMapping, SBOwners
 
 logger = logging.getLogger(__name__)
 
+# How long the ids of a sandbox are cached, see `SandboxMetadataDB.get_sandbox_ids`
+SANDBOX_IDS_CACHE_TTL_SECONDS = 60
+SANDBOX_IDS_CACHE_MAX_ITEMS = 10_000
+# Owner ids never change so they are kept until evicted by newer owners
+OWNER_ID_CACHE_MAX_ITEMS = 10_000
+
 
 class SandboxMetadataDB(BaseSQLDB):
     metadata = SandboxMetadataDBBase.metadata
@@ -47,33 +60,148 @@ class SandboxMetadataDB(BaseSQLDB):
         Column("SBId", BigInteger, primary_key=True),
         prefixes=["TEMPORARY"],
     )
+    # Temporary tables to store the jobs, the sandboxes they were using and the
+    # last job using each sandbox, see `unassign_sandboxes_to_jobs`
+    _temp_entities_table = Table(
+        "sb_entities_to_unassign",
+        MetaData(),
+        Column("EntityId", String(128), primary_key=True),
+        Column("Position", Integer, nullable=False),
+        prefixes=["TEMPORARY"],
+    )
+    _temp_entity_sandboxes_table = Table(
+        "sb_to_unassign",
+        MetaData(),
+        Column("EntityId", String(128), primary_key=True),
+        Column("SBId", BigInteger, primary_key=True),
+        Column("Position", Integer, nullable=False),
+        prefixes=["TEMPORARY"],
+    )
+    _temp_sandboxes_last_use_table = Table(
+        "sb_last_use",
+        MetaData(),
+        Column("SBId", BigInteger, primary_key=True),
+        Column("Position", Integer, nullable=False),
+        prefixes=["TEMPORARY"],
+    )
 
-    async def get_owner_id(self, user: UserInfo) -> int | None:
-        """Get the id of the owner from the database."""
-        stmt = select(SBOwners.OwnerID).where(
+    def __init__(self, db_url: str) -> None:
+        super().__init__(db_url)
+        # Maps (se_name, pfn) to (SBId, OwnerId), see `get_sandbox_ids`
+        self._sandbox_ids_cache: Cache = TTLCache(
+            SANDBOX_IDS_CACHE_MAX_ITEMS, SANDBOX_IDS_CACHE_TTL_SECONDS
+        )
+        # Maps (Owner, OwnerGroup, VO) to OwnerID, see `get_owner_id`
+        self._owner_id_cache: Cache = LRUCache(OWNER_ID_CACHE_MAX_ITEMS)
+        self.owner_id_cache_hits = 0
+        self.owner_id_cache_misses = 0
+
+    @asynccontextmanager
+    async def engine_context(self) -> AsyncIterator[None]:
+        # The cached ids are only valid for a given database
+        self._sandbox_ids_cache.clear()
+        self._owner_id_cache.clear()
+        async with super().engine_context():
+            yield
+
+    @staticmethod
+    def _owner_key(user: UserInfo) -> tuple[str, str, str]:
+        return (user.preferred_username, user.dirac_group, user.vo)
+
+    @staticmethod
+    def _owner_id_stmt(user: UserInfo):
+        return select(SBOwners.OwnerID).where(
             SBOwners.Owner == user.preferred_username,
             SBOwners.OwnerGroup == user.dirac_group,
             SBOwners.VO == user.vo,
         )
-        return (await self.conn.execute(stmt)).scalar_one_or_none()
+
+    async def get_owner_id(self, user: UserInfo) -> int | None:
+        """Get the id of the owner from the database.
+
+        The ids are cached as they never change once created, see
+        `owner_id_cache_hits` and `owner_id_cache_misses`.
+        """
+        key = self._owner_key(user)
+        if (owner_id := self._owner_id_cache.get(key)) is not None:
+            self.owner_id_cache_hits += 1
+            return owner_id
+        self.owner_id_cache_misses += 1
+        owner_id = (
+            await self.conn.execute(self._owner_id_stmt(user))
+        ).scalar_one_or_none()
+        if owner_id is not None:
+            self._cache_owner_id_on_commit(key, owner_id)
+        return owner_id
+
+    def _cache_owner_id_on_commit(self, key: tuple[str, str, str], owner_id: int):
+        """Cache the id once the transaction which may have inserted it commits."""
+
+        def cache_owner_id(conn):
+            self._owner_id_cache[key] = owner_id
+
+        event.listen(self.conn.sync_connection, "commit", cache_owner_id, once=True)
+
+    async def get_sandbox_ids(
+        self, se_name: str, pfns: Iterable[str]
+    ) -> dict[str, tuple[int, int]]:
+        """Get the SBId and OwnerId of some sandboxes.
+
+        The ids are cached for a short time as they never change for a given
+        sandbox. Sandboxes which don't exist are missing from the result.
+        """
+        sandbox_ids = {}
+        missing = set()
+        for pfn in pfns:
+            if (ids := self._sandbox_ids_cache.get((se_name, pfn))) is not None:
+                sandbox_ids[pfn] = ids
+            else:
+                missing.add(pfn)
+        if missing:
+            stmt = select(SandBoxes.SEPFN, SandBoxes.SBId, SandBoxes.OwnerId).where(
+                SandBoxes.SEName == se_name, SandBoxes.SEPFN.in_(missing)
+            )
+            for pfn, sb_id, owner_id in await self.conn.execute(stmt):
+                sandbox_ids[pfn] = self._sandbox_ids_cache[(se_name, pfn)] = (
+                    sb_id,
+                    owner_id,
+                )
+        return sandbox_ids
 
     async def get_sandbox_owner_id(self, pfn: str, se_name: str) -> int | None:
         """Get the id of the owner of a sandbox."""
-        stmt = select(SBOwners.OwnerID).where(
-            SBOwners.OwnerID == SandBoxes.OwnerId,
-            SandBoxes.SEName == se_name,
-            SandBoxes.SEPFN == pfn,
-        )
-        return (await self.conn.execute(stmt)).scalar_one_or_none()
+        if ids := (await self.get_sandbox_ids(se_name, [pfn])).get(pfn):
+            return ids[1]
+        return None
 
     async def insert_owner(self, user: UserInfo) -> int:
-        stmt = insert(SBOwners).values(
-            Owner=user.preferred_username,
-            OwnerGroup=user.dirac_group,
-            VO=user.vo,
-        )
-        result = await self.conn.execute(stmt)
-        return result.lastrowid
+        """Insert the owner if it doesn't exist yet and return its id.
+
+        If several requests race to insert the same owner, they all get the id
+        of the row which was inserted first.
+        """
+        values = {
+            "Owner": user.preferred_username,
+            "OwnerGroup": user.dirac_group,
+            "VO": user.vo,
+        }
+        if self.conn.dialect.name == "mysql":
+            stmt = mysql.insert(SBOwners).values(values)
+            stmt = stmt.on_duplicate_key_update(OwnerID=SBOwners.OwnerID)
+        else:
+            dialect = postgresql if self.conn.dialect.name == "postgresql" else sqlite
+            stmt = dialect.insert(SBOwners).values(values)
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(values))
+        await self.conn.execute(stmt)
+        # Lock the row so that it is visible even if it was inserted by a
+        # concurrent transaction after this one started
+        owner_id = (
+            await self.conn.execute(
+                self._owner_id_stmt(user).with_for_update(read=True)
+            )
+        ).scalar_one()
+        self._cache_owner_id_on_commit(self._owner_key(user), owner_id)
+        return owner_id
 
     @staticmethod
     def get_pfn(bucket_name: str, user: UserInfo, sandbox_info: SandboxInfo) -> str:
@@ -105,6 +233,43 @@ class SandboxMetadataDB(BaseSQLDB):
         except IntegrityError as e:
             raise SandboxAlreadyInsertedError(pfn, se_name) from e
 
+    async def insert_sandboxes(
+        self, owner_id: int, se_name: str, sizes: Mapping[str, int]
+    ) -> None:
+        """Add many sandboxes at once, refreshing those which already exist.
+
+        Args:
+            owner_id: the owner of all the sandboxes.
+            se_name: the storage element of all the sandboxes.
+            sizes: mapping of PFN -> size in bytes.
+
+        """
+        values = [
+            {
+                "OwnerId": owner_id,
+                "SEName": se_name,
+                "SEPFN": pfn,
+                "Bytes": size,
+                "RegistrationTime": utcnow(),
+                "LastAccessTime": utcnow(),
+            }
+            # Always insert the rows in the same order to avoid deadlocks
+            for pfn, size in sorted(sizes.items())
+        ]
+        if not values:
+            return
+        if self.conn.dialect.name == "mysql":
+            stmt = mysql.insert(SandBoxes).values(values)
+            stmt = stmt.on_duplicate_key_update(LastAccessTime=utcnow())
+        else:
+            dialect = postgresql if self.conn.dialect.name == "postgresql" else sqlite
+            stmt = dialect.insert(SandBoxes).values(values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[SandBoxes.SEName, SandBoxes.SEPFN],
+                set_={"LastAccessTime": utcnow()},
+            )
+        await self.conn.execute(stmt)
+
     async def update_sandbox_last_access_time(self, se_name: str, pfn: str) -> None:
         stmt = (
             update(SandBoxes)
@@ -133,6 +298,15 @@ class SandboxMetadataDB(BaseSQLDB):
 
         return is_assigned
 
+    async def sandboxes_are_assigned(
+        self, pfns: Iterable[str], se_name: str
+    ) -> dict[str, bool]:
+        """Bulk version of `sandbox_is_assigned`, missing sandboxes are omitted."""
+        stmt = select(SandBoxes.SEPFN, SandBoxes.Assigned).where(
+            SandBoxes.SEName == se_name, SandBoxes.SEPFN.in_(set(pfns))
+        )
+        return {pfn: assigned for pfn, assigned in await self.conn.execute(stmt)}
+
     @staticmethod
     def jobid_to_entity_id(job_id: int) -> str:
         """Define the entity id as 'Entity:entity_id' due to the DB definition."""
@@ -162,64 +336,155 @@ class SandboxMetadataDB(BaseSQLDB):
         se_name: str,
     ) -> None:
         """Map sandbox and jobs."""
-        for job_id in jobs_ids:
-            # Define the entity id as 'Entity:entity_id' due to the DB definition:
-            entity_id = self.jobid_to_entity_id(job_id)
-            select_sb_id = select(
-                SandBoxes.SBId,
-                literal(entity_id).label("EntityId"),
-                literal(sb_type).label("Type"),
-            ).where(
-                SandBoxes.SEName == se_name,
-                SandBoxes.SEPFN == pfn,
-            )
-            stmt = insert(SBEntityMapping).from_select(
-                ["SBId", "EntityId", "Type"], select_sb_id
-            )
-            try:
-                await self.conn.execute(stmt)
-            except IntegrityError as e:
-                raise SandboxAlreadyAssignedError(pfn, se_name) from e
+        await self.assign_sandboxes_to_jobs(
+            [(job_id, pfn, sb_type) for job_id in jobs_ids], se_name
+        )
 
-            stmt = update(SandBoxes).where(SandBoxes.SEPFN == pfn).values(Assigned=True)
-            result = await self.conn.execute(stmt)
-            if result.rowcount == 0:
-                # If the update didn't affect any row, the sandbox doesn't exist
-                # It means the previous insert didn't have any effect
-                raise SandboxNotFoundError(pfn, se_name)
+    async def assign_sandboxes_to_jobs(
+        self,
+        assignments: Iterable[tuple[int, str, SandboxType]],
+        se_name: str,
+    ) -> None:
+        """Map several sandboxes to several jobs at once.
 
-            assert result.rowcount == 1
+        Args:
+            assignments: (job_id, pfn, sandbox type) of each mapping to create.
+            se_name: the storage element of all the sandboxes.
 
-    async def unassign_sandboxes_to_jobs(self, jobs_ids: list[int]) -> None:
-        """Delete mapping between jobs and sandboxes."""
-        for job_id in jobs_ids:
-            entity_id = self.jobid_to_entity_id(job_id)
-            sb_sel_stmt = select(SandBoxes.SBId)
-            sb_sel_stmt = sb_sel_stmt.join(
-                SBEntityMapping, SBEntityMapping.SBId == SandBoxes.SBId
-            )
-            sb_sel_stmt = sb_sel_stmt.where(SBEntityMapping.EntityId == entity_id)
+        """
+        assignments = list(assignments)
+        if not assignments:
+            return
+        pfns = {pfn for _, pfn, _ in assignments}
+
+        sandbox_ids = await self.get_sandbox_ids(se_name, pfns)
+        if not await self._mark_assigned(se_name, sandbox_ids):
+            # Some of the cached ids are outdated, look them up again
+            for pfn in pfns:
+                self._sandbox_ids_cache.pop((se_name, pfn), None)
+            sandbox_ids = await self.get_sandbox_ids(se_name, pfns)
+            await self._mark_assigned(se_name, sandbox_ids)
+        if missing := pfns - sandbox_ids.keys():
+            raise SandboxNotFoundError(", ".join(sorted(missing)), se_name)
 
-            result = await self.conn.execute(sb_sel_stmt)
-            sb_ids = [row.SBId for row in result]
+        try:
+            await self.conn.execute(
+                insert(SBEntityMapping),
+                [
+                    {
+                        "SBId": sandbox_ids[pfn][0],
+                        # Define the entity id as 'Entity:entity_id' due to the DB definition
+                        "EntityId": self.jobid_to_entity_id(job_id),
+                        "Type": sb_type,
+                    }
+                    for job_id, pfn, sb_type in assignments
+                ],
+            )
+        except IntegrityError as e:
+            raise SandboxAlreadyAssignedError(", ".join(sorted(pfns)), se_name) from e
 
-            del_stmt = delete(SBEntityMapping).where(
-                SBEntityMapping.EntityId == entity_id
+    async def _mark_assigned(
+        self, se_name: str, sandbox_ids: dict[str, tuple[int, int]]
+    ) -> bool:
+        """Set the Assigned flag, return False if some of the ids are outdated."""
+        stmt = (
+            update(SandBoxes)
+            .where(
+                SandBoxes.SEName == se_name,
+                tuple_(SandBoxes.SBId, SandBoxes.SEPFN).in_(
+                    [(sb_id, pfn) for pfn, (sb_id, _) in sandbox_ids.items()]
+                ),
             )
-            await self.conn.execute(del_stmt)
+            .values(Assigned=True)
+        )
+        return (await self.conn.execute(stmt)).rowcount == len(sandbox_ids)
 
-            sb_entity_sel_stmt = select(SBEntityMapping.SBId).where(
-                SBEntityMapping.SBId.in_(sb_ids)
+    async def unassign_sandboxes_to_jobs(self, jobs_ids: list[int]) -> None:
+        """Delete mapping between jobs and sandboxes.
+
+        The jobs are handled in the given order: the sandboxes of a job are
+        marked as unassigned if none of them is still mapped to another entity
+        once the mappings of this job and the previous ones are removed. The
+        number of statements doesn't depend on the number of jobs.
+        """
+        if not jobs_ids:
+            return
+        # The position of the first occurrence of each job
+        positions = {
+            self.jobid_to_entity_id(job_id): position
+            for position, job_id in reversed(list(enumerate(jobs_ids)))
+        }
+        entities = self._temp_entities_table
+        entity_sandboxes = self._temp_entity_sandboxes_table
+        last_use = self._temp_sandboxes_last_use_table
+        temp_tables = [entities, entity_sandboxes, last_use]
+        for table in temp_tables:
+            await self.conn.run_sync(partial(table.create, checkfirst=True))
+        try:
+            await self.conn.execute(
+                insert(entities),
+                [
+                    {"EntityId": entity_id, "Position": position}
+                    for entity_id, position in positions.items()
+                ],
             )
-            result = await self.conn.execute(sb_entity_sel_stmt)
-            remaining_sb_ids = [row.SBId for row in result]
-            if not remaining_sb_ids:
-                unassign_stmt = (
-                    update(SandBoxes)
-                    .where(SandBoxes.SBId.in_(sb_ids))
-                    .values(Assigned=False)
+            # Remember which sandboxes were used by each job
+            await self.conn.execute(
+                insert(entity_sandboxes).from_select(
+                    ["EntityId", "SBId", "Position"],
+                    select(
+                        SBEntityMapping.EntityId,
+                        SBEntityMapping.SBId,
+                        entities.c.Position,
+                    ).join(entities, entities.c.EntityId == SBEntityMapping.EntityId),
                 )
-                await self.conn.execute(unassign_stmt)
+            )
+            # Find the last job using each sandbox, the sandboxes which are
+            # also used by other entities are never released
+            await self.conn.execute(
+                insert(last_use).from_select(
+                    ["SBId", "Position"],
+                    select(
+                        SBEntityMapping.SBId,
+                        func.max(func.coalesce(entities.c.Position, len(jobs_ids))),
+                    )
+                    .outerjoin(
+                        entities, entities.c.EntityId == SBEntityMapping.EntityId
+                    )
+                    .where(SBEntityMapping.SBId.in_(select(entity_sandboxes.c.SBId)))
+                    .group_by(SBEntityMapping.SBId),
+                )
+            )
+            await self.conn.execute(
+                delete(SBEntityMapping).where(
+                    SBEntityMapping.EntityId.in_(select(entity_sandboxes.c.EntityId))
+                )
+            )
+            # Keep only the jobs whose sandboxes are not used after them
+            await self.conn.execute(
+                delete(entities).where(
+                    entities.c.EntityId.in_(
+                        select(entity_sandboxes.c.EntityId)
+                        .join(last_use, last_use.c.SBId == entity_sandboxes.c.SBId)
+                        .where(last_use.c.Position > entity_sandboxes.c.Position)
+                    )
+                )
+            )
+            await self.conn.execute(
+                update(SandBoxes)
+                .where(
+                    SandBoxes.SBId.in_(
+                        select(entity_sandboxes.c.SBId).join(
+                            entities,
+                            entities.c.EntityId == entity_sandboxes.c.EntityId,
+                        )
+                    )
+                )
+                .values(Assigned=False)
+            )
+        finally:
+            for table in temp_tables:
+                await self.conn.run_sync(partial(table.drop, checkfirst=True))
 
     @asynccontextmanager
     async def delete_unused_sandboxes(
@@ -272,6 +537,7 @@ class SandboxMetadataDB(BaseSQLDB):
                 SandBoxes.SBId.in_(select(self._temp_table.c.SBId))
             )
             result = await self.conn.execute(delete_stmt)
+            self._sandbox_ids_cache.clear()
             logger.info("Deleted %d expired/unassigned sandboxes", result.rowcount)
 
         finally:
@@ -1,11 +1,8 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import Any, Iterable, Mapping
 
-from sqlalchemy import delete, func, select, update
-
-if TYPE_CHECKING:
-    pass
+from sqlalchemy import bindparam, delete, func, literal, select, union_all, update
 
 from ..utils import BaseSQLDB
 from .schema import (
@@ -24,6 +21,16 @@ from .schema import (
 class TaskQueueDB(BaseSQLDB):
     metadata = TaskQueueDBBase.metadata
 
+    # Tables holding the multi-valued requirements of the task queues
+    multi_value_tables = {
+        "Sites": SitesQueue,
+        "GridCEs": GridCEsQueue,
+        "BannedSites": BannedSitesQueue,
+        "Platforms": PlatformsQueue,
+        "JobTypes": JobTypesQueue,
+        "Tags": TagsQueue,
+    }
+
     async def get_tq_infos_for_jobs(
         self, job_ids: list[int]
     ) -> set[tuple[int, str, str, str]]:
@@ -83,41 +90,54 @@ class TaskQueueDB(BaseSQLDB):
         stmt = delete(JobsQueue).where(JobsQueue.JobId.in_(job_ids))
         await self.conn.execute(stmt)
 
-    async def is_task_queue_empty(self, tq_id: int) -> bool:
-        """Check if a task queue is empty."""
+    async def get_empty_task_queues(self, tq_ids: Iterable[int]) -> set[int]:
+        """Get which of the given enabled task queues do not have any job left."""
         stmt = (
             select(TaskQueues.TQId)
             .where(TaskQueues.Enabled >= 1)
-            .where(TaskQueues.TQId == tq_id)
+            .where(TaskQueues.TQId.in_(tq_ids))
             .where(~TaskQueues.TQId.in_(select(JobsQueue.TQId)))
         )
-        rows = await self.conn.execute(stmt)
-        return not rows.rowcount
-
-    async def delete_task_queue(
-        self,
-        tq_id: int,
-    ):
-        """Delete a task queue."""
-        # Deleting the task queue (the other tables will be deleted in cascade)
-        stmt = delete(TaskQueues).where(TaskQueues.TQId == tq_id)
+        return set((await self.conn.execute(stmt)).scalars())
+
+    async def delete_task_queues(self, tq_ids: Iterable[int]):
+        """Delete several task queues (the other tables will be deleted in cascade)."""
+        stmt = delete(TaskQueues).where(TaskQueues.TQId.in_(tq_ids))
         await self.conn.execute(stmt)
 
-    async def set_priorities_for_entity(
-        self,
-        tq_ids: list[int],
-        priority: float,
-    ):
-        """Set the priority for a user/userGroup combo given a split share."""
-        update_stmt = (
+    async def set_task_queue_priorities(self, priorities: Mapping[int, float]):
+        """Set the priority of many task queues at once.
+
+        :param priorities: mapping of TQId -> priority
+        """
+        if not priorities:
+            return
+        stmt = (
             update(TaskQueues)
-            .where(TaskQueues.TQId.in_(tq_ids))
-            .values(Priority=priority)
+            .where(TaskQueues.TQId == bindparam("b_TQId"))
+            .values(Priority=bindparam("b_Priority"))
+        )
+        await self.conn.execute(
+            stmt,
+            [
+                {"b_TQId": tq_id, "b_Priority": priority}
+                for tq_id, priority in priorities.items()
+            ],
         )
-        await self.conn.execute(update_stmt)
 
-    async def retrieve_task_queues(self, tq_id_list=None):
-        """Get all the task queues."""
+    async def retrieve_task_queues(
+        self, tq_id_list: list[int] | None = None
+    ) -> dict[int, dict[str, Any]]:
+        """Get the task queues together with their matching requirements.
+
+        This runs two queries regardless of the number of task queues: one for
+        the task queues themselves and one for all of their multi-valued fields
+        (Sites, GridCEs, ...).
+
+        :param tq_id_list: the task queues to retrieve, all of them if None
+        :return: mapping of TQId -> {Priority, Jobs, Owner, OwnerGroup, VO,
+            CPUTime, Sites, GridCEs, BannedSites, Platforms, JobTypes, Tags}
+        """
         if tq_id_list is not None and not tq_id_list:
             # Empty list => Fast-track no matches
             return {}
@@ -133,8 +153,6 @@ class TaskQueueDB(BaseSQLDB):
                 TaskQueues.CPUTime,
             )
             .join(JobsQueue, TaskQueues.TQId == JobsQueue.TQId)
-            .join(SitesQueue, TaskQueues.TQId == SitesQueue.TQId)
-            .join(GridCEsQueue, TaskQueues.TQId == GridCEsQueue.TQId)
             .group_by(
                 TaskQueues.TQId,
                 TaskQueues.Priority,
@@ -147,34 +165,36 @@ class TaskQueueDB(BaseSQLDB):
         if tq_id_list is not None:
             stmt = stmt.where(TaskQueues.TQId.in_(tq_id_list))
 
-        tq_data: dict[int, dict[str, list[str]]] = dict(
-            dict(row._mapping) for row in await self.conn.execute(stmt)
-        )
-        # TODO: the line above should be equivalent to the following commented code, check this is the case
-        # for record in rows:
-        #     tqId = record[0]
-        #     tqData[tqId] = {
-        #         "Priority": record[1],
-        #         "Jobs": record[2],
-        #         "Owner": record[3],
-        #         "OwnerGroup": record[4],
-        #         "VO": record[5],
-        #         "CPUTime": record[6],
-        #     }
-
-        for tq_id in tq_data:
-            # TODO: maybe factorize this handy tuple list
-            for table, field in {
-                (SitesQueue, "Sites"),
-                (GridCEsQueue, "GridCEs"),
-                (BannedSitesQueue, "BannedSites"),
-                (PlatformsQueue, "Platforms"),
-                (JobTypesQueue, "JobTypes"),
-                (TagsQueue, "Tags"),
-            }:
-                stmt = select(table.Value).where(table.TQId == tq_id)
-                tq_data[tq_id][field] = list(
-                    row[0] for row in await self.conn.execute(stmt)
+        tq_data: dict[int, dict[str, Any]] = {}
+        for row in await self.conn.execute(stmt):
+            tq_data[row.TQId] = {
+                "Priority": row.Priority,
+                "Jobs": row.Jobs,
+                "Owner": row.Owner,
+                "OwnerGroup": row.OwnerGroup,
+                "VO": row.VO,
+                "CPUTime": row.CPUTime,
+            } | {field: [] for field in self.multi_value_tables}
+        if not tq_data:
+            return tq_data
+
+        # Fetch the values of all the multi-valued fields at once. The TQ ids
+        # are only bound once, in a CTE shared by all the tables.
+        tq_ids = select(TaskQueues.TQId)
+        if tq_id_list is not None:
+            tq_ids = tq_ids.where(TaskQueues.TQId.in_(tq_id_list))
+        tq_ids_cte = tq_ids.cte("tq_ids")
+        stmt = union_all(
+            *(
+                select(literal(field).label("Field"), table.TQId, table.Value).where(
+                    table.TQId.in_(select(tq_ids_cte.c.TQId))
                 )
+                for field, table in self.multi_value_tables.items()
+            )
+        ).order_by("Field", "TQId", "Value")
+        for field, tq_id, value in await self.conn.execute(stmt):
+            # TQs without jobs are not returned by the first query
+            if tq_id in tq_data:
+                tq_data[tq_id][field].append(value)
 
         return tq_data
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import base64
 import contextlib
+import json
 import logging
 import os
 import re
@@ -12,7 +14,7 @@ from typing import Any, Self, cast
 from uuid import UUID as StdUUID  # noqa: N811
 
 from pydantic import TypeAdapter
-from sqlalchemy import DateTime, MetaData, func, select
+from sqlalchemy import DateTime, MetaData, and_, false, func, or_, select
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 from uuid_utils import UUID, uuid7
@@ -28,7 +30,7 @@ from diracx.core.settings import SqlalchemyDsn
 from diracx.db.exceptions import DBUnavailableError
 from diracx.db.sql.utils.types import SmarterDateTime
 
-from .functions import date_trunc
+from .functions import date_trunc, explain
 
 logger = logging.getLogger(__name__)
 
@@ -249,37 +251,168 @@ class BaseSQLDB(metaclass=ABCMeta):
         distinct: bool = False,
         per_page: int = 100,
         page: int | None = None,
-    ) -> tuple[int, list[dict[str, Any]]]:
-        """Search for elements in a table."""
-        # Find which columns to select
-        columns = _get_columns(table.__table__, parameters)
-
-        stmt = select(*columns)
+        count: bool = True,
+    ) -> tuple[int | None, list[dict[str, Any]]]:
+        """Search for elements in a table.
 
-        stmt = apply_search_filters(table.__table__.columns.__getitem__, stmt, search)
+        :param count: whether to count the total number of matching elements,
+            if False None is returned instead of the total
+        """
+        stmt = _search_stmt(table, parameters, search, distinct)
         stmt = apply_sort_constraints(table.__table__.columns.__getitem__, stmt, sorts)
 
-        if distinct:
-            stmt = stmt.distinct()
-
         # Calculate total count before applying pagination
-        total_count_subquery = stmt.alias()
-        total_count_stmt = select(func.count()).select_from(total_count_subquery)
-        total = (await self.conn.execute(total_count_stmt)).scalar_one()
-
-        # Apply pagination
-        if page is not None:
-            if page < 1:
-                raise InvalidQueryError("Page must be a positive integer")
-            if per_page < 1:
-                raise InvalidQueryError("Per page must be a positive integer")
-            stmt = stmt.offset((page - 1) * per_page).limit(per_page)
+        total = None
+        if count:
+            total_count_stmt = select(func.count()).select_from(stmt.alias())
+            total = (await self.conn.execute(total_count_stmt)).scalar_one()
+
+        stmt = _paginate(stmt, page, per_page)
 
         # Execute the query
         return total, [
             dict(row._mapping) async for row in (await self.conn.stream(stmt))
         ]
 
+    def _search_stream(
+        self,
+        table: Any,
+        parameters: list[str] | None,
+        search: list[SearchSpec],
+        sorts: list[SortSpec],
+        *,
+        distinct: bool = False,
+        per_page: int = 100,
+        page: int | None = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Search for elements in a table, yielding them in batches as they are
+        read from the database rather than loading all of them in memory.
+
+        The query is validated immediately so that invalid searches raise before
+        starting the iteration. The iteration must happen within the transaction.
+        """
+        stmt = _search_stmt(table, parameters, search, distinct)
+        stmt = apply_sort_constraints(table.__table__.columns.__getitem__, stmt, sorts)
+        stmt = _paginate(stmt, page, per_page)
+
+        async def iter_batches() -> AsyncIterator[list[dict[str, Any]]]:
+            result = await self.conn.stream(stmt)
+            async for rows in result.partitions(batch_size):
+                yield [dict(row._mapping) for row in rows]
+
+        return iter_batches()
+
+    async def _count(
+        self,
+        table: Any,
+        parameters: list[str] | None,
+        search: list[SearchSpec],
+        *,
+        distinct: bool = False,
+    ) -> int:
+        """Count the elements of a table which would be returned by ``_search``."""
+        stmt = _search_stmt(table, parameters, search, distinct)
+        total_count_stmt = select(func.count()).select_from(stmt.alias())
+        return (await self.conn.execute(total_count_stmt)).scalar_one()
+
+    async def _estimate_count(
+        self,
+        table: Any,
+        parameters: list[str] | None,
+        search: list[SearchSpec],
+        *,
+        distinct: bool = False,
+    ) -> int | None:
+        """Estimate the number of elements which would be returned by ``_search``.
+
+        The estimate comes from the query planner so it is cheap to get but can
+        be far from the real value. None is returned if no estimate is available,
+        which is the case for DISTINCT queries and for databases other than MySQL.
+        """
+        if distinct or self.conn.dialect.name != "mysql":
+            return None
+        stmt = _search_stmt(table, parameters, search, distinct)
+        plan = (await self.conn.execute(explain(stmt))).mappings().first()
+        if plan is None or plan["rows"] is None:
+            return None
+        # "filtered" is the percentage of the examined rows matching the conditions
+        return round(plan["rows"] * float(plan["filtered"] or 100) / 100)
+
+    async def _search_with_cursor(
+        self,
+        table: Any,
+        parameters: list[str] | None,
+        search: list[SearchSpec],
+        sorts: list[SortSpec],
+        *,
+        per_page: int = 100,
+        cursor: str | None = None,
+        count: bool = True,
+    ) -> tuple[int | None, list[dict[str, Any]], str | None]:
+        """Search for elements in a table using keyset pagination.
+
+        Rather than skipping the first rows with an OFFSET, each page starts
+        right after the sort key of the last row of the previous page, so all the
+        pages are equally cheap to fetch. The primary key is appended to the sort
+        to ensure that the sort keys are unique.
+
+        NULL values are assumed to sort before any other value, as they do with
+        MySQL and SQLite.
+
+        :param cursor: continuation token returned for the previous page, None
+            to get the first page
+        :param count: whether to count the total number of matching elements
+        :return: the total number of elements (None if count is False), the
+            elements of the page and the token to get the next page (None if
+            this is the last page)
+        """
+        if per_page < 1:
+            raise InvalidQueryError("Per page must be a positive integer")
+
+        column_mapping = table.__table__.columns.__getitem__
+        columns = _get_columns(table.__table__, parameters)
+        sorts = list(sorts)
+        sorted_parameters = {sort["parameter"] for sort in sorts}
+        sorts.extend(
+            SortSpec(parameter=column.name, direction=SortDirection.ASC)
+            for column in table.__table__.primary_key.columns
+            if column.name not in sorted_parameters
+        )
+        try:
+            sort_columns = [column_mapping(sort["parameter"]) for sort in sorts]
+        except KeyError as e:
+            raise InvalidQueryError(f"Cannot sort by {e}: unknown column") from e
+
+        # The sort key of the last row must be known to build the next cursor
+        stmt = select(*columns, *(c for c in sort_columns if c not in columns))
+        stmt = apply_search_filters(column_mapping, stmt, search)
+
+        total = None
+        if count:
+            total_count_stmt = select(func.count()).select_from(stmt.alias())
+            total = (await self.conn.execute(total_count_stmt)).scalar_one()
+
+        stmt = apply_sort_constraints(column_mapping, stmt, sorts)
+        if cursor is not None:
+            sort_key = decode_search_cursor(cursor, sorts)
+            stmt = stmt.where(keyset_condition(sort_columns, sorts, sort_key))
+        # Fetch one extra row to know whether there is a next page
+        stmt = stmt.limit(per_page + 1)
+
+        rows = [row._mapping async for row in await self.conn.stream(stmt)]
+        next_cursor = None
+        if len(rows) > per_page:
+            rows = rows[:per_page]
+            next_cursor = encode_search_cursor(
+                [rows[-1][column.name] for column in sort_columns], sorts
+            )
+        return (
+            total,
+            [{column.name: row[column.name] for column in columns} for row in rows],
+            next_cursor,
+        )
+
     async def _summary(
         self, table: Any, group_by: list[str], search: list[SearchSpec]
     ) -> list[dict[str, str | int]]:
@@ -305,6 +438,26 @@ class BaseSQLDB(metaclass=ABCMeta):
         ]
 
 
+def _search_stmt(table, parameters, search, distinct):
+    """Build the unsorted and unpaginated statement used by ``_search``."""
+    columns = _get_columns(table.__table__, parameters)
+    stmt = select(*columns)
+    stmt = apply_search_filters(table.__table__.columns.__getitem__, stmt, search)
+    if distinct:
+        stmt = stmt.distinct()
+    return stmt
+
+
+def _paginate(stmt, page, per_page):
+    if page is not None:
+        if page < 1:
+            raise InvalidQueryError("Page must be a positive integer")
+        if per_page < 1:
+            raise InvalidQueryError("Per page must be a positive integer")
+        stmt = stmt.offset((page - 1) * per_page).limit(per_page)
+    return stmt
+
+
 def find_time_resolution(value):
     if isinstance(value, datetime):
         return None, value
@@ -425,6 +578,64 @@ def apply_sort_constraints(column_mapping, stmt, sorts):
     return stmt
 
 
+def encode_search_cursor(sort_key: list[Any], sorts: list[SortSpec]) -> str:
+    """Build the opaque continuation token of a keyset paginated search.
+
+    The token contains the sort key of the last returned row, together with the
+    sort it relates to so that it can't be reused with a different query order.
+    """
+    values = [
+        {"dt": value.isoformat()} if isinstance(value, datetime) else value
+        for value in sort_key
+    ]
+    order = [[sort["parameter"], sort["direction"]] for sort in sorts]
+    data = json.dumps({"k": values, "s": order}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str, sorts: list[SortSpec]) -> list[Any]:
+    """Get the sort key from a token built by ``encode_search_cursor``."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        order = [[sort["parameter"], sort["direction"]] for sort in sorts]
+        if data["s"] != order or len(data["k"]) != len(sorts):
+            raise InvalidQueryError("The cursor does not match the requested sort")
+        return [
+            datetime.fromisoformat(value["dt"]) if isinstance(value, dict) else value
+            for value in data["k"]
+        ]
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidQueryError("Invalid cursor") from e
+
+
+def keyset_condition(columns, sorts: list[SortSpec], sort_key: list[Any]):
+    """Condition selecting the rows which sort after ``sort_key``.
+
+    This is the expanded form of ``(c1, c2, ...) > (v1, v2, ...)`` which also
+    supports mixed sort directions and NULL values (sorted first):
+    ``c1 > v1 OR (c1 = v1 AND c2 > v2) OR ...``
+    """
+    conditions = []
+    for i, (column, sort, value) in enumerate(zip(columns, sorts, sort_key)):
+        if sort["direction"] == SortDirection.ASC:
+            after = column.is_not(None) if value is None else column > value
+        elif value is None:
+            # Nothing sorts after NULL in descending order
+            continue
+        else:
+            after = or_(column < value, column.is_(None))
+        conditions.append(
+            and_(
+                *(
+                    c.is_(None) if v is None else c == v
+                    for c, v in zip(columns[:i], sort_key[:i])
+                ),
+                after,
+            )
+        )
+    return or_(false(), *conditions)
+
+
 def uuid7_to_datetime(uuid: UUID | StdUUID | str) -> datetime:
     """Convert a UUIDv7 to a datetime."""
     if isinstance(uuid, StdUUID):
@@ -140,3 +140,22 @@ def substract_date(**kwargs: float) -> datetime:
 
 def hash(code: str):
     return hashlib.sha256(code.encode()).hexdigest()
+
+
+class explain(expression.Executable, expression.ClauseElement):  # noqa: N801
+    """Sqlalchemy construct to get the query plan of a statement.
+
+    The bound parameters of the statement are processed as usual, e.g.
+
+        await conn.execute(explain(select(Jobs.job_id).where(...)))
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement) -> None:
+        self.statement = statement
+
+
+@compiles(explain)
+def default_explain(element, compiler, **kw) -> str:
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
@@ -5,6 +5,7 @@ from zoneinfo import ZoneInfo
 
 import pytest
 import sqlalchemy
+from sqlalchemy.dialects import mysql
 from sqlalchemy.exc import IntegrityError
 
 from diracx.core.exceptions import InvalidQueryError
@@ -17,6 +18,8 @@ from diracx.core.models import (
     VectorSearchSpec,
 )
 from diracx.db.sql.job.db import JobDB
+from diracx.db.sql.job.schema import Jobs
+from diracx.db.sql.utils.functions import explain
 
 
 @pytest.fixture
@@ -384,8 +387,173 @@ async def test_search_pagination(populated_job_db):
             result = await job_db.search([], [], [], per_page=0, page=1)
 
 
+@pytest.mark.parametrize(
+    "sorts",
+    [
+        [],
+        [SortSpec(parameter="JobID", direction=SortDirection.DESC)],
+        [
+            SortSpec(parameter="OwnerGroup", direction=SortDirection.DESC),
+            SortSpec(parameter="Site", direction=SortDirection.ASC),
+        ],
+        [
+            SortSpec(parameter="Site", direction=SortDirection.DESC),
+            SortSpec(parameter="HeartBeatTime", direction=SortDirection.ASC),
+        ],
+    ],
+)
+async def test_search_with_cursor(populated_job_db, sorts):
+    """Iterating with a cursor gives the same jobs as a single search."""
+    async with populated_job_db as job_db:
+        # Have some NULL values and duplicated sort keys
+        await job_db.set_job_attributes(
+            {
+                job_id: {
+                    "Site": f"Site{job_id % 3}",
+                    "HeartBeatTime": datetime(
+                        2025, 1, 1 + job_id % 4, tzinfo=ZoneInfo("UTC")
+                    ),
+                }
+                for job_id in range(1, 101, 2)
+            }
+        )
+        _, expected = await job_db.search(
+            ["JobID"],
+            [],
+            sorts + [SortSpec(parameter="JobID", direction=SortDirection.ASC)],
+        )
+
+        jobs = []
+        cursor = None
+        for _ in range(100):
+            total, page, cursor = await job_db.search_with_cursor(
+                ["JobID"], [], sorts, per_page=7, cursor=cursor
+            )
+            assert total == 100
+            assert len(page) == 7 or cursor is None
+            jobs.extend(page)
+            if cursor is None:
+                break
+        assert jobs == expected
+
+
+async def test_search_with_cursor_options(populated_job_db):
+    search = [
+        ScalarSearchSpec(
+            parameter="OwnerGroup",
+            operator=ScalarSearchOperator.EQUAL,
+            value="owner_group2",
+        )
+    ]
+    sorts = [SortSpec(parameter="Owner", direction=SortDirection.ASC)]
+    async with populated_job_db as job_db:
+        total, page, cursor = await job_db.search_with_cursor(
+            ["JobID"], search, sorts, per_page=40, count=False
+        )
+        assert total is None
+        assert len(page) == 40
+        # Only the requested parameters are returned
+        assert set(page[0]) == {"JobID"}
+        assert cursor is not None
+
+        total, page, next_cursor = await job_db.search_with_cursor(
+            ["JobID"], search, sorts, per_page=40, cursor=cursor
+        )
+        assert total == 50
+        assert len(page) == 10
+        assert next_cursor is None
+
+        # The cursor can't be used with a different sort
+        with pytest.raises(InvalidQueryError):
+            await job_db.search_with_cursor(["JobID"], search, [], cursor=cursor)
+        with pytest.raises(InvalidQueryError):
+            await job_db.search_with_cursor(["JobID"], search, sorts, cursor="bad")
+        with pytest.raises(InvalidQueryError):
+            await job_db.search_with_cursor(["JobID"], search, sorts, per_page=0)
+
+
+async def test_search_stream(populated_job_db):
+    sorts = [SortSpec(parameter="JobID", direction=SortDirection.DESC)]
+    async with populated_job_db as job_db:
+        _, expected = await job_db.search(None, [], sorts, per_page=70, page=2)
+        batches = job_db.search_stream(None, [], sorts, per_page=70, page=2)
+        # The rows are read in batches
+        batch_lengths = []
+        jobs = []
+        async for batch in batches:
+            batch_lengths.append(len(batch))
+            jobs.extend(batch)
+        assert jobs == expected
+        assert batch_lengths == [30]
+
+        # Invalid searches fail before iterating
+        with pytest.raises(InvalidQueryError):
+            job_db.search_stream(["JobID"], [], sorts, per_page=0, page=1)
+
+
+async def test_count(populated_job_db):
+    search = [
+        ScalarSearchSpec(
+            parameter="OwnerGroup",
+            operator=ScalarSearchOperator.EQUAL,
+            value="owner_group1",
+        )
+    ]
+    async with populated_job_db as job_db:
+        total, result = await job_db.search(None, search, [], count=False)
+        assert total is None
+        assert len(result) == 50
+
+        assert await job_db.count(None, search) == 50
+        assert await job_db.count(["OwnerGroup"], [], distinct=True) == 2
+        # No planner estimate with SQLite
+        assert await job_db.estimate_count(None, search) is None
+
+
+async def test_explain_statement():
+    stmt = explain(sqlalchemy.select(Jobs.job_id).where(Jobs.owner == "me"))
+    compiled = stmt.compile(dialect=mysql.dialect())
+    assert str(compiled).startswith("EXPLAIN SELECT `Jobs`.`JobID`")
+    assert list(compiled.params.values()) == ["me"]
+
+
 async def test_set_job_commands_invalid_job_id(job_db: JobDB):
     """Test that setting a command for a non-existent job raises JobNotFound."""
     async with job_db as job_db:
         with pytest.raises(IntegrityError):
             await job_db.set_job_commands([(123456, "test_command", "")])
+
+
+async def test_add_heartbeats(populated_job_db: JobDB):
+    t1 = datetime(2025, 1, 1, 12, tzinfo=ZoneInfo("UTC"))
+    t2 = datetime(2025, 1, 1, 13, tzinfo=ZoneInfo("UTC"))
+    async with populated_job_db as job_db:
+        await job_db.add_heartbeats(
+            {
+                1: (t1, {"LoadAverage": 1.5, "MemoryUsed": 1024}),
+                2: (t2, {}),
+                3: (t2, {"CPUConsumed": 10}),
+            }
+        )
+
+        _, result = await job_db.search(
+            ["JobID", "HeartBeatTime"],
+            [],
+            [SortSpec(parameter="JobID", direction=SortDirection.ASC)],
+        )
+        assert [r["HeartBeatTime"] for r in result[:4]] == [t1, t2, t2, None]
+
+        rows = await job_db.conn.execute(
+            sqlalchemy.text(
+                "SELECT JobID, Name, Value FROM HeartBeatLoggingInfo "
+                "ORDER BY JobID, Name"
+            )
+        )
+        assert [tuple(row) for row in rows] == [
+            (1, "LoadAverage", "1.5"),
+            (1, "MemoryUsed", "1024"),
+            (3, "CPUConsumed", "10"),
+        ]
+
+        with pytest.raises(InvalidQueryError):
+            await job_db.add_heartbeats({1: (t2, {"NotAHeartbeatField": 1})})
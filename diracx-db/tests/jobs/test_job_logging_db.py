@@ -1,11 +1,26 @@
 from __future__ import annotations
 
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
 
 import pytest
+from dateutil.relativedelta import relativedelta
+from pydantic_core import to_json
+from sqlalchemy import delete, select
 
-from diracx.core.models import JobLoggingRecord, JobStatus
-from diracx.db.sql import JobLoggingDB
+from diracx.core.models import JobLoggingRecord, JobStatus, JobStatusReturn
+from diracx.db.sql import JobDB, JobLoggingDB
+from diracx.db.sql.job_logging import db as job_logging_db_module
+from diracx.db.sql.job_logging.db import _get_partitions
+from diracx.db.sql.job_logging.schema import (
+    LoggingInfo,
+    LoggingInfoCounter,
+    LoggingInfoStatusTime,
+)
 
 
 @pytest.fixture
@@ -94,3 +109,469 @@ async def test_insert_records(job_logging_db: JobLoggingDB):
         assert abs(res[1]["Received"] - date_1) < timedelta(microseconds=1000)
         assert abs(res[1]["Submitting"] - date_2) < timedelta(microseconds=1000)
         assert abs(res[1]["Running"] - date_3) < timedelta(microseconds=1000)
+
+
+def make_record(job_id: int, minor_status: str) -> JobLoggingRecord:
+    return JobLoggingRecord(
+        job_id=job_id,
+        status=JobStatus.RUNNING,
+        minor_status=minor_status,
+        application_status="idem",
+        date=datetime.now(timezone.utc),
+        source="pytest",
+    )
+
+
+async def get_seq_nums(job_logging_db: JobLoggingDB) -> dict[int, list[int]]:
+    async with job_logging_db:
+        rows = await job_logging_db.conn.execute(
+            select(LoggingInfo.job_id, LoggingInfo.seq_num).order_by(
+                LoggingInfo.job_id, LoggingInfo.seq_num
+            )
+        )
+        seq_nums: dict[int, list[int]] = {}
+        for job_id, seq_num in rows:
+            seq_nums.setdefault(job_id, []).append(seq_num)
+        return seq_nums
+
+
+async def test_concurrent_insert_records(tmp_path):
+    """Many writers adding records to the same jobs never reuse a SeqNum."""
+    # The writers wait for each other to release the SQLite write lock
+    job_logging_db = JobLoggingDB(
+        f"sqlite+aiosqlite:///{tmp_path}/logging.db?timeout=60"
+    )
+    n_writers, n_batches, job_ids = 20, 10, [1, 2, 3, 4, 5]
+
+    async def writer(writer_id: int):
+        for batch in range(n_batches):
+            async with job_logging_db:
+                await job_logging_db.insert_records(
+                    [
+                        make_record(job_id, f"writer {writer_id} batch {batch}")
+                        # Each writer touches the jobs in a different order
+                        for job_id in job_ids[writer_id % 5 :] + job_ids
+                    ]
+                )
+            await asyncio.sleep(0)
+
+    async with job_logging_db.engine_context():
+        async with job_logging_db.engine.begin() as conn:
+            await conn.run_sync(job_logging_db.metadata.create_all)
+
+        await asyncio.gather(*(writer(i) for i in range(n_writers)))
+
+        seq_nums = await get_seq_nums(job_logging_db)
+        assert set(seq_nums) == set(job_ids)
+        for job_id in job_ids:
+            n_records = sum(
+                n_batches * (1 + (job_id > writer_id % 5))
+                for writer_id in range(n_writers)
+            )
+            assert seq_nums[job_id] == list(range(1, n_records + 1))
+
+        async with job_logging_db:
+            records = await job_logging_db.get_records(job_ids)
+            assert all(r.ApplicationStatus == "Unknown" for r in records[1])
+
+
+async def test_seq_num_counters(job_logging_db: JobLoggingDB):
+    async with job_logging_db:
+        await job_logging_db.insert_records(
+            [make_record(1, "a"), make_record(2, "a"), make_record(1, "b")]
+        )
+        # Records written before the counters were introduced
+        await job_logging_db.conn.execute(delete(LoggingInfoCounter))
+        await JobLoggingDB.post_create(job_logging_db.conn)
+        await job_logging_db.insert_records([make_record(1, "c"), make_record(3, "a")])
+    assert await get_seq_nums(job_logging_db) == {1: [1, 2, 3], 2: [1], 3: [1]}
+
+    # Records written by something which doesn't update the counters (e.g. DIRAC)
+    async with job_logging_db:
+        now = datetime.now(timezone.utc)
+        await job_logging_db.conn.execute(
+            LoggingInfo.__table__.insert(),
+            [
+                {"JobID": job_id, "SeqNum": seq_num, "StatusTimeOrder": now}
+                for job_id, seq_num in [(1, 4), (4, 1)]
+            ],
+        )
+        await job_logging_db.insert_records([make_record(1, "d"), make_record(4, "a")])
+    assert await get_seq_nums(job_logging_db) == {
+        1: [1, 2, 3, 4, 5],
+        2: [1],
+        3: [1],
+        4: [1, 2],
+    }
+
+    # The numbering starts again when the records of a job are deleted
+    async with job_logging_db:
+        await job_logging_db.delete_records([1])
+        await job_logging_db.insert_records([make_record(1, "e")])
+    assert await get_seq_nums(job_logging_db) == {1: [1], 2: [1], 3: [1], 4: [1, 2]}
+
+
+async def test_seq_num_counters_sole_writer():
+    job_logging_db = JobLoggingDB("sqlite+aiosqlite:///:memory:", sole_writer=True)
+    async with job_logging_db.engine_context():
+        async with job_logging_db.engine.begin() as conn:
+            await conn.run_sync(job_logging_db.metadata.create_all)
+
+        # Only the counters are used, the existing records aren't looked at
+        async with job_logging_db:
+            await job_logging_db.insert_records(
+                [make_record(1, "a"), make_record(2, "a"), make_record(1, "b")]
+            )
+        async with job_logging_db:
+            await job_logging_db.insert_records(
+                [make_record(1, "c"), make_record(3, "a")]
+            )
+        assert await get_seq_nums(job_logging_db) == {1: [1, 2, 3], 2: [1], 3: [1]}
+
+
+@pytest.mark.parametrize("sole_writer", [True, False])
+async def test_wms_time_stamps(monkeypatch, sole_writer: bool):
+    monkeypatch.setenv("DIRACX_DB_JOBS_SOLE_WRITER", str(sole_writer).lower())
+    job_logging_db = JobLoggingDB("sqlite+aiosqlite:///:memory:")
+    assert job_logging_db.sole_writer == sole_writer
+    async with job_logging_db.engine_context():
+        async with job_logging_db.engine.begin() as conn:
+            await conn.run_sync(job_logging_db.metadata.create_all)
+        await check_wms_time_stamps(job_logging_db)
+
+        async with job_logging_db:
+            rows = await job_logging_db.conn.execute(select(LoggingInfoStatusTime))
+            assert len(rows.all()) == (2 if sole_writer else 0)
+            # A status written by something else (e.g. DIRAC) is only seen if
+            # the time stamps aren't tracked
+            t1 = datetime(2025, 1, 2, tzinfo=timezone.utc)
+            await job_logging_db.conn.execute(
+                LoggingInfo.__table__.insert(),
+                [{"JobID": 2, "SeqNum": 3, "Status": "Done", "StatusTimeOrder": t1}],
+            )
+            time_stamps = await job_logging_db.get_wms_time_stamps([2])
+            assert ("Done" in time_stamps[2]) != sole_writer
+
+
+async def check_wms_time_stamps(job_logging_db: JobLoggingDB):
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    async with job_logging_db:
+        await job_logging_db.insert_records(make_history(1, 5, t0))
+        # Records which are older than the ones already known
+        await job_logging_db.insert_records(
+            make_history(1, 3, t0 - timedelta(days=1)) + make_history(2, 2, t0)
+        )
+        expected = {
+            1: {
+                "Received": t0,
+                "Checking": t0 + timedelta(seconds=1),
+                "Waiting": t0 + timedelta(seconds=2),
+                "idem": t0 + timedelta(seconds=4),
+            },
+            2: {"Received": t0, "Checking": t0 + timedelta(seconds=1)},
+        }
+        assert await job_logging_db.get_wms_time_stamps([1, 2, 3]) == expected
+
+        # Jobs whose records were written without the time stamps being
+        # tracked are read from their history
+        await job_logging_db.conn.execute(
+            delete(LoggingInfoStatusTime).where(LoggingInfoStatusTime.job_id == 2)
+        )
+        assert await job_logging_db.get_wms_time_stamps([1, 2, 3]) == expected
+
+        await job_logging_db.conn.execute(delete(LoggingInfoStatusTime))
+        await JobLoggingDB.post_create(job_logging_db.conn)
+        rows = await job_logging_db.conn.execute(select(LoggingInfoStatusTime))
+        assert len(rows.all()) == (6 if job_logging_db.sole_writer else 0)
+        assert await job_logging_db.get_wms_time_stamps([1, 2, 3]) == expected
+
+        await job_logging_db.delete_records([1])
+        assert await job_logging_db.get_wms_time_stamps([1, 2]) == {2: expected[2]}
+
+
+async def test_expire_records(job_logging_db: JobLoggingDB):
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    async with job_logging_db:
+        await job_logging_db.insert_records(
+            make_history(1, 3, t0 - timedelta(days=40))
+            + make_history(2, 3, t0 - timedelta(days=40))
+            + make_history(2, 3, t0)
+            + make_history(3, 3, t0 - timedelta(days=40))
+            + make_history(4, 3, t0 - timedelta(days=40))
+        )
+        # Jobs 1 and 2 were removed from the JobDB, 3 and 4 still exist
+        await job_logging_db.expire_records(t0 - timedelta(days=1), first_live_job_id=3)
+    expected = {2: [4, 5, 6], 3: [1, 2, 3], 4: [1, 2, 3]}
+    assert await get_seq_nums(job_logging_db) == expected
+
+    # Nothing is left behind for the jobs whose records have all expired
+    async with job_logging_db:
+        rows = await job_logging_db.conn.execute(select(LoggingInfoCounter.job_id))
+        assert {job_id for (job_id,) in rows} == {2, 3, 4}
+
+    # Jobs can still be deleted individually
+    async with job_logging_db:
+        await job_logging_db.delete_records([3])
+    assert await get_seq_nums(job_logging_db) == {2: [4, 5, 6], 4: [1, 2, 3]}
+
+    # Everything old is expired once the JobDB is empty
+    async with job_logging_db:
+        await job_logging_db.expire_records(
+            t0 - timedelta(days=1), first_live_job_id=None
+        )
+    assert await get_seq_nums(job_logging_db) == {2: [4, 5, 6]}
+
+
+async def test_expire_job_logging_command(tmp_path, monkeypatch):
+    """The command only expires the history of the jobs removed from the JobDB."""
+    from diracx.db.__main__ import expire_job_logging
+
+    monkeypatch.setenv("DIRACX_DB_URL_JOBDB", f"sqlite+aiosqlite:///{tmp_path}/j.db")
+    monkeypatch.setenv(
+        "DIRACX_DB_URL_JOBLOGGINGDB", f"sqlite+aiosqlite:///{tmp_path}/jl.db"
+    )
+    job_db = JobDB(f"sqlite+aiosqlite:///{tmp_path}/j.db")
+    job_logging_db = JobLoggingDB(f"sqlite+aiosqlite:///{tmp_path}/jl.db")
+    old = datetime.now(timezone.utc) - timedelta(days=40)
+    async with job_db.engine_context(), job_logging_db.engine_context():
+        for db in (job_db, job_logging_db):
+            async with db.engine.begin() as conn:
+                await conn.run_sync(db.metadata.create_all)
+        async with job_db:
+            job_ids = [await job_db.create_job("") for _ in range(3)]
+            await job_db.delete_jobs(job_ids[:1])
+        async with job_logging_db:
+            await job_logging_db.insert_records(
+                [r for job_id in job_ids for r in make_history(job_id, 3, old)]
+            )
+
+    await expire_job_logging(retention_days=30)
+
+    async with job_logging_db.engine_context():
+        assert set(await get_seq_nums(job_logging_db)) == set(job_ids[1:])
+
+
+@pytest.fixture
+def mysql_url():
+    """URL of an empty MySQL database which the test can modify."""
+    url = os.environ.get("DIRACX_TEST_MYSQL_URL")
+    if not url:
+        pytest.skip("Set DIRACX_TEST_MYSQL_URL to run the MySQL tests")
+    return url
+
+
+async def test_expire_job_logging_command_mysql(monkeypatch, mysql_url):
+    """Partitions are dropped and added without waiting on the command itself."""
+    from diracx.db.__main__ import expire_job_logging
+
+    monkeypatch.setenv("DIRACX_DB_URL_JOBDB", mysql_url)
+    monkeypatch.setenv("DIRACX_DB_URL_JOBLOGGINGDB", mysql_url)
+    job_db = JobDB(mysql_url)
+    job_logging_db = JobLoggingDB(mysql_url)
+    this_month = datetime.now(timezone.utc).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+    next_month = this_month + relativedelta(months=1)
+    async with job_db.engine_context(), job_logging_db.engine_context():
+        for db in (job_db, job_logging_db):
+            async with db.engine.begin() as conn:
+                await conn.run_sync(db.metadata.drop_all)
+                await conn.run_sync(db.metadata.create_all)
+                await db.post_create(conn)
+        async with job_db:
+            removed_job_id, live_job_id = [await job_db.create_job("") for _ in "ab"]
+            await job_db.delete_jobs([removed_job_id])
+        async with job_logging_db:
+            await job_logging_db.insert_records(
+                make_history(live_job_id, 3, this_month)
+                + make_history(removed_job_id, 3, next_month + timedelta(days=1))
+            )
+            partitions_before = await _get_partitions(job_logging_db.conn)
+
+        # Expire the records until the end of the next month
+        await asyncio.wait_for(expire_job_logging(retention_days=-70), timeout=60)
+
+        async with job_logging_db:
+            partitions = [
+                name for name, _ in await _get_partitions(job_logging_db.conn)
+            ]
+        # The partition of the removed job is dropped, not the one of the live job
+        assert f"p_{this_month.year}_{this_month.month}" in partitions
+        assert f"p_{next_month.year}_{next_month.month}" not in partitions
+        # The partitions of the next 24 months were created
+        assert partitions[-2] not in {name for name, _ in partitions_before}
+        assert set(await get_seq_nums(job_logging_db)) == {live_job_id}
+
+
+async def test_partition_maintenance(monkeypatch):
+    """Check the partitions which are changed when the DB is MySQL."""
+    partitions = [
+        ("p_2025_1", "468368000"),
+        ("p_2025_2", "470787200"),
+        ("p_2025_3", "473465600"),
+        ("p_future", "MAXVALUE"),
+    ]
+    monkeypatch.setattr(
+        job_logging_db_module, "_get_partitions", AsyncMock(return_value=partitions)
+    )
+    db = JobLoggingDB("mysql+aiomysql://localhost/JobLoggingDB")
+    # The DDL doesn't use the connection of a transaction
+    conn = AsyncMock()
+
+    @asynccontextmanager
+    async def ddl_connection():
+        yield conn
+
+    monkeypatch.setattr(db, "_ddl_connection", ddl_connection)
+
+    # The partitions still holding records of live jobs are kept
+    conn.scalar.side_effect = [10, 20]
+    await db.drop_expired_partitions(
+        datetime(2025, 3, 15, tzinfo=timezone.utc), first_live_job_id=15
+    )
+    (query,), _ = conn.execute.call_args
+    assert str(query) == "ALTER TABLE LoggingInfo DROP PARTITION p_2025_1"
+    assert [str(q) for (q,), _ in conn.scalar.call_args_list] == [
+        "SELECT MAX(JobID) FROM LoggingInfo PARTITION (p_2025_1)",
+        "SELECT MAX(JobID) FROM LoggingInfo PARTITION (p_2025_2)",
+    ]
+
+    # Nothing to do
+    conn.reset_mock()
+    conn.scalar.side_effect = [20]
+    await db.drop_expired_partitions(
+        datetime(2025, 2, 15, tzinfo=timezone.utc), first_live_job_id=15
+    )
+    await db.drop_expired_partitions(
+        datetime(2025, 1, 15, tzinfo=timezone.utc), first_live_job_id=None
+    )
+    await db.extend_partitions(datetime(2025, 4, 1, tzinfo=timezone.utc))
+    conn.execute.assert_not_called()
+
+    await db.extend_partitions(datetime(2025, 5, 1, tzinfo=timezone.utc))
+    (query,), _ = conn.execute.call_args
+    assert str(query) == (
+        "ALTER TABLE LoggingInfo REORGANIZE PARTITION p_future INTO ("
+        "PARTITION p_2025_4 VALUES LESS THAN (476057600),"
+        "PARTITION p_future VALUES LESS THAN (MAXVALUE))"
+    )
+
+
+async def test_no_ddl_in_transaction(job_logging_db: JobLoggingDB):
+    # The DDL would wait for the transaction to finish on MySQL
+    async with job_logging_db:
+        with pytest.raises(AssertionError, match="within a transaction"):
+            await job_logging_db.extend_partitions(datetime.now(timezone.utc))
+
+
+def make_history(job_id: int, n_records: int, t0: datetime) -> list[JobLoggingRecord]:
+    statuses = [JobStatus.RECEIVED, JobStatus.CHECKING, JobStatus.WAITING]
+    return [
+        JobLoggingRecord(
+            job_id=job_id,
+            status=statuses[i] if i < 3 else "idem",
+            minor_status=f"step {i}" if i % 4 else "idem",
+            application_status="idem" if i % 3 else f"app {i}",
+            date=t0 + timedelta(seconds=i),
+            source="pytest",
+        )
+        for i in range(n_records)
+    ]
+
+
+async def test_get_records_idem(job_logging_db: JobLoggingDB):
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    async with job_logging_db:
+        await job_logging_db.insert_records(
+            make_history(1, 6, t0) + make_history(2, 3, t0)[1:]
+        )
+        # Insertion order doesn't matter, the records are sorted by time
+        await job_logging_db.insert_records(make_history(3, 5, t0)[::-1])
+        res = await job_logging_db.get_records([1, 2, 3, 4])
+
+    assert [
+        (r.Status, r.MinorStatus, r.ApplicationStatus, r.StatusTime) for r in res[1]
+    ] == [
+        ("Received", "idem", "app 0", t0),
+        ("Checking", "step 1", "app 0", t0 + timedelta(seconds=1)),
+        ("Waiting", "step 2", "app 0", t0 + timedelta(seconds=2)),
+        ("Waiting", "step 3", "app 3", t0 + timedelta(seconds=3)),
+        ("Waiting", "step 3", "app 3", t0 + timedelta(seconds=4)),
+        ("Waiting", "step 5", "app 3", t0 + timedelta(seconds=5)),
+    ]
+    # The first ApplicationStatus is "Unknown" if it was never set
+    assert [(r.Status, r.ApplicationStatus) for r in res[2]] == [
+        ("Checking", "Unknown"),
+        ("Waiting", "Unknown"),
+    ]
+    assert [r.MinorStatus for r in res[3]] == [
+        "idem",
+        "step 1",
+        "step 2",
+        "step 3",
+        "step 3",
+    ]
+    assert res[4] == []
+
+    # The records are serialized like the JobStatusReturn models
+    for history in res.values():
+        models = [
+            JobStatusReturn(
+                Status=r.Status,
+                MinorStatus=r.MinorStatus,
+                ApplicationStatus=r.ApplicationStatus,
+                StatusTime=r.StatusTime,
+                Source=r.Source,
+            )
+            for r in history
+        ]
+        assert to_json(history) == to_json(models)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("n_jobs,n_records", [(10_000, 20)])
+async def test_benchmark_get_records(
+    job_logging_db: JobLoggingDB, n_jobs, n_records, record_property
+):
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    job_ids = list(range(1, n_jobs + 1))
+    async with job_logging_db:
+        for i in range(0, n_jobs, 1000):
+            await job_logging_db.insert_records(
+                [
+                    record
+                    for job_id in job_ids[i : i + 1000]
+                    for record in make_history(job_id, n_records, t0)
+                ]
+            )
+
+    async with job_logging_db:
+        start = time.perf_counter()
+        res = await job_logging_db.get_records(job_ids)
+        read = time.perf_counter() - start
+    assert sum(map(len, res.values())) == n_jobs * n_records
+
+    start = time.perf_counter()
+    serialized = to_json([{"JobID": k, "LoggingInfo": v} for k, v in res.items()])
+    serialize = time.perf_counter() - start
+
+    # For comparison, the cost of validating a pydantic model for every record
+    start = time.perf_counter()
+    for history in res.values():
+        for r in history:
+            JobStatusReturn(
+                Status=r.Status,
+                MinorStatus=r.MinorStatus,
+                ApplicationStatus=r.ApplicationStatus,
+                StatusTime=r.StatusTime,
+                Source=r.Source,
+            )
+    validate = time.perf_counter() - start
+
+    record_property("get_records", read)
+    record_property("serialize", serialize)
+    record_property("pydantic_validation", validate)
+    print(
+        f"get_records {read:.3f}s, serialize {serialize:.3f}s "
+        f"({len(serialized) / 1e6:.1f} MB), pydantic validation {validate:.3f}s"
+    )
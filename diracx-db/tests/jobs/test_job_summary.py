@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+import sqlalchemy
+from sqlalchemy import select, update
+
+from diracx.core.models import ScalarSearchOperator, VectorSearchOperator
+from diracx.db.sql.job.db import JobDB
+from diracx.db.sql.job.schema import JobJDLs, Jobs, JobSummary, JobSummaryDelta
+
+# Summaries which can be served from the JobSummary table
+GROUPINGS = [
+    (["Status"], []),
+    (["Status", "Site"], []),
+    (["Owner", "Status"], []),
+    (
+        ["Site"],
+        [
+            {
+                "parameter": "Status",
+                "operator": VectorSearchOperator.IN,
+                "values": ["Running", "Done"],
+            },
+            {
+                "parameter": "Owner",
+                "operator": ScalarSearchOperator.EQUAL,
+                "value": "u1",
+            },
+        ],
+    ),
+]
+
+
+def enable_foreign_keys(dbapi_connection, connection_record):
+    # Deleting the jobs relies on the cascade from JobJDLs
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+@pytest.fixture
+async def job_db(monkeypatch):
+    monkeypatch.setenv("DIRACX_DB_JOBS_SOLE_WRITER", "true")
+    job_db = JobDB("sqlite+aiosqlite:///:memory:")
+    assert job_db.summary_counters_enabled
+    async with job_db.engine_context():
+        sqlalchemy.event.listen(
+            job_db.engine.sync_engine, "connect", enable_foreign_keys
+        )
+        async with job_db.engine.begin() as conn:
+            await conn.run_sync(job_db.metadata.create_all)
+        yield job_db
+
+
+async def insert_jobs(job_db: JobDB, n_jobs: int) -> list[int]:
+    async with job_db:
+        job_ids = [await job_db.create_job("") for _ in range(n_jobs)]
+        attrs = {
+            job_id: {
+                "Status": "Waiting",
+                "VO": "lhcb",
+                "Owner": f"u{job_id % 3}",
+                "OwnerGroup": "lhcb_user",
+            }
+            for job_id in job_ids
+        }
+        await job_db.insert_job_attributes(
+            {
+                job_id: attrs[job_id] | {"Site": f"Site{job_id % 5}"}
+                for job_id in job_ids
+                if job_id % 4
+            }
+        )
+        # The other jobs get the default Site
+        await job_db.insert_job_attributes(
+            {job_id: attrs[job_id] for job_id in job_ids if not job_id % 4}
+        )
+    return job_ids
+
+
+def normalize(summary):
+    return sorted(summary, key=lambda row: sorted(row.items()))
+
+
+async def live_summary(job_db: JobDB, group_by, search):
+    return normalize(
+        await job_db._summary(table=Jobs, group_by=group_by, search=search)
+    )
+
+
+async def assert_summary_is_consistent(job_db: JobDB):
+    async with job_db:
+        assert await job_db.check_summary() == {}
+        for group_by, search in GROUPINGS:
+            expected = await live_summary(job_db, group_by, search)
+            actual = await job_db.summary(group_by, search, use_counters=True)
+            assert normalize(actual) == expected
+
+
+async def test_summary_is_maintained(job_db: JobDB):
+    job_ids = await insert_jobs(job_db, 40)
+    await assert_summary_is_consistent(job_db)
+
+    async with job_db:
+        await job_db.set_job_attributes(
+            {
+                job_id: {"Status": "Running", "MinorStatus": "Application"}
+                for job_id in job_ids[:25]
+            }
+        )
+        # Only the MinorStatus changes
+        await job_db.set_job_attributes(
+            {job_id: {"MinorStatus": "Uploading"} for job_id in job_ids[:5]}
+        )
+        await job_db.set_job_attributes(
+            {job_id: {"Status": "Done", "Site": "Site9"} for job_id in job_ids[:10]}
+        )
+    await assert_summary_is_consistent(job_db)
+
+    async with job_db:
+        await job_db.delete_jobs(job_ids[5:15])
+        # Counters which drop to zero aren't reported
+        await job_db.delete_jobs(job_ids[:5])
+    await assert_summary_is_consistent(job_db)
+
+
+async def test_fold_summary(job_db: JobDB, monkeypatch):
+    job_ids = await insert_jobs(job_db, 20)
+    async with job_db:
+        await job_db.set_job_attributes(
+            {job_id: {"Status": "Running"} for job_id in job_ids[:10]}
+        )
+        await job_db.delete_jobs(job_ids[15:])
+
+    monkeypatch.setattr(job_db, "summary_fold_batch_size", 3)
+    async with job_db:
+        assert await job_db.fold_summary() == 3
+    await assert_summary_is_consistent(job_db)
+
+    async with job_db:
+        while await job_db.fold_summary():
+            pass
+        assert not (await job_db.conn.execute(select(JobSummaryDelta))).all()
+        assert (await job_db.conn.execute(select(JobSummary))).all()
+    await assert_summary_is_consistent(job_db)
+
+    # Changes after a fold are still taken into account
+    async with job_db:
+        await job_db.set_job_attributes(
+            {job_id: {"Status": "Done"} for job_id in job_ids[:5]}
+        )
+    await assert_summary_is_consistent(job_db)
+
+
+async def test_summary_counters_disabled(monkeypatch):
+    monkeypatch.delenv("DIRACX_DB_JOBS_SOLE_WRITER", raising=False)
+    assert JobDB(
+        "sqlite+aiosqlite:///:memory:", sole_writer=True
+    ).summary_counters_enabled
+    job_db = JobDB("sqlite+aiosqlite:///:memory:")
+    assert not job_db.summary_counters_enabled
+    async with job_db.engine_context():
+        async with job_db.engine.begin() as conn:
+            await conn.run_sync(job_db.metadata.create_all)
+        job_ids = await insert_jobs(job_db, 10)
+        async with job_db:
+            await job_db.set_job_attributes({job_ids[0]: {"Status": "Running"}})
+            await JobDB.post_create(job_db.conn)
+            # Nothing is recorded and the Jobs table is always used
+            assert not (await job_db.conn.execute(select(JobSummaryDelta))).all()
+            assert not (await job_db.conn.execute(select(JobSummary))).all()
+            assert normalize(
+                await job_db.summary(["Status"], [], use_counters=True)
+            ) == [{"Status": "Running", "count": 1}, {"Status": "Waiting", "count": 9}]
+
+
+async def test_summary_fallback(job_db: JobDB):
+    job_ids = await insert_jobs(job_db, 12)
+    async with job_db:
+        # Modify the jobs behind the back of the JobDB
+        await job_db.conn.execute(
+            update(Jobs).where(Jobs.job_id.in_(job_ids[:3])).values(Status="Killed")
+        )
+
+        # The counters are used when possible and requested
+        assert await job_db.summary(["Status"], [], use_counters=True) == [
+            {"Status": "Waiting", "count": 12}
+        ]
+        # Otherwise the Jobs table is queried
+        assert normalize(await job_db.summary(["Status"], [])) == [
+            {"Status": "Killed", "count": 3},
+            {"Status": "Waiting", "count": 9},
+        ]
+        for group_by, search in [
+            (["MinorStatus", "Status"], []),
+            (
+                ["Status"],
+                [
+                    {
+                        "parameter": "JobID",
+                        "operator": ScalarSearchOperator.GREATER_THAN,
+                        "value": 0,
+                    }
+                ],
+            ),
+        ]:
+            assert normalize(
+                await job_db.summary(group_by, search, use_counters=True)
+            ) == await live_summary(job_db, group_by, search)
+
+        differences = await job_db.check_summary()
+        assert differences == {
+            ("lhcb", "lhcb_user", "u1", "00000000", "user", "Site1", "Waiting"): (
+                0,
+                1,
+            ),
+            ("lhcb", "lhcb_user", "u1", "00000000", "user", "Site1", "Killed"): (
+                1,
+                0,
+            ),
+            ("lhcb", "lhcb_user", "u2", "00000000", "user", "Site2", "Waiting"): (
+                0,
+                1,
+            ),
+            ("lhcb", "lhcb_user", "u2", "00000000", "user", "Site2", "Killed"): (
+                1,
+                0,
+            ),
+            ("lhcb", "lhcb_user", "u0", "00000000", "user", "Site3", "Waiting"): (
+                0,
+                1,
+            ),
+            ("lhcb", "lhcb_user", "u0", "00000000", "user", "Site3", "Killed"): (
+                1,
+                0,
+            ),
+        }
+        assert await job_db.check_summary(fix=True) == differences
+    await assert_summary_is_consistent(job_db)
+
+
+async def test_post_create_fills_summary(job_db: JobDB):
+    await insert_jobs(job_db, 10)
+    async with job_db:
+        while await job_db.fold_summary():
+            pass
+        await job_db.conn.execute(sqlalchemy.delete(JobSummary))
+        assert await job_db.check_summary()
+        await JobDB.post_create(job_db.conn)
+    await assert_summary_is_consistent(job_db)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("n_jobs", [100_000])
+async def test_benchmark_summary(job_db: JobDB, n_jobs, record_property):
+    async with job_db:
+        await job_db.conn.execute(
+            sqlalchemy.insert(JobJDLs),
+            [
+                {"JobID": job_id, "JDL": "", "JobRequirements": "", "OriginalJDL": ""}
+                for job_id in range(1, n_jobs + 1)
+            ],
+        )
+        await job_db.conn.execute(
+            sqlalchemy.insert(Jobs),
+            [
+                {
+                    "JobID": job_id,
+                    "Status": ["Waiting", "Running", "Done", "Failed"][job_id % 4],
+                    "VO": "lhcb",
+                    "Owner": f"user{job_id % 50}",
+                    "OwnerGroup": "lhcb_user",
+                    "Site": f"Site{job_id % 100}",
+                }
+                for job_id in range(1, n_jobs + 1)
+            ],
+        )
+        await job_db.check_summary(fix=True)
+
+    results = {}
+    for group_by, search in GROUPINGS:
+        async with job_db:
+            start = time.perf_counter()
+            expected = await live_summary(job_db, group_by, search)
+            live = time.perf_counter() - start
+
+            start = time.perf_counter()
+            actual = normalize(
+                await job_db.summary(group_by, search, use_counters=True)
+            )
+            counters = time.perf_counter() - start
+        assert actual == expected
+        results[",".join(group_by)] = (live, counters)
+
+    for name, (live, counters) in results.items():
+        record_property(f"summary_{name}_live", live)
+        record_property(f"summary_{name}_counters", counters)
+        print(f"{name:>12}: live {live:.4f}s, counters {counters:.4f}s")
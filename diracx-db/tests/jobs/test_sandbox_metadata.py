@@ -7,8 +7,12 @@ from datetime import datetime
 import pytest
 import sqlalchemy
 
-from diracx.core.exceptions import SandboxAlreadyInsertedError, SandboxNotFoundError
-from diracx.core.models import SandboxInfo, UserInfo
+from diracx.core.exceptions import (
+    SandboxAlreadyAssignedError,
+    SandboxAlreadyInsertedError,
+    SandboxNotFoundError,
+)
+from diracx.core.models import SandboxInfo, SandboxType, UserInfo
 from diracx.db.sql.sandbox_metadata.db import SandboxMetadataDB
 from diracx.db.sql.sandbox_metadata.schema import SandBoxes, SBEntityMapping
 
@@ -210,3 +214,237 @@ async def test_get_sandbox_owner_id(sandbox_metadata_db: SandboxMetadataDB):
             "not_found", sandbox_se
         )
     assert sb_owner_id is None
+
+
+async def test_unassign_sandboxes_to_many_jobs(sandbox_metadata_db: SandboxMetadataDB):
+    user_info = UserInfo(
+        sub="vo:sub", preferred_username="user1", dirac_group="group1", vo="vo"
+    )
+    sandbox_se = "SandboxSE"
+    input_pfn = secrets.token_hex()
+    output_pfns = {job_id: secrets.token_hex() for job_id in range(1, 13)}
+    async with sandbox_metadata_db:
+        owner_id = await sandbox_metadata_db.insert_owner(user_info)
+        for pfn in [input_pfn, *output_pfns.values()]:
+            await sandbox_metadata_db.insert_sandbox(owner_id, sandbox_se, pfn, 100)
+        # The first 10 jobs share the same input sandbox
+        await sandbox_metadata_db.assign_sandbox_to_jobs(
+            jobs_ids=list(range(1, 11)),
+            pfn=input_pfn,
+            sb_type="Input",
+            se_name=sandbox_se,
+        )
+        for job_id, pfn in output_pfns.items():
+            await sandbox_metadata_db.assign_sandbox_to_jobs(
+                jobs_ids=[job_id], pfn=pfn, sb_type="Output", se_name=sandbox_se
+            )
+
+    async def assigned() -> set[str]:
+        async with sandbox_metadata_db:
+            res = await sandbox_metadata_db.conn.execute(
+                sqlalchemy.select(SandBoxes.SEPFN).where(SandBoxes.Assigned)
+            )
+            return {row.SEPFN for row in res}
+
+    async with sandbox_metadata_db:
+        # Unknown jobs and duplicates are ignored
+        await sandbox_metadata_db.unassign_sandboxes_to_jobs(
+            [*range(1, 9), 11, 5, 1000]
+        )
+        await sandbox_metadata_db.unassign_sandboxes_to_jobs([])
+        res = await sandbox_metadata_db.conn.execute(
+            sqlalchemy.select(SBEntityMapping.EntityId).distinct()
+        )
+        assert sorted(row.EntityId for row in res) == ["Job:10", "Job:12", "Job:9"]
+    # As when unassigning the jobs one at a time, the sandboxes of a job are
+    # kept while one of them is still used by another job
+    assert await assigned() == {input_pfn} | {
+        pfn for job_id, pfn in output_pfns.items() if job_id != 11
+    }
+
+    async with sandbox_metadata_db:
+        await sandbox_metadata_db.unassign_sandboxes_to_jobs([9, 10])
+    # The input sandbox was still used by job 10 when job 9 was unassigned
+    assert await assigned() == {
+        pfn for job_id, pfn in output_pfns.items() if job_id not in (10, 11)
+    }
+
+
+async def test_assign_sandboxes_to_jobs(sandbox_metadata_db: SandboxMetadataDB):
+    user_info = UserInfo(
+        sub="vo:sub", preferred_username="user1", dirac_group="group1", vo="vo"
+    )
+    sandbox_se = "SandboxSE"
+    input_pfn, output_pfn = secrets.token_hex(), secrets.token_hex()
+    async with sandbox_metadata_db:
+        owner_id = await sandbox_metadata_db.insert_owner(user_info)
+        for pfn in [input_pfn, output_pfn]:
+            await sandbox_metadata_db.insert_sandbox(owner_id, sandbox_se, pfn, 100)
+        # A sandbox with the same PFN on another SE isn't affected
+        await sandbox_metadata_db.insert_sandbox(owner_id, "OtherSE", input_pfn, 100)
+
+    async with sandbox_metadata_db:
+        await sandbox_metadata_db.assign_sandboxes_to_jobs(
+            [
+                (1, input_pfn, SandboxType.Input),
+                (2, input_pfn, SandboxType.Input),
+                (1, output_pfn, SandboxType.Output),
+            ],
+            sandbox_se,
+        )
+    async with sandbox_metadata_db:
+        res = await sandbox_metadata_db.conn.execute(
+            sqlalchemy.select(
+                SandBoxes.SEName, SandBoxes.SEPFN, SBEntityMapping.EntityId
+            ).outerjoin(SBEntityMapping, SBEntityMapping.SBId == SandBoxes.SBId)
+        )
+        assert sorted(res, key=str) == sorted(
+            [
+                ("OtherSE", input_pfn, None),
+                (sandbox_se, input_pfn, "Job:1"),
+                (sandbox_se, input_pfn, "Job:2"),
+                (sandbox_se, output_pfn, "Job:1"),
+            ],
+            key=str,
+        )
+        assert await sandbox_metadata_db.sandbox_is_assigned(output_pfn, sandbox_se)
+        assert not await sandbox_metadata_db.sandbox_is_assigned(input_pfn, "OtherSE")
+
+    with pytest.raises(SandboxAlreadyAssignedError):
+        async with sandbox_metadata_db:
+            await sandbox_metadata_db.assign_sandboxes_to_jobs(
+                [(3, output_pfn, SandboxType.Output), (1, output_pfn, "Output")],
+                sandbox_se,
+            )
+    with pytest.raises(SandboxNotFoundError):
+        async with sandbox_metadata_db:
+            await sandbox_metadata_db.assign_sandboxes_to_jobs(
+                [(3, output_pfn, "Output"), (3, "not_found", "Input")], sandbox_se
+            )
+    async with sandbox_metadata_db:
+        assert await sandbox_metadata_db.get_sandbox_assigned_to_job(
+            3, SandboxType.Output
+        ) == [None]
+
+
+async def test_sandbox_ids_cache(sandbox_metadata_db: SandboxMetadataDB):
+    user_info = UserInfo(
+        sub="vo:sub", preferred_username="user1", dirac_group="group1", vo="vo"
+    )
+    sandbox_se = "SandboxSE"
+    pfn = secrets.token_hex()
+    async with sandbox_metadata_db:
+        owner_id = await sandbox_metadata_db.insert_owner(user_info)
+        await sandbox_metadata_db.insert_sandbox(owner_id, sandbox_se, pfn, 100)
+        sandbox_ids = await sandbox_metadata_db.get_sandbox_ids(
+            sandbox_se, [pfn, "not_found"]
+        )
+        assert list(sandbox_ids) == [pfn]
+        # Replace the sandbox behind the back of the cache, the SBIds are reused
+        await sandbox_metadata_db.conn.execute(sqlalchemy.delete(SandBoxes))
+        other_pfn = secrets.token_hex()
+        for new_pfn in [other_pfn, pfn]:
+            await sandbox_metadata_db.insert_sandbox(owner_id, sandbox_se, new_pfn, 100)
+
+    async with sandbox_metadata_db:
+        # The cached ids are used...
+        assert (
+            await sandbox_metadata_db.get_sandbox_ids(sandbox_se, [pfn]) == sandbox_ids
+        )
+        # ...until they are found to be outdated
+        await sandbox_metadata_db.assign_sandbox_to_jobs([1], pfn, "Input", sandbox_se)
+        new_sandbox_ids = await sandbox_metadata_db.get_sandbox_ids(sandbox_se, [pfn])
+        assert new_sandbox_ids[pfn][0] != sandbox_ids[pfn][0]
+        assert await sandbox_metadata_db.get_sandbox_assigned_to_job(
+            1, SandboxType.Input
+        ) == [pfn]
+        assert not await sandbox_metadata_db.sandbox_is_assigned(other_pfn, sandbox_se)
+
+
+async def test_owner_id_cache(sandbox_metadata_db: SandboxMetadataDB):
+    user_info = UserInfo(
+        sub="vo:sub", preferred_username="user1", dirac_group="group1", vo="vo"
+    )
+    with pytest.raises(RuntimeError):
+        async with sandbox_metadata_db:
+            await sandbox_metadata_db.insert_owner(user_info)
+            raise RuntimeError("Rollback")
+    # Owners are only cached once committed
+    async with sandbox_metadata_db:
+        assert await sandbox_metadata_db.get_owner_id(user_info) is None
+        owner_id = await sandbox_metadata_db.insert_owner(user_info)
+        # Inserting the same owner again is harmless
+        assert await sandbox_metadata_db.insert_owner(user_info) == owner_id
+    assert sandbox_metadata_db.owner_id_cache_misses == 1
+
+    for _ in range(3):
+        async with sandbox_metadata_db:
+            assert await sandbox_metadata_db.get_owner_id(user_info) == owner_id
+    assert sandbox_metadata_db.owner_id_cache_hits == 3
+    assert sandbox_metadata_db.owner_id_cache_misses == 1
+
+
+async def test_concurrent_insert_owner(tmp_path):
+    # The writers wait for each other to release the SQLite write lock
+    sandbox_metadata_db = SandboxMetadataDB(
+        f"sqlite+aiosqlite:///{tmp_path}/sandboxes.db?timeout=60"
+    )
+    users = [
+        UserInfo(
+            sub=f"vo:sub{i}", preferred_username=f"user{i}", dirac_group="g", vo="vo"
+        )
+        for i in range(3)
+    ]
+
+    async def insert_owner(user_info: UserInfo) -> int:
+        async with sandbox_metadata_db:
+            if (owner_id := await sandbox_metadata_db.get_owner_id(user_info)) is None:
+                owner_id = await sandbox_metadata_db.insert_owner(user_info)
+            return owner_id
+
+    async with sandbox_metadata_db.engine_context():
+        async with sandbox_metadata_db.engine.begin() as conn:
+            await conn.run_sync(sandbox_metadata_db.metadata.create_all)
+
+        owner_ids = await asyncio.gather(
+            *(insert_owner(users[i % 3]) for i in range(30))
+        )
+        assert len(set(owner_ids)) == 3
+        for i, owner_id in enumerate(owner_ids):
+            assert owner_id == owner_ids[i % 3]
+
+
+async def test_insert_sandboxes(sandbox_metadata_db: SandboxMetadataDB):
+    user_info = UserInfo(
+        sub="vo:sub", preferred_username="user1", dirac_group="group1", vo="vo"
+    )
+    sandbox_se = "SandboxSE"
+    pfns = [secrets.token_hex() for _ in range(3)]
+    async with sandbox_metadata_db:
+        owner_id = await sandbox_metadata_db.insert_owner(user_info)
+        await sandbox_metadata_db.insert_sandbox(owner_id, sandbox_se, pfns[0], 100)
+        await sandbox_metadata_db.assign_sandbox_to_jobs(
+            [1], pfns[0], SandboxType.Input, sandbox_se
+        )
+    db_contents = await _dump_db(sandbox_metadata_db)
+
+    async with sandbox_metadata_db:
+        assert await sandbox_metadata_db.sandboxes_are_assigned(pfns, sandbox_se) == {
+            pfns[0]: True
+        }
+        # Existing sandboxes are only refreshed
+        await sandbox_metadata_db.insert_sandboxes(
+            owner_id, sandbox_se, {pfn: 200 for pfn in pfns}
+        )
+        await sandbox_metadata_db.insert_sandboxes(owner_id, sandbox_se, {})
+        assert await sandbox_metadata_db.sandboxes_are_assigned(pfns, sandbox_se) == {
+            pfns[0]: True,
+            pfns[1]: False,
+            pfns[2]: False,
+        }
+        res = await sandbox_metadata_db.conn.execute(
+            sqlalchemy.select(SandBoxes.SEPFN, SandBoxes.Bytes)
+        )
+        assert dict(res.all()) == {pfns[0]: 100, pfns[1]: 200, pfns[2]: 200}
+    new_db_contents = await _dump_db(sandbox_metadata_db)
+    assert new_db_contents[pfns[0]][1] >= db_contents[pfns[0]][1]
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import bindparam, case, literal, update
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.sql import expression
+
+from diracx.core.exceptions import InvalidQueryError
+from diracx.db.sql.job.db import JobDB
+from diracx.db.sql.job.schema import Jobs
+from diracx.db.sql.utils.functions import utcnow
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+async def job_db():
+    job_db = JobDB("sqlite+aiosqlite:///:memory:")
+    async with job_db.engine_context():
+        async with job_db.engine.begin() as conn:
+            await conn.run_sync(job_db.metadata.create_all)
+        yield job_db
+
+
+async def insert_jobs(job_db: JobDB, n_jobs: int) -> list[int]:
+    async with job_db:
+        job_ids = [await job_db.create_job("") for _ in range(n_jobs)]
+        await job_db.insert_job_attributes(
+            {
+                job_id: {
+                    "Status": "Received",
+                    "Owner": "owner",
+                    "OwnerGroup": "group",
+                    "VO": "lhcb",
+                }
+                for job_id in job_ids
+            }
+        )
+    return job_ids
+
+
+async def get_jobs(job_db: JobDB) -> dict[int, dict]:
+    async with job_db:
+        _, rows = await job_db.search(None, [], [], per_page=100_000, page=1)
+    return {row["JobID"]: row for row in rows}
+
+
+def make_updates(job_ids: list[int]) -> dict[int, dict]:
+    """Updates using a few different sets of columns."""
+    updates = {}
+    for i, job_id in enumerate(job_ids):
+        if i % 3 == 0:
+            updates[job_id] = {"Status": "Running", "MinorStatus": f"minor {i}"}
+        elif i % 3 == 1:
+            updates[job_id] = {"UserPriority": i, "EndExecTime": T0}
+        else:
+            updates[job_id] = {"ApplicationStatus": f"app {i}"}
+    return updates
+
+
+def legacy_case_update(job_data):
+    """The single CASE-per-row statement formerly built by set_job_attributes."""
+    columns = {key for attrs in job_data.values() for key in attrs}
+    case_expressions = {
+        column: case(
+            *[
+                (
+                    Jobs.__table__.c.JobID == job_id,
+                    literal(attrs[column], type_=Jobs.__table__.c[column].type)
+                    if not isinstance(attrs[column], expression.FunctionElement)
+                    else attrs[column],
+                )
+                for job_id, attrs in job_data.items()
+                if column in attrs
+            ],
+            else_=getattr(Jobs.__table__.c, column),
+        )
+        for column in columns
+    }
+    return (
+        Jobs.__table__.update()
+        .values(**case_expressions)
+        .where(Jobs.__table__.c.JobID.in_(job_data.keys()))
+    )
+
+
+async def test_set_job_attributes(job_db: JobDB):
+    job_ids = await insert_jobs(job_db, 9)
+    updates = make_updates(job_ids)
+    async with job_db:
+        await job_db.set_job_attributes(updates)
+
+    jobs = await get_jobs(job_db)
+    for job_id, attrs in updates.items():
+        for column, value in attrs.items():
+            assert jobs[job_id][column] == value
+        # LastUpdateTime is only changed together with the Status
+        assert (jobs[job_id]["LastUpdateTime"] is not None) == ("Status" in attrs)
+        # Other columns are left untouched
+        assert jobs[job_id]["Owner"] == "owner"
+        if "Status" not in attrs:
+            assert jobs[job_id]["Status"] == "Received"
+    # The input isn't modified
+    assert "LastUpdateTime" not in updates[job_ids[0]]
+
+
+async def test_set_job_attributes_sql_functions(job_db: JobDB):
+    job_ids = await insert_jobs(job_db, 3)
+    async with job_db:
+        await job_db.set_job_attributes(
+            {
+                job_ids[0]: {"HeartBeatTime": utcnow()},
+                job_ids[1]: {"HeartBeatTime": utcnow()},
+                job_ids[2]: {"HeartBeatTime": T0},
+            }
+        )
+    jobs = await get_jobs(job_db)
+    assert jobs[job_ids[0]]["HeartBeatTime"] is not None
+    assert jobs[job_ids[1]]["HeartBeatTime"] is not None
+    assert jobs[job_ids[2]]["HeartBeatTime"] == T0
+
+
+async def test_set_job_attributes_invalid(job_db: JobDB):
+    job_ids = await insert_jobs(job_db, 1)
+    async with job_db:
+        with pytest.raises(ValueError):
+            await job_db.set_job_attributes({})
+        with pytest.raises(InvalidQueryError):
+            await job_db.set_job_attributes({job_ids[0]: {"NotAColumn": 1}})
+
+
+async def run_set_job_attributes(job_db: JobDB, updates, monkeypatch, temp_table):
+    """Run set_job_attributes, forcing the use of the temporary table if requested.
+
+    The joined UPDATE also works with SQLite (rendered as UPDATE ... FROM) so the
+    MySQL code path can be exercised by pretending to be MySQL.
+    """
+    calls = []
+    update_from_temp_table = job_db._update_jobs_from_temp_table
+
+    async def spy(*args):
+        calls.append(args)
+        await update_from_temp_table(*args)
+
+    monkeypatch.setattr(job_db, "_update_jobs_from_temp_table", spy)
+    async with job_db:
+        with monkeypatch.context() as m:
+            if temp_table:
+                m.setattr(job_db.conn.dialect, "name", "mysql")
+            await job_db.set_job_attributes(updates)
+    return calls
+
+
+async def test_temp_table_update(job_db: JobDB, monkeypatch):
+    """The MySQL joined UPDATE gives the same result as executemany."""
+    job_ids = await insert_jobs(job_db, 30)
+    updates = make_updates(job_ids)
+    calls = await run_set_job_attributes(job_db, updates, monkeypatch, False)
+    assert not calls
+    expected = await get_jobs(job_db)
+
+    other_db = JobDB("sqlite+aiosqlite:///:memory:")
+    async with other_db.engine_context():
+        async with other_db.engine.begin() as conn:
+            await conn.run_sync(other_db.metadata.create_all)
+        await insert_jobs(other_db, 30)
+        calls = await run_set_job_attributes(other_db, updates, monkeypatch, True)
+        # One call per group of columns
+        assert len(calls) == 3
+        actual = await get_jobs(other_db)
+
+    for job_id in job_ids:
+        expected[job_id].pop("LastUpdateTime")
+        actual[job_id].pop("LastUpdateTime")
+    assert actual == expected
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("n_jobs", [1_000, 10_000])
+async def test_benchmark_set_job_attributes(n_jobs, monkeypatch, record_property):
+    results = {}
+
+    # Compilation of the statements, the grouped statement doesn't depend on
+    # the number of jobs
+    job_ids = list(range(1, n_jobs + 1))
+    updates = make_updates(job_ids)
+    group = {job_id: attrs for job_id, attrs in updates.items() if "Status" in attrs}
+    grouped_stmt = (
+        update(Jobs)
+        .where(Jobs.job_id == bindparam("b_JobID"))
+        .values(
+            Status=bindparam("b_Status"),
+            MinorStatus=bindparam("b_MinorStatus"),
+            LastUpdateTime=bindparam("b_LastUpdateTime"),
+        )
+    )
+    for dialect in [sqlite.dialect(), mysql.dialect()]:
+        start = time.perf_counter()
+        legacy_case_update(group).compile(dialect=dialect)
+        results[f"compile_case_{dialect.name}"] = time.perf_counter() - start
+        start = time.perf_counter()
+        grouped_stmt.compile(dialect=dialect)
+        results[f"compile_grouped_{dialect.name}"] = time.perf_counter() - start
+
+    # Execution against SQLite
+    for strategy in ["case", "executemany", "temp_table"]:
+        db = JobDB("sqlite+aiosqlite:///:memory:")
+        async with db.engine_context():
+            async with db.engine.begin() as conn:
+                await conn.run_sync(db.metadata.create_all)
+            job_ids = await insert_jobs(db, n_jobs)
+            updates = make_updates(job_ids)
+            start = time.perf_counter()
+            if strategy == "case":
+                async with db:
+                    await db.conn.execute(legacy_case_update(updates))
+            else:
+                await run_set_job_attributes(
+                    db, updates, monkeypatch, strategy == "temp_table"
+                )
+            results[f"execute_{strategy}"] = time.perf_counter() - start
+
+    for name, duration in results.items():
+        record_property(name, duration)
+    print(
+        f"{n_jobs} jobs: "
+        + ", ".join(f"{name} {duration:.4f}s" for name, duration in results.items())
+    )
+    assert results["execute_executemany"] < results["execute_case"]
+    assert results["execute_temp_table"] < results["execute_case"]
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from diracx.db.os.utils import OpenSearchBulkUpsertError
+from diracx.testing.mock_osdb import MockOSDBMixin
+from diracx.testing.osdb import DummyOSDB
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+DOCUMENTS = [
+    (
+        "dummyvo" if i % 3 else "dummyVO",
+        # Spread the documents over several indices
+        i * 400_000,
+        {
+            "DateField": T0 + timedelta(minutes=i),
+            "IntField": i,
+            "KeywordField0": f"kw{i % 4}",
+            "UnknownField": f"unknown {i}",
+        },
+    )
+    for i in range(1, 21)
+]
+
+
+class MockDummyOSDB(MockOSDBMixin, DummyOSDB):
+    pass
+
+
+@pytest.fixture
+async def sql_opensearch_dbs():
+    """Two independent mocked OpenSearch DBs."""
+    dbs = [
+        MockDummyOSDB(
+            connection_kwargs={"sqlalchemy_dsn": "sqlite+aiosqlite:///:memory:"}
+        )
+        for _ in range(2)
+    ]
+    async with dbs[0].client_context(), dbs[1].client_context():
+        for db in dbs:
+            await db.create_index_template()
+        yield dbs
+
+
+async def test_bulk_upsert_matches_upsert(sql_opensearch_dbs):
+    one_by_one_db, bulk_db = sql_opensearch_dbs
+
+    for vo, doc_id, document in DOCUMENTS:
+        await one_by_one_db.upsert(vo, doc_id, document)
+    await bulk_db.bulk_upsert(DOCUMENTS)
+
+    sort = [{"parameter": "IntField", "direction": "asc"}]
+    expected = await one_by_one_db.search(None, [], sort)
+    assert len(expected) == len(DOCUMENTS)
+    assert await bulk_db.search(None, [], sort) == expected
+
+    # Updating existing documents also gives the same result
+    updates = [
+        (vo, doc_id, {"KeywordField1": "updated"}) for vo, doc_id, _ in DOCUMENTS
+    ]
+    for vo, doc_id, document in updates[::2]:
+        await one_by_one_db.upsert(vo, doc_id, document)
+    await bulk_db.bulk_upsert(updates[::2])
+    assert await bulk_db.search(None, [], sort) == await one_by_one_db.search(
+        None, [], sort
+    )
+
+
+class FakeBulkClient:
+    """Stand-in for AsyncOpenSearch recording the ``_bulk`` requests."""
+
+    def __init__(self, failing_ids=()):
+        self.requests = []
+        self.failing_ids = set(failing_ids)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def bulk(self, body):
+        self.requests.append(body)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        items = []
+        for action in body[::2]:
+            doc_id = action["update"]["_id"]
+            if doc_id in self.failing_ids:
+                items.append(
+                    {"update": {"_id": str(doc_id), "status": 400, "error": "boom"}}
+                )
+            else:
+                items.append({"update": {"_id": str(doc_id), "status": 201}})
+        return {"errors": bool(self.failing_ids), "items": items}
+
+
+def make_fake_db(client):
+    db = DummyOSDB({})
+    db._client = client
+    return db
+
+
+async def test_bulk_upsert_groups_and_chunks():
+    client = FakeBulkClient()
+    db = make_fake_db(client)
+
+    await db.bulk_upsert(DOCUMENTS, chunk_size=2, max_concurrent_chunks=3)
+
+    expected_indices = {db.index_name(vo, doc_id) for vo, doc_id, _ in DOCUMENTS}
+    seen_indices = set()
+    n_documents = 0
+    for body in client.requests:
+        actions, docs = body[::2], body[1::2]
+        assert 1 <= len(actions) <= 2
+        # Each request only targets a single index
+        (index_name,) = {action["update"]["_index"] for action in actions}
+        seen_indices.add(index_name)
+        assert all(doc["doc_as_upsert"] for doc in docs)
+        n_documents += len(actions)
+    assert seen_indices == expected_indices
+    assert n_documents == len(DOCUMENTS)
+    assert client.max_in_flight == 3
+
+
+async def test_bulk_upsert_merges_duplicates():
+    client = FakeBulkClient()
+    db = make_fake_db(client)
+
+    await db.bulk_upsert(
+        [("dummyvo", 1, {"IntField": 1}), ("dummyvo", 1, {"KeywordField0": "a"})]
+    )
+
+    (body,) = client.requests
+    assert body[1]["doc"] == {"IntField": 1, "KeywordField0": "a"}
+
+
+async def test_bulk_upsert_reports_errors_per_document():
+    client = FakeBulkClient(failing_ids={DOCUMENTS[3][1], DOCUMENTS[7][1]})
+    db = make_fake_db(client)
+
+    with pytest.raises(OpenSearchBulkUpsertError) as exc_info:
+        await db.bulk_upsert(DOCUMENTS, chunk_size=3)
+
+    assert exc_info.value.errors == {
+        DOCUMENTS[3][1]: "boom",
+        DOCUMENTS[7][1]: "boom",
+    }
+    # All the chunks were still sent
+    assert sum(len(body) // 2 for body in client.requests) == len(DOCUMENTS)
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+from sqlalchemy import event, insert, select
+
+from diracx.db.sql.task_queue.db import TaskQueueDB
+from diracx.db.sql.task_queue.schema import JobsQueue, TaskQueues
+
+
+@pytest.fixture
+async def task_queue_db():
+    task_queue_db = TaskQueueDB("sqlite+aiosqlite:///:memory:")
+    async with task_queue_db.engine_context():
+        async with task_queue_db.engine.begin() as conn:
+            await conn.run_sync(task_queue_db.metadata.create_all)
+        yield task_queue_db
+
+
+async def populate(task_queue_db: TaskQueueDB, n_tqs: int) -> dict[int, dict]:
+    """Insert n_tqs task queues with 1 to 3 jobs and a few requirements each.
+
+    :return: the expected output of retrieve_task_queues
+    """
+    expected = {}
+    tq_rows, job_rows = [], []
+    side_rows: dict[str, list[dict]] = {f: [] for f in TaskQueueDB.multi_value_tables}
+    for tq_id in range(1, n_tqs + 1):
+        tq = {
+            "TQId": tq_id,
+            "Owner": f"owner{tq_id % 7}",
+            "OwnerGroup": f"group{tq_id % 3}",
+            "VO": "lhcb",
+            "CPUTime": 1000 * (tq_id % 5),
+            "Priority": float(tq_id % 4),
+            "Enabled": True,
+        }
+        tq_rows.append(tq)
+        n_jobs = tq_id % 3 + 1
+        job_rows.extend(
+            {"TQId": tq_id, "JobId": tq_id * 10 + i, "Priority": 1, "RealPriority": 1}
+            for i in range(n_jobs)
+        )
+        expected[tq_id] = {k: v for k, v in tq.items() if k not in ("TQId", "Enabled")}
+        expected[tq_id]["Jobs"] = n_jobs
+        for i, field in enumerate(TaskQueueDB.multi_value_tables):
+            # Not all the TQs have all the fields
+            values = [f"{field}{j}" for j in range((tq_id + i) % 3)]
+            side_rows[field].extend({"TQId": tq_id, "Value": v} for v in values)
+            expected[tq_id][field] = values
+
+    async with task_queue_db as db:
+        await db.conn.execute(insert(TaskQueues), tq_rows)
+        await db.conn.execute(insert(JobsQueue), job_rows)
+        for field, rows in side_rows.items():
+            if rows:
+                table = TaskQueueDB.multi_value_tables[field]
+                await db.conn.execute(insert(table), rows)
+    return expected
+
+
+class QueryCounter:
+    def __init__(self, db: TaskQueueDB):
+        self.count = 0
+        event.listen(db.engine.sync_engine, "before_cursor_execute", self)
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+async def reference_retrieve_task_queues(db: TaskQueueDB, tq_id_list):
+    """Per-TQ implementation, issuing 1 + 6 x N queries."""
+    stmt = select(TaskQueues.TQId).where(TaskQueues.TQId.in_(tq_id_list))
+    tq_data = {}
+    for (tq_id,) in await db.conn.execute(stmt):
+        tq_data[tq_id] = {}
+        for field, table in db.multi_value_tables.items():
+            stmt = select(table.Value).where(table.TQId == tq_id)
+            tq_data[tq_id][field] = [row[0] for row in await db.conn.execute(stmt)]
+    return tq_data
+
+
+async def test_retrieve_task_queues(task_queue_db: TaskQueueDB):
+    expected = await populate(task_queue_db, 20)
+    # A task queue without jobs is not returned
+    async with task_queue_db as db:
+        await db.conn.execute(
+            insert(TaskQueues).values(
+                TQId=100,
+                Owner="owner",
+                OwnerGroup="group",
+                VO="lhcb",
+                CPUTime=0,
+                Priority=1,
+                Enabled=True,
+            )
+        )
+
+    counter = QueryCounter(task_queue_db)
+    async with task_queue_db as db:
+        assert await db.retrieve_task_queues() == expected
+        assert counter.count == 2
+
+        subset = [2, 3, 5, 100, 1000]
+        assert await db.retrieve_task_queues(subset) == {
+            tq_id: expected[tq_id] for tq_id in [2, 3, 5]
+        }
+        assert await db.retrieve_task_queues([]) == {}
+        assert await db.retrieve_task_queues([1000]) == {}
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("n_tqs", [10, 1_000, 10_000])
+async def test_benchmark_retrieve_task_queues(
+    task_queue_db: TaskQueueDB, n_tqs, record_property
+):
+    expected = await populate(task_queue_db, n_tqs)
+    tq_ids = list(expected)
+    counter = QueryCounter(task_queue_db)
+
+    async with task_queue_db as db:
+        start = time.perf_counter()
+        reference = await reference_retrieve_task_queues(db, tq_ids)
+        reference_duration = time.perf_counter() - start
+        reference_queries, counter.count = counter.count, 0
+
+        start = time.perf_counter()
+        result = await db.retrieve_task_queues(tq_ids)
+        duration = time.perf_counter() - start
+        queries = counter.count
+
+    assert {
+        tq_id: {field: data[field] for field in db.multi_value_tables}
+        for tq_id, data in result.items()
+    } == reference
+    record_property("reference_seconds", reference_duration)
+    record_property("reference_queries", reference_queries)
+    record_property("seconds", duration)
+    record_property("queries", queries)
+    print(
+        f"{n_tqs} TQs: per-TQ {reference_queries} queries {reference_duration:.3f}s, "
+        f"batched {queries} queries {duration:.3f}s"
+    )
+    assert queries == 2
@@ -253,8 +253,8 @@ async def perform_legacy_exchange(
 
     try:
         parsed_scope = parse_and_validate_scope(scope, config, available_properties)
-        vo_users = config.Registry[parsed_scope["vo"]]
-        sub = vo_users.sub_from_preferred_username(preferred_username)
+        vo_subs = config.index.subs_by_preferred_username[parsed_scope["vo"]]
+        sub = vo_subs[preferred_username]
     except (KeyError, ValueError) as e:
         raise ValueError("Invalid scope or preferred_username") from e
 
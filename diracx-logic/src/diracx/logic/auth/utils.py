@@ -225,11 +225,7 @@ async def verify_dirac_refresh_token(
 
 def get_allowed_user_properties(config: Config, sub, vo: str) -> set[SecurityProperty]:
     """Retrieve all properties of groups a user is registered in."""
-    allowed_user_properties = set()
-    for group in config.Registry[vo].Groups:
-        if sub in config.Registry[vo].Groups[group].Users:
-            allowed_user_properties.update(config.Registry[vo].Groups[group].Properties)
-    return allowed_user_properties
+    return set(config.index.user_properties[vo].get(sub, ()))
 
 
 def parse_and_validate_scope(
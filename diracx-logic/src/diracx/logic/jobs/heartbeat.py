@@ -0,0 +1,206 @@
+"""Write-behind buffering of job heartbeats.
+
+Every running job sends a heartbeat every few minutes, which translates into a
+constant stream of tiny UPDATE/INSERT statements on the JobDB. When enabled,
+the ``HeartbeatBuffer`` keeps the latest heartbeat of each job in memory and a
+background task periodically writes all of them with a single bulk UPDATE of
+``Jobs.HeartBeatTime`` and a single multi-row INSERT into
+``HeartBeatLoggingInfo``.
+
+Status transitions triggered by a heartbeat (i.e. MATCHED/STALLED -> RUNNING)
+are never buffered, see ``diracx.logic.jobs.status.add_heartbeat``.
+"""
+
+from __future__ import annotations
+
+__all__ = ["HeartbeatBuffer", "JobHeartbeatSettings", "run_heartbeat_buffer"]
+
+import asyncio
+import contextlib
+import logging
+import time
+import weakref
+from collections.abc import AsyncIterator, Iterable, Mapping
+from datetime import datetime
+from typing import Any
+
+from opentelemetry import metrics
+from pydantic import PrivateAttr
+from pydantic_settings import SettingsConfigDict
+
+from diracx.core.settings import ServiceSettingsBase
+from diracx.db.sql.job.db import JobDB
+
+logger = logging.getLogger(__name__)
+
+meter = metrics.get_meter(__name__)
+
+# Buffers which are currently running, used to report the queue depth
+_active_buffers: weakref.WeakSet[HeartbeatBuffer] = weakref.WeakSet()
+
+
+def _observe_pending_heartbeats(
+    options: metrics.CallbackOptions,
+) -> Iterable[metrics.Observation]:
+    for buffer in _active_buffers:
+        yield metrics.Observation(len(buffer))
+
+
+meter.create_observable_gauge(
+    "diracx.jobs.heartbeat.buffer.pending",
+    callbacks=[_observe_pending_heartbeats],
+    unit="{job}",
+    description="Number of jobs with a heartbeat waiting to be written to the JobDB",
+)
+flush_duration = meter.create_histogram(
+    "diracx.jobs.heartbeat.buffer.flush.duration",
+    unit="s",
+    description="Time taken to write the buffered heartbeats to the JobDB",
+)
+
+
+class HeartbeatBuffer:
+    """In-memory buffer merging the heartbeats of each job until they are flushed.
+
+    Only the most recent heartbeat time of each job is kept and the dynamic data
+    (e.g. ``LoadAverage``) is merged key by key, the most recent value winning.
+    """
+
+    def __init__(self, max_pending_jobs: int):
+        self.max_pending_jobs = max_pending_jobs
+        # Set when the buffer is full and should be flushed without waiting
+        self.flush_requested = asyncio.Event()
+        self._pending: dict[int, tuple[datetime, dict[str, Any]]] = {}
+        self._job_db: JobDB | None = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _merge(
+        self, job_id: int, heartbeat_time: datetime, dynamic_data: Mapping[str, Any]
+    ) -> None:
+        if (previous := self._pending.get(job_id)) is None:
+            self._pending[job_id] = (heartbeat_time, dict(dynamic_data))
+        elif previous[0] <= heartbeat_time:
+            self._pending[job_id] = (heartbeat_time, previous[1] | dynamic_data)
+        else:
+            self._pending[job_id] = (previous[0], {**dynamic_data, **previous[1]})
+
+    def add(
+        self,
+        job_db: JobDB,
+        heartbeat_time: datetime,
+        dynamic_data: Mapping[int, Mapping[str, Any]],
+    ) -> None:
+        """Buffer the heartbeats of some jobs.
+
+        :param job_db: the JobDB to which the heartbeats will be written
+        :param heartbeat_time: the time at which the heartbeats were received
+        :param dynamic_data: mapping of job_id -> data to store in the
+            HeartBeatLoggingInfo table (possibly empty)
+        """
+        self._job_db = job_db
+        for job_id, data in dynamic_data.items():
+            self._merge(job_id, heartbeat_time, data)
+        if len(self._pending) >= self.max_pending_jobs:
+            self.flush_requested.set()
+
+    async def flush(self) -> int:
+        """Write all the buffered heartbeats to the JobDB.
+
+        This must not be called from within a JobDB transaction as it opens its
+        own. If the write fails, the heartbeats are put back in the buffer so
+        they are retried during the next flush.
+
+        :return: the number of jobs which were updated
+        """
+        self.flush_requested.clear()
+        if not self._pending:
+            return 0
+        assert self._job_db is not None
+        batch, self._pending = self._pending, {}
+        try:
+            async with self._job_db as job_db:
+                await job_db.add_heartbeats(batch)
+        except BaseException:
+            for job_id, (heartbeat_time, data) in batch.items():
+                self._merge(job_id, heartbeat_time, data)
+            raise
+        return len(batch)
+
+
+@contextlib.asynccontextmanager
+async def run_heartbeat_buffer(
+    flush_interval_seconds: float, max_pending_jobs: int
+) -> AsyncIterator[HeartbeatBuffer]:
+    """Run a HeartbeatBuffer, flushing it periodically in a background task.
+
+    The remaining heartbeats are flushed when leaving the context so nothing
+    is lost when shutting down.
+    """
+    buffer = HeartbeatBuffer(max_pending_jobs)
+    _active_buffers.add(buffer)
+    flusher = asyncio.create_task(_flush_periodically(buffer, flush_interval_seconds))
+    try:
+        yield buffer
+    finally:
+        flusher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await flusher
+        await _flush(buffer)
+        _active_buffers.discard(buffer)
+
+
+async def _flush_periodically(
+    buffer: HeartbeatBuffer, flush_interval_seconds: float
+) -> None:
+    while True:
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(
+                buffer.flush_requested.wait(), flush_interval_seconds
+            )
+        try:
+            await _flush(buffer)
+        except Exception:
+            logger.exception(
+                "Failed to flush heartbeats, %d jobs still pending", len(buffer)
+            )
+
+
+async def _flush(buffer: HeartbeatBuffer) -> None:
+    start = time.perf_counter()
+    if n_jobs := await buffer.flush():
+        flush_duration.record(time.perf_counter() - start)
+        logger.debug("Flushed the heartbeats of %d jobs", n_jobs)
+
+
+class JobHeartbeatSettings(ServiceSettingsBase):
+    """Settings for the write-behind buffering of job heartbeats."""
+
+    model_config = SettingsConfigDict(env_prefix="DIRACX_SERVICE_JOBS_HEARTBEAT_")
+
+    buffer_enabled: bool = False
+    # Maximum time a heartbeat stays in the buffer before being written
+    flush_interval_seconds: float = 5.0
+    # Flush early when this many jobs are waiting to be written
+    max_pending_jobs: int = 10_000
+    _buffer: HeartbeatBuffer | None = PrivateAttr(None)
+
+    @contextlib.asynccontextmanager
+    async def lifetime_function(self) -> AsyncIterator[None]:
+        if not self.buffer_enabled:
+            yield
+            return
+
+        try:
+            async with run_heartbeat_buffer(
+                self.flush_interval_seconds, self.max_pending_jobs
+            ) as self._buffer:
+                yield
+        finally:
+            self._buffer = None
+
+    @property
+    def buffer(self) -> HeartbeatBuffer | None:
+        """The running buffer, None if heartbeats should be written directly."""
+        return self._buffer
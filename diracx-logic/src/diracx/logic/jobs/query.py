@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import json
 import logging
+import weakref
+from collections.abc import AsyncIterator
 from typing import Any
 
+from cachetools import TTLCache
+
 from diracx.core.config.schema import Config
+from diracx.core.exceptions import InvalidQueryError
 from diracx.core.models import (
+    CountStrategy,
     ScalarSearchOperator,
     SearchParams,
     SummaryParams,
@@ -18,6 +25,13 @@ logger = logging.getLogger(__name__)
 
 MAX_PER_PAGE = 10000
 
+# How long the total of a search can be reused with CountStrategy.CACHED
+COUNT_CACHE_TTL = 30
+# Recent totals of each JobDB, keyed by the normalized search
+_count_caches: weakref.WeakKeyDictionary[JobDB, TTLCache[str, int]] = (
+    weakref.WeakKeyDictionary()
+)
+
 
 async def search(
     config: Config,
@@ -29,8 +43,198 @@ async def search(
     page: int = 1,
     per_page: int = 100,
     body: SearchParams | None = None,
-) -> tuple[int, list[dict[str, Any]]]:
-    """Retrieve information about jobs."""
+    count_strategy: CountStrategy = CountStrategy.EXACT,
+) -> tuple[int, list[dict[str, Any]], CountStrategy]:
+    """Retrieve information about jobs.
+
+    :return: the total number of jobs, the jobs of the page and the strategy
+        which was actually used to get the total (see ``count_jobs``)
+    """
+    per_page, body, query_logging_info = _prepare_search(
+        config, preferred_username, vo, per_page, body
+    )
+
+    _, jobs = await job_db.search(
+        body.parameters,
+        body.search,
+        body.sort,
+        distinct=body.distinct,
+        page=page,
+        per_page=per_page,
+        count=False,
+    )
+    total, count_strategy = await count_jobs(job_db, body, count_strategy)
+    if count_strategy != CountStrategy.EXACT:
+        # An approximate total must at least be consistent with this page, and
+        # tell the caller to look further when the page is full
+        min_total = per_page * (page - 1) + len(jobs)
+        total = max(total, min_total + (len(jobs) == per_page))
+
+    if query_logging_info:
+        await _add_logging_info(jobs, job_logging_db)
+
+    return total, jobs, count_strategy
+
+
+async def search_stream(
+    config: Config,
+    job_db: JobDB,
+    job_parameters_db: JobParametersDB,
+    job_logging_db: JobLoggingDB,
+    preferred_username: str | None,
+    vo: str,
+    page: int = 1,
+    per_page: int = 100,
+    include_total: bool = True,
+    body: SearchParams | None = None,
+    count_strategy: CountStrategy = CountStrategy.EXACT,
+) -> tuple[int | None, CountStrategy | None, AsyncIterator[list[dict[str, Any]]]]:
+    """Retrieve information about jobs, reading them in batches.
+
+    The search is validated and the total computed before returning, while the
+    jobs are only read from the database when iterating over the batches, which
+    must happen within a transaction of the JobDB and JobLoggingDB.
+
+    :return: the total number of jobs and the strategy used to get it (None if
+        not requested) and an iterator over batches of jobs
+    """
+    per_page, body, query_logging_info = _prepare_search(
+        config, preferred_username, vo, per_page, body
+    )
+
+    batches = job_db.search_stream(
+        body.parameters,
+        body.search,
+        body.sort,
+        distinct=body.distinct,
+        page=page,
+        per_page=per_page,
+    )
+    total: int | None = None
+    used_strategy: CountStrategy | None = None
+    if include_total:
+        total, used_strategy = await count_jobs(job_db, body, count_strategy)
+
+    async def iter_jobs() -> AsyncIterator[list[dict[str, Any]]]:
+        async for jobs in batches:
+            if query_logging_info:
+                await _add_logging_info(jobs, job_logging_db)
+            yield jobs
+
+    return total, used_strategy, iter_jobs()
+
+
+async def search_with_cursor(
+    config: Config,
+    job_db: JobDB,
+    job_parameters_db: JobParametersDB,
+    job_logging_db: JobLoggingDB,
+    preferred_username: str | None,
+    vo: str,
+    cursor: str | None = None,
+    per_page: int = 100,
+    include_total: bool | None = None,
+    body: SearchParams | None = None,
+    count_strategy: CountStrategy = CountStrategy.EXACT,
+) -> tuple[int | None, list[dict[str, Any]], str | None, CountStrategy | None]:
+    """Retrieve information about jobs, one page after the other.
+
+    :param cursor: the token returned with the previous page, None for the
+        first page
+    :param include_total: whether to count the total number of matching jobs,
+        by default they are only counted for the first page
+    :return: the total number of jobs (None if not requested), the jobs,
+        the token to get the next page (None if this is the last page) and
+        the strategy used to get the total (None if not requested)
+    """
+    per_page, body, query_logging_info = _prepare_search(
+        config, preferred_username, vo, per_page, body
+    )
+    if body.distinct:
+        raise InvalidQueryError("Cursor pagination does not support distinct")
+
+    _, jobs, next_cursor = await job_db.search_with_cursor(
+        body.parameters,
+        body.search,
+        body.sort,
+        per_page=per_page,
+        cursor=cursor,
+        count=False,
+    )
+    total: int | None = None
+    used_strategy: CountStrategy | None = None
+    if include_total is None:
+        include_total = cursor is None
+    if include_total:
+        total, used_strategy = await count_jobs(job_db, body, count_strategy)
+
+    if query_logging_info:
+        await _add_logging_info(jobs, job_logging_db)
+
+    return total, jobs, next_cursor, used_strategy
+
+
+async def count_jobs(
+    job_db: JobDB, body: SearchParams, count_strategy: CountStrategy
+) -> tuple[int, CountStrategy]:
+    """Get the total number of jobs matching a search.
+
+    ``ESTIMATED`` uses the row estimate of the query planner, falling back to
+    ``CACHED`` when the database can't provide one. ``CACHED`` returns the total
+    computed for the same search during the last ``COUNT_CACHE_TTL`` seconds,
+    falling back to an exact count. Exact counts are always cached.
+
+    :return: the total and the strategy which actually produced it
+    """
+    if count_strategy == CountStrategy.ESTIMATED:
+        estimate = await job_db.estimate_count(
+            body.parameters, body.search, distinct=body.distinct
+        )
+        if estimate is not None:
+            return estimate, CountStrategy.ESTIMATED
+        count_strategy = CountStrategy.CACHED
+
+    cache = _count_caches.setdefault(
+        job_db, TTLCache(maxsize=1024, ttl=COUNT_CACHE_TTL)
+    )
+    key = _count_cache_key(body)
+    if count_strategy == CountStrategy.CACHED and (total := cache.get(key)) is not None:
+        return total, CountStrategy.CACHED
+
+    total = await job_db.count(body.parameters, body.search, distinct=body.distinct)
+    cache[key] = total
+    return total, CountStrategy.EXACT
+
+
+def _count_cache_key(body: SearchParams) -> str:
+    """Key identifying the jobs matched by a search, whatever the order of the filters.
+
+    The selected parameters only matter for DISTINCT searches and the sort
+    never does.
+    """
+    search = []
+    for spec in body.search:
+        normalized = dict(spec)
+        if "values" in normalized:
+            # The order of the values of "in" and "not in" doesn't matter
+            normalized["values"] = sorted(map(str, normalized["values"]))
+        search.append(json.dumps(normalized, sort_keys=True, default=str))
+    parameters = sorted(body.parameters or []) if body.distinct else None
+    return json.dumps([sorted(search), parameters, body.distinct])
+
+
+def _prepare_search(
+    config: Config,
+    preferred_username: str | None,
+    vo: str,
+    per_page: int,
+    body: SearchParams | None,
+) -> tuple[int, SearchParams, bool]:
+    """Apply the limits and access restrictions common to all the job searches.
+
+    :return: the number of jobs per page, the search parameters and whether
+        the LoggingInfo was requested
+    """
     # Apply a limit to per_page to prevent abuse of the API
     if per_page > MAX_PER_PAGE:
         per_page = MAX_PER_PAGE
@@ -61,23 +265,15 @@ async def search(
             }
         )
 
-    total, jobs = await job_db.search(
-        body.parameters,
-        body.search,
-        body.sort,
-        distinct=body.distinct,
-        page=page,
-        per_page=per_page,
-    )
+    return per_page, body, query_logging_info
 
-    if query_logging_info:
-        job_logging_info = await job_logging_db.get_records(
-            [job["JobID"] for job in jobs]
-        )
-        for job in jobs:
-            job.update({"LoggingInfo": job_logging_info[job["JobID"]]})
 
-    return total, jobs
+async def _add_logging_info(
+    jobs: list[dict[str, Any]], job_logging_db: JobLoggingDB
+) -> None:
+    job_logging_info = await job_logging_db.get_records([job["JobID"] for job in jobs])
+    for job in jobs:
+        job.update({"LoggingInfo": job_logging_info[job["JobID"]]})
 
 
 async def summary(
@@ -101,4 +297,4 @@ async def summary(
                 "value": preferred_username,
             }
         )
-    return await job_db.summary(body.grouping, body.search)
+    return await job_db.summary(body.grouping, body.search, use_counters=True)
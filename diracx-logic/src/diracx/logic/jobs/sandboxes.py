@@ -4,7 +4,6 @@ import asyncio
 import logging
 from typing import TYPE_CHECKING, Any, Literal
 
-from diracx.core.exceptions import SandboxAlreadyInsertedError, SandboxNotFoundError
 from diracx.core.models import (
     SandboxDownloadResponse,
     SandboxInfo,
@@ -22,7 +21,7 @@ from diracx.core.utils import batched_async
 from diracx.db.sql.sandbox_metadata.db import SandboxMetadataDB
 
 if TYPE_CHECKING:
-    from diracx.core.s3 import S3Object
+    from diracx.core.s3 import S3Object, S3PresignedPostInfo
 
 MAX_SANDBOX_SIZE_BYTES = 100 * 1024 * 1024
 
@@ -50,53 +49,98 @@ async def initiate_sandbox_upload(
     If the sandbox does not exist in the database then the "url" and "fields"
     should be used to upload the sandbox to the storage backend.
     """
-    pfn = sandbox_metadata_db.get_pfn(settings.bucket_name, user_info, sandbox_info)
+    (response,) = await initiate_sandbox_uploads(
+        user_info, [sandbox_info], sandbox_metadata_db, settings
+    )
+    return response
 
-    # TODO: This test should come first, but if we do
-    # the access policy will crash for not having been called
-    # so we need to find a way to acknowledge that
 
-    if sandbox_info.size > MAX_SANDBOX_SIZE_BYTES:
-        raise ValueError(
-            f"Sandbox too large, maximum allowed is {MAX_SANDBOX_SIZE_BYTES} bytes"
-        )
-    full_pfn = f"SB:{settings.se_name}|{pfn}"
+async def initiate_sandbox_uploads(
+    user_info: UserInfo,
+    sandbox_infos: list[SandboxInfo],
+    sandbox_metadata_db: SandboxMetadataDB,
+    settings: SandboxStoreSettings,
+    *,
+    max_concurrent_requests: int = 10,
+) -> list[SandboxUploadResponse]:
+    """Bulk version of `initiate_sandbox_upload`.
 
-    try:
-        exists_and_assigned = await sandbox_metadata_db.sandbox_is_assigned(
-            pfn, settings.se_name
-        )
-    except SandboxNotFoundError:
-        # The sandbox doesn't exist in the database
-        pass
-    else:
-        # As sandboxes are registered in the DB before uploading to the storage
-        # backend we can't rely on their existence in the database to determine if
-        # they have been uploaded. Instead we check if the sandbox has been
-        # assigned to a job. If it has then we know it has been uploaded and we
-        # can avoid communicating with the storage backend.
-        if exists_and_assigned or await s3_object_exists(
-            settings.s3_client, settings.bucket_name, pfn_to_key(pfn)
-        ):
-            await sandbox_metadata_db.update_sandbox_last_access_time(
-                settings.se_name, pfn
+    The responses are in the same order as ``sandbox_infos``. The database is
+    queried and updated once for all the sandboxes and the storage backend is
+    queried concurrently.
+    """
+    for sandbox_info in sandbox_infos:
+        if sandbox_info.size > MAX_SANDBOX_SIZE_BYTES:
+            raise ValueError(
+                f"Sandbox too large, maximum allowed is {MAX_SANDBOX_SIZE_BYTES} bytes"
+            )
+    pfns = [
+        sandbox_metadata_db.get_pfn(settings.bucket_name, user_info, sandbox_info)
+        for sandbox_info in sandbox_infos
+    ]
+    # The same sandbox might be requested more than once
+    unique_sandboxes = dict(zip(pfns, sandbox_infos))
+
+    is_assigned = await sandbox_metadata_db.sandboxes_are_assigned(
+        unique_sandboxes, settings.se_name
+    )
+    semaphore = asyncio.Semaphore(max_concurrent_requests)
+
+    async def get_upload_info(
+        pfn: str, sandbox_info: SandboxInfo
+    ) -> S3PresignedPostInfo | None:
+        async with semaphore:
+            # As sandboxes are registered in the DB before uploading to the storage
+            # backend we can't rely on their existence in the database to determine
+            # if they have been uploaded. Instead we check if the sandbox has been
+            # assigned to a job. If it has then we know it has been uploaded and we
+            # can avoid communicating with the storage backend.
+            if pfn in is_assigned and (
+                is_assigned[pfn]
+                or await s3_object_exists(
+                    settings.s3_client, settings.bucket_name, pfn_to_key(pfn)
+                )
+            ):
+                return None
+            return await generate_presigned_upload(
+                settings.s3_client,
+                settings.bucket_name,
+                pfn_to_key(pfn),
+                sandbox_info.checksum_algorithm,
+                sandbox_info.checksum,
+                sandbox_info.size,
+                settings.url_validity_seconds,
             )
-            return SandboxUploadResponse(pfn=full_pfn)
-
-    upload_info = await generate_presigned_upload(
-        settings.s3_client,
-        settings.bucket_name,
-        pfn_to_key(pfn),
-        sandbox_info.checksum_algorithm,
-        sandbox_info.checksum,
-        sandbox_info.size,
-        settings.url_validity_seconds,
+
+    upload_infos = dict(
+        zip(
+            unique_sandboxes,
+            await asyncio.gather(
+                *(
+                    get_upload_info(pfn, sandbox_info)
+                    for pfn, sandbox_info in unique_sandboxes.items()
+                )
+            ),
+        )
     )
-    await insert_sandbox(
-        sandbox_metadata_db, settings.se_name, user_info, pfn, sandbox_info.size
+
+    # TODO: Follow https://github.com/DIRACGrid/diracx/issues/49
+    owner_id = await sandbox_metadata_db.get_owner_id(user_info)
+    if owner_id is None:
+        owner_id = await sandbox_metadata_db.insert_owner(user_info)
+    # Register the new sandboxes and refresh the access time of the others
+    await sandbox_metadata_db.insert_sandboxes(
+        owner_id,
+        settings.se_name,
+        {pfn: sandbox_info.size for pfn, sandbox_info in unique_sandboxes.items()},
     )
 
-    return SandboxUploadResponse(**upload_info, pfn=full_pfn)
+    return [
+        SandboxUploadResponse(
+            **(upload_infos[pfn] or {}), pfn=f"SB:{settings.se_name}|{pfn}"
+        )
+        for pfn in pfns
+    ]
 
 
 async def get_sandbox_file(
@@ -179,25 +223,6 @@ def pfn_to_key(pfn: str) -> str:
     return "/".join(pfn.split("/")[3:])
 
 
-async def insert_sandbox(
-    sandbox_metadata_db: SandboxMetadataDB,
-    se_name: str,
-    user: UserInfo,
-    pfn: str,
-    size: int,
-) -> None:
-    """Add a new sandbox in SandboxMetadataDB."""
-    # TODO: Follow https://github.com/DIRACGrid/diracx/issues/49
-    owner_id = await sandbox_metadata_db.get_owner_id(user)
-    if owner_id is None:
-        owner_id = await sandbox_metadata_db.insert_owner(user)
-
-    try:
-        await sandbox_metadata_db.insert_sandbox(owner_id, se_name, pfn, size)
-    except SandboxAlreadyInsertedError:
-        await sandbox_metadata_db.update_sandbox_last_access_time(se_name, pfn)
-
-
 async def clean_sandboxes(
     sandbox_metadata_db: SandboxMetadataDB,
     settings: SandboxStoreSettings,
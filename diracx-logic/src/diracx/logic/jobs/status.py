@@ -15,18 +15,13 @@ from asyncio import TaskGroup
 from collections import defaultdict
 from datetime import datetime, timezone
 from typing import Any, Iterable
-from unittest.mock import MagicMock
 
 from DIRACCommon.Core.Utilities.ClassAd.ClassAdLight import ClassAd
-from DIRACCommon.Core.Utilities.ReturnValues import SErrorException, returnValueOrRaise
+from DIRACCommon.Core.Utilities.ReturnValues import SErrorException
 from DIRACCommon.WorkloadManagementSystem.DB.JobDBUtils import (
     compressJDL,
     extractJDL,
 )
-from DIRACCommon.WorkloadManagementSystem.Utilities.JobStatusUtility import (
-    getNewStatus,
-    getStartAndEndTime,
-)
 
 from diracx.core.config.schema import Config
 from diracx.core.models import (
@@ -49,8 +44,10 @@ from diracx.db.sql.job_logging.db import JobLoggingDB
 from diracx.db.sql.sandbox_metadata.db import SandboxMetadataDB
 from diracx.db.sql.task_queue.db import TaskQueueDB
 from diracx.db.sql.utils.functions import utcnow
+from diracx.logic.jobs.heartbeat import HeartbeatBuffer
+from diracx.logic.jobs.transitions import compute_status_transitions
 from diracx.logic.jobs.utils import check_and_prepare_job
-from diracx.logic.task_queues.priority import recalculate_tq_shares_for_entity
+from diracx.logic.task_queues.priority import recalculate_tq_shares_for_entities
 
 logger = logging.getLogger(__name__)
 
@@ -126,13 +123,12 @@ async def set_job_statuses(
     job_attribute_updates: dict[int, dict[str, str]] = {}
     skipped_job_attribute_updates: set[int] = set()
     job_logging_updates: list[JobLoggingRecord] = []
-    status_dicts: dict[int, dict[datetime, dict[str, str]]] = defaultdict(dict)
+    status_parameter_updates: list[tuple[str, int, dict[str, Any]]] = []
 
     # transform JobStateUpdate objects into dicts
-    status_dicts = {
+    status_dicts: dict[int, dict[datetime, dict[str, str]]] = {
         job_id: {
-            key: {k: v for k, v in value.model_dump().items() if v is not None}
-            for key, value in status.items()
+            key: value.model_dump(exclude_none=True) for key, value in status.items()
         }
         for job_id, status in status_changes.items()
     }
@@ -167,79 +163,51 @@ async def set_job_statuses(
     # Get the latest time stamps of major status updates
     wms_time_stamps = await job_logging_db.get_wms_time_stamps(found_jobs)
 
+    transitions = compute_status_transitions(
+        (
+            (int(res["JobID"]), res["Status"], res["StartExecTime"], res["EndExecTime"])
+            for res in results
+        ),
+        status_dicts,
+        {
+            job_id: max(time_stamps.values())
+            for job_id, time_stamps in wms_time_stamps.items()
+            if time_stamps
+        },
+        force=force,
+    )
+
+    last_update_time = str(datetime.now(timezone.utc))
     for res in results:
         job_id = int(res["JobID"])
-        current_status = res["Status"]
-        start_time = res["StartExecTime"]
-        end_time = res["EndExecTime"]
-
-        # If the current status is Stalled and we get an update, it should probably be "Running"
-        if current_status == JobStatus.STALLED:
-            current_status = JobStatus.RUNNING
-
-        #####################################################################################################
-        status_dict = status_dicts[job_id]
-        # This is more precise than "LastTime". time_stamps is a sorted list of tuples...
-        # time_stamps = sorted((float(t), s) for s, t in wms_time_stamps[job_id].items())
-        first_status = min(
-            wms_time_stamps[job_id].items(), key=lambda x: x[1], default=("", 0)
-        )[0]
-        last_time = max(wms_time_stamps[job_id].values())
-
-        # Get chronological order of new updates
-        update_times = sorted(status_dict)
-
-        new_start_time, new_end_time = getStartAndEndTime(
-            start_time,
-            end_time,
-            update_times,
-            # Use a type ignore hint here as it exists solely to use the DIRAC API
-            defaultdict(lambda x=first_status: x),  # type: ignore[misc]
-            status_dict,
-        )
+        transition = transitions[job_id]
 
         job_data: dict[str, str] = {}
-        new_status: str | None = None
-        if update_times[-1] >= last_time:
-            new_status, new_minor, new_application = (
-                returnValueOrRaise(  # TODO: Catch this
-                    getNewStatus(
-                        job_id,
-                        update_times,
-                        last_time,
-                        status_dict,
-                        current_status,
-                        force,
-                        MagicMock(),  # FIXME
-                    )
-                )
-            )
-
-            if new_status:
+        if transition.applied:
+            if transition.status:
                 job_data.update(additional_attributes.get(job_id, {}))
-                job_data["Status"] = new_status
-                job_data["LastUpdateTime"] = str(datetime.now(timezone.utc))
-            if new_minor:
-                job_data["MinorStatus"] = new_minor
-            if new_application:
-                job_data["ApplicationStatus"] = new_application
-
-            await job_parameters_db.upsert(res["VO"], job_id, {"Status": new_status})
+                job_data["Status"] = transition.status
+                job_data["LastUpdateTime"] = last_update_time
+            if transition.minor_status:
+                job_data["MinorStatus"] = transition.minor_status
+            if transition.application_status:
+                job_data["ApplicationStatus"] = transition.application_status
+
+            status_parameter_updates.append(
+                (res["VO"], job_id, {"Status": transition.status})
+            )
 
-        for upd_time in update_times:
-            source = status_dict[upd_time]["Source"]
-            if source.startswith("Job") or source == "Heartbeat":
-                job_data["HeartBeatTime"] = str(upd_time)
+        if transition.heartbeat_time:
+            job_data["HeartBeatTime"] = str(transition.heartbeat_time)
 
-        if not start_time and new_start_time:
-            job_data["StartExecTime"] = new_start_time
+        if transition.start_exec_time:
+            job_data["StartExecTime"] = transition.start_exec_time
 
-        if not end_time and new_end_time:
-            job_data["EndExecTime"] = new_end_time
+        if transition.end_exec_time:
+            job_data["EndExecTime"] = transition.end_exec_time
 
-        #####################################################################################################
         # delete or kill job, if we transition to DELETED or KILLED state
-        if new_status in [JobStatus.DELETED, JobStatus.KILLED]:
+        if transition.status in [JobStatus.DELETED, JobStatus.KILLED]:
             deletable_killable_jobs.add(job_id)
 
         # Update database tables
@@ -248,18 +216,10 @@ async def set_job_statuses(
         else:
             skipped_job_attribute_updates.add(job_id)
 
-        for upd_time in update_times:
-            s_dict = status_dict[upd_time]
-            job_logging_updates.append(
-                JobLoggingRecord(
-                    job_id=job_id,
-                    status=s_dict.get("Status", "idem"),
-                    minor_status=s_dict.get("MinorStatus", "idem"),
-                    application_status=s_dict.get("ApplicationStatus", "idem"),
-                    date=upd_time,
-                    source=s_dict.get("Source", "Unknown"),
-                )
-            )
+        job_logging_updates.extend(transition.records)
+
+    if status_parameter_updates:
+        await job_parameters_db.bulk_upsert(status_parameter_updates)
 
     if job_attribute_updates:
         await job_db.set_job_attributes(job_attribute_updates)
@@ -490,23 +450,38 @@ async def remove_jobs_from_task_queue(
     config: Config,
     task_queue_db: TaskQueueDB,
 ):
-    """Remove the job from TaskQueueDB."""
-    await task_queue_db.remove_jobs(job_ids)
+    """Remove the job from TaskQueueDB.
 
+    The task queues left empty are deleted and the shares of their owners are
+    recalculated, in a number of queries which doesn't depend on the number of
+    jobs or task queues.
+    """
+    # The task queues of the jobs must be found before removing them
     tq_infos = await task_queue_db.get_tq_infos_for_jobs(job_ids)
-    for tq_id, owner, owner_group, vo in tq_infos:
-        # TODO: move to Celery
+    await task_queue_db.remove_jobs(job_ids)
+    if not tq_infos:
+        return
 
-        # If the task queue is not empty, do not remove it
-        if not await task_queue_db.is_task_queue_empty(tq_id):
-            continue
+    # TODO: move to Celery
 
-        await task_queue_db.delete_task_queue(tq_id)
+    # If the task queue is not empty, do not remove it
+    empty_tq_ids = await task_queue_db.get_empty_task_queues(
+        {tq_id for tq_id, _, _, _ in tq_infos}
+    )
+    if not empty_tq_ids:
+        return
+    await task_queue_db.delete_task_queues(empty_tq_ids)
 
-        # Recalculate shares for the owner group
-        await recalculate_tq_shares_for_entity(
-            owner, owner_group, vo, config, task_queue_db
-        )
+    # Recalculate shares for the owner groups
+    await recalculate_tq_shares_for_entities(
+        {
+            (owner, owner_group, vo)
+            for tq_id, owner, owner_group, vo in tq_infos
+            if tq_id in empty_tq_ids
+        },
+        config,
+        task_queue_db,
+    )
 
 
 async def set_job_parameters_or_attributes(
@@ -556,8 +531,14 @@ async def add_heartbeat(
     job_logging_db: JobLoggingDB,
     task_queue_db: TaskQueueDB,
     job_parameters_db: JobParametersDB,
+    heartbeat_buffer: HeartbeatBuffer | None = None,
 ) -> None:
-    """Send a heart beat sign of life for a job jobID."""
+    """Send a heart beat sign of life for a job jobID.
+
+    If a ``heartbeat_buffer`` is given, the HeartBeatTime and heartbeat data are
+    written asynchronously by the buffer. Status changes are always applied
+    immediately.
+    """
     # Find the current status of the jobs
     search_query: VectorSearchSpec = {
         "parameter": "JobID",
@@ -593,24 +574,29 @@ async def add_heartbeat(
                 )
             )
 
-        if other_ids := set(data) - set(status_changes):
-            # If there are no status changes, we still need to update the heartbeat time
-            heartbeat_updates = {
-                job_id: {"HeartBeatTime": utcnow()} for job_id in other_ids
-            }
-            tg.create_task(job_db.set_job_attributes(heartbeat_updates))
-
+        sql_data_by_job_id: dict[int, dict[str, Any]] = {}
         os_data_by_job_id: defaultdict[int, dict[str, Any]] = defaultdict(dict)
         for job_id, job_data in data.items():
-            sql_data = {}
+            sql_data = sql_data_by_job_id[job_id] = {}
             for key, value in job_data.model_dump(exclude_defaults=True).items():
                 if key in job_db.heartbeat_fields:
                     sql_data[key] = value
                 else:
                     os_data_by_job_id[job_id][key] = value
 
-            if sql_data:
-                tg.create_task(job_db.add_heartbeat_data(job_id, sql_data))
+        if heartbeat_buffer is not None:
+            heartbeat_buffer.add(job_db, datetime.now(timezone.utc), sql_data_by_job_id)
+        else:
+            if other_ids := set(data) - set(status_changes):
+                # If there are no status changes, we still need to update the heartbeat time
+                heartbeat_updates = {
+                    job_id: {"HeartBeatTime": utcnow()} for job_id in other_ids
+                }
+                tg.create_task(job_db.set_job_attributes(heartbeat_updates))
+
+            for job_id, sql_data in sql_data_by_job_id.items():
+                if sql_data:
+                    tg.create_task(job_db.add_heartbeat_data(job_id, sql_data))
 
         await _insert_parameters(os_data_by_job_id, job_parameters_db, job_db)
 
@@ -641,12 +627,10 @@ async def _insert_parameters(
     )
     job_id_to_vo = {int(x["JobID"]): str(x["VO"]) for x in job_vos}
     # Upsert the parameters into the JobParametersDB
-    # TODO: can we do a bulk upsert instead
-    async with TaskGroup() as tg:
-        for job_id, job_params in updates.items():
-            tg.create_task(
-                job_parameters_db.upsert(job_id_to_vo[job_id], job_id, job_params)
-            )
+    await job_parameters_db.bulk_upsert(
+        (job_id_to_vo[job_id], job_id, job_params)
+        for job_id, job_params in updates.items()
+    )
 
 
 async def get_job_commands(job_ids: Iterable[int], job_db: JobDB) -> list[JobCommand]:
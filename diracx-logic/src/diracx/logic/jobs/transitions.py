@@ -0,0 +1,157 @@
+"""Batch computation of job status transitions.
+
+This is the vectorised counterpart of the DIRACCommon ``getNewStatus`` and
+``getStartAndEndTime`` helpers: instead of calling them once per job, all the
+status updates of a batch are evaluated in a single chronological pass per job.
+The results are identical to calling the DIRACCommon helpers job by job.
+"""
+
+from __future__ import annotations
+
+__all__ = ["StatusTransition", "compute_status_transitions"]
+
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Iterable, Mapping
+
+from DIRACCommon.Core.Utilities.ReturnValues import returnValueOrRaise
+from DIRACCommon.WorkloadManagementSystem.Client.JobStatus import (
+    JOB_FINAL_STATES,
+    JobsStateMachine,
+)
+
+from diracx.core.models import JobLoggingRecord, JobStatus
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class StatusTransition:
+    """Outcome of applying a batch of status updates to a single job.
+
+    ``status``, ``minor_status`` and ``application_status`` are only set when the
+    updates are more recent than the last major status change of the job.
+    ``start_exec_time`` and ``end_exec_time`` are only set if they were not
+    already known.
+    """
+
+    job_id: int
+    applied: bool = False
+    status: str | None = None
+    minor_status: str | None = None
+    application_status: str | None = None
+    start_exec_time: datetime | None = None
+    end_exec_time: datetime | None = None
+    heartbeat_time: datetime | None = None
+    records: list[JobLoggingRecord] = field(default_factory=list)
+
+
+@lru_cache(maxsize=None)
+def _next_state(current_status: str, candidate_status: str) -> dict[str, Any]:
+    """Memoised ``JobsStateMachine(current_status).getNextState(candidate_status)``.
+
+    The state machine is static so there is no need to rebuild it for every
+    transition of every job.
+    """
+    return JobsStateMachine(current_status).getNextState(candidate_status)
+
+
+def compute_status_transitions(
+    jobs: Iterable[tuple[int, str, datetime | None, datetime | None]],
+    status_dicts: Mapping[int, Mapping[datetime, Mapping[str, str]]],
+    last_times: Mapping[int, datetime],
+    *,
+    force: bool = False,
+) -> dict[int, StatusTransition]:
+    """Compute the new status fields for a batch of jobs.
+
+    :param jobs: ``(job_id, current_status, start_exec_time, end_exec_time)``
+        as currently stored in the JobDB
+    :param status_dicts: mapping of ``job_id -> {update_time: status_dict}``
+    :param last_times: mapping of ``job_id -> time of the last major status
+        change`` as recorded in the JobLoggingDB. Jobs without an entry accept
+        all of their updates.
+    :param force: if True, do not enforce the job state machine
+    :return: mapping of ``job_id -> StatusTransition``
+
+    :raises: SErrorException if an update requests an unknown status
+    """
+    result: dict[int, StatusTransition] = {}
+    for job_id, current_status, start_time, end_time in jobs:
+        # If the current status is Stalled and we get an update, it should probably be "Running"
+        if current_status == JobStatus.STALLED:
+            current_status = JobStatus.RUNNING
+
+        status_dict = status_dicts[job_id]
+        update_times = sorted(status_dict)
+        last_time = last_times.get(job_id)
+        transition = StatusTransition(job_id=job_id)
+        transition.applied = last_time is None or update_times[-1] >= last_time
+
+        # The status used to find the start/end times is the one which was
+        # requested, regardless of what the state machine allows
+        requested_status = ""
+        new_start_time, new_end_time = start_time, end_time
+        status = minor = application = ""
+        heartbeat_time = None
+        for upd_time in update_times:
+            s_dict = status_dict[upd_time]
+            s_status = s_dict.get("Status")
+            source = s_dict.get("Source", "Unknown")
+
+            if s_status is not None:
+                requested_status = s_status
+            if not new_start_time and requested_status == JobStatus.RUNNING:
+                new_start_time = upd_time
+            elif not new_end_time and requested_status in JOB_FINAL_STATES:
+                new_end_time = upd_time
+
+            if transition.applied and (last_time is None or upd_time >= last_time):
+                status = current_status if s_status is None else s_status
+                # Evaluate the state machine if the status is changing
+                if not force and status != current_status:
+                    new_status = returnValueOrRaise(_next_state(current_status, status))
+                    # If the state machine does not accept the candidate, don't update
+                    if new_status != status:
+                        logger.debug(
+                            "Job %s can't move from %s to %s: using %s",
+                            job_id,
+                            current_status,
+                            status,
+                            new_status,
+                        )
+                        status = s_status = new_status
+                        # Change the source to indicate this is not what was requested
+                        source = s_dict.get("Source", "") + "(SM)"
+                    current_status = new_status
+                minor = s_dict.get("MinorStatus", minor)
+                application = s_dict.get("ApplicationStatus", application)
+
+            if source.startswith("Job") or source == "Heartbeat":
+                heartbeat_time = upd_time
+
+            transition.records.append(
+                JobLoggingRecord(
+                    job_id=job_id,
+                    status=s_status if s_status is not None else "idem",
+                    minor_status=s_dict.get("MinorStatus", "idem"),
+                    application_status=s_dict.get("ApplicationStatus", "idem"),
+                    date=upd_time,
+                    source=source,
+                )
+            )
+
+        if transition.applied:
+            transition.status = status
+            transition.minor_status = minor
+            transition.application_status = application
+        transition.heartbeat_time = heartbeat_time
+        if not start_time and new_start_time:
+            transition.start_exec_time = new_start_time
+        if not end_time and new_end_time:
+            transition.end_exec_time = new_end_time
+        result[job_id] = transition
+
+    return result
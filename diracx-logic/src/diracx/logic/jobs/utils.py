@@ -1,48 +1,28 @@
 from __future__ import annotations
 
-from functools import partial
-
 from DIRACCommon.Core.Utilities.ClassAd.ClassAdLight import ClassAd
 from DIRACCommon.Core.Utilities.DErrno import EWMSSUBM, cmpError
 from DIRACCommon.Core.Utilities.ReturnValues import returnValueOrRaise
 from DIRACCommon.WorkloadManagementSystem.DB.JobDBUtils import checkAndPrepareJob
 
 from diracx.core.config import Config
-from diracx.core.resources import find_compatible_platforms
 from diracx.db.sql.job.db import JobDB
 
 
 def make_job_manifest_config(config: Config, vo: str):
-    """Create job manifest configuration for DIRACCommon functions from diracx config."""
-    job_desc = config.Operations[vo].JobDescription
+    """Get the job manifest configuration for DIRACCommon functions from diracx config.
 
-    return {
-        "defaultForGroup": {
-            "CPUTime": job_desc.DefaultCPUTime,
-            "Priority": job_desc.DefaultPriority,
-        },
-        "minForGroup": {
-            "CPUTime": job_desc.MinCPUTime,
-            "Priority": job_desc.MinPriority,
-        },
-        "maxForGroup": {
-            "CPUTime": job_desc.MaxCPUTime,
-            "Priority": job_desc.MaxPriority,
-        },
-        "allowedJobTypesForGroup": job_desc.AllowedJobTypes,
-        "maxInputData": job_desc.MaxInputData,
-    }
+    The result is shared by all the callers using the same config revision.
+    """
+    return config.index.job_manifest_configs[vo]
 
 
 def make_check_and_prepare_job_config(config: Config, vo: str):
-    """Create checkAndPrepareJob configuration for DIRACCommon functions from diracx config."""
-    ops = config.Operations[vo]
-    return {
-        "inputDataPolicyForVO": ops.InputDataPolicy.InputDataModule,
-        "softwareDistModuleForVO": ops.SoftwareDistModule,
-        "defaultCPUTimeForOwnerGroup": ops.JobDescription.DefaultCPUTime,
-        "getDIRACPlatform": partial(find_compatible_platforms, config=config),
-    }
+    """Get the checkAndPrepareJob configuration for DIRACCommon functions from diracx config.
+
+    The result is shared by all the callers using the same config revision.
+    """
+    return config.index.check_and_prepare_job_configs[vo]
 
 
 async def check_and_prepare_job(
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from collections import defaultdict
-from typing import Any
+from typing import Any, Iterable
 
 from diracx.core.config.schema import Config
 from diracx.core.properties import JOB_SHARING
@@ -19,76 +19,103 @@ async def recalculate_tq_shares_for_entity(
     task_queue_db: TaskQueueDB,
 ):
     """Recalculate the shares for a user/userGroup combo."""
-    group_properties = config.Registry[vo].Groups[owner_group].Properties
-    job_share = config.Registry[vo].Groups[owner_group].JobShare
-    allow_background_tqs = config.Registry[vo].Groups[owner_group].AllowBackgroundTQs
-    if JOB_SHARING in group_properties:
-        # If group has JobSharing just set prio for that entry, user is irrelevant
-        await set_priorities_for_entity(
-            owner=None,
-            owner_group=owner_group,
-            job_share=job_share,
-            allow_background_tqs=allow_background_tqs,
-            task_queue_db=task_queue_db,
-        )
-        return
-
-    # Get all owners from the owner group
-    owners = await task_queue_db.get_task_queue_owners_by_group(owner_group)
-    num_owners = len(owners)
-    # If there are no owners do now
-    if num_owners == 0:
-        return
-
-    # Split the share amongst the number of owners
-    entities_shares = {owner: job_share / num_owners for owner, _ in owners.items()}
-
-    # TODO: implement the following
-    # If corrector is enabled let it work it's magic
-    # if enable_shares_correction:
-    #     entities_shares = await self.__shares_corrector.correct_shares(
-    #         entitiesShares, group=group
-    #     )
-
-    # If the user is already known and has more than 1 tq, the rest of the users don't need to be modified
-    # (The number of owners didn't change)
-    if owner in owners and owners[owner] > 1:
-        await set_priorities_for_entity(
-            owner=owner,
-            owner_group=owner_group,
-            job_share=entities_shares[owner],
-            allow_background_tqs=allow_background_tqs,
-            task_queue_db=task_queue_db,
-        )
-        return
-
-    # Oops the number of owners may have changed so we recalculate the prio for all owners in the group
-    for owner in owners:
-        await set_priorities_for_entity(
-            owner=owner,
-            owner_group=owner_group,
-            job_share=entities_shares[owner],
-            allow_background_tqs=allow_background_tqs,
-            task_queue_db=task_queue_db,
+    await recalculate_tq_shares_for_entities(
+        {(owner, owner_group, vo)}, config, task_queue_db
+    )
+
+
+async def recalculate_tq_shares_for_entities(
+    entities: Iterable[tuple[str, str, str]],
+    config: Config,
+    task_queue_db: TaskQueueDB,
+):
+    """Recalculate the shares for many user/userGroup combos at once.
+
+    The shares are recalculated once per (owner_group, vo) and all the new
+    priorities are written with a single executemany.
+
+    :param entities: (owner, owner_group, vo) whose task queues changed
+    """
+    owners_by_group: defaultdict[tuple[str, str], set[str]] = defaultdict(set)
+    for owner, owner_group, vo in entities:
+        owners_by_group[(owner_group, vo)].add(owner)
+
+    priorities: dict[int, float] = {}
+    for (owner_group, vo), changed_owners in owners_by_group.items():
+        group_config = config.Registry[vo].Groups[owner_group]
+        entities_shares: dict[str | None, float]
+        if JOB_SHARING in group_config.Properties:
+            # If group has JobSharing just set prio for that entry, user is irrelevant
+            entities_shares = {None: group_config.JobShare}
+        else:
+            # Get all owners from the owner group
+            owners = await task_queue_db.get_task_queue_owners_by_group(owner_group)
+            # If there are no owners do now
+            if not owners:
+                continue
+
+            # Split the share amongst the number of owners
+            share = group_config.JobShare / len(owners)
+
+            # TODO: implement the following
+            # If corrector is enabled let it work it's magic
+            # if enable_shares_correction:
+            #     entities_shares = await self.__shares_corrector.correct_shares(
+            #         entitiesShares, group=group
+            #     )
+
+            # If the users are already known and have more than 1 tq, the rest of
+            # the users don't need to be modified (the number of owners didn't change)
+            if all(owners.get(owner, 0) > 1 for owner in changed_owners):
+                entities_shares = dict.fromkeys(changed_owners, share)
+            else:
+                # Oops the number of owners may have changed so we recalculate
+                # the prio for all owners in the group
+                entities_shares = dict.fromkeys(owners, share)
+
+        priorities |= await calculate_priorities_for_entities(
+            owner_group,
+            entities_shares,
+            group_config.AllowBackgroundTQs,
+            task_queue_db,
         )
 
+    await task_queue_db.set_task_queue_priorities(priorities)
 
-async def set_priorities_for_entity(
+
+async def calculate_priorities_for_entities(
     owner_group: str,
-    job_share: float,
+    entities_shares: dict[str | None, float],
     allow_background_tqs: bool,
     task_queue_db: TaskQueueDB,
-    owner: str | None = None,
-):
-    """Set the priority for a user/userGroup combo given a split share."""
-    tq_dict = await task_queue_db.get_task_queue_priorities(owner_group, owner)
-    if not tq_dict:
-        return
+) -> dict[int, float]:
+    """Calculate the priority of the TQs of several owners of a group.
 
-    rows = await task_queue_db.retrieve_task_queues(list(tq_dict))
-    prio_dict = await calculate_priority(tq_dict, rows, job_share, allow_background_tqs)
-    for prio, tqs in prio_dict.items():
-        await task_queue_db.set_priorities_for_entity(tqs, prio)
+    :param entities_shares: mapping of owner -> share, where the owner None
+        means that the share is for all the TQs of the group
+    :return: mapping of TQId -> priority
+    """
+    tq_dict = await task_queue_db.get_task_queue_priorities(owner_group)
+    if not tq_dict:
+        return {}
+    all_tqs_data = await task_queue_db.retrieve_task_queues(list(tq_dict))
+
+    priorities: dict[int, float] = {}
+    for owner, share in entities_shares.items():
+        owner_tqs_data = {
+            tq_id: tq_data
+            for tq_id, tq_data in all_tqs_data.items()
+            if owner is None or tq_data["Owner"] == owner
+        }
+        if not owner_tqs_data:
+            continue
+        owner_tq_dict = {tq_id: tq_dict[tq_id] for tq_id in owner_tqs_data}
+        prio_dict = await calculate_priority(
+            owner_tq_dict, owner_tqs_data, share, allow_background_tqs
+        )
+        for prio, tqs in prio_dict.items():
+            priorities |= dict.fromkeys(tqs, prio)
+    return priorities
 
 
 async def calculate_priority(
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncGenerator
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import sqlalchemy
+
+from diracx.core.models import HeartbeatData, JobStatus
+from diracx.db.sql.job.db import JobDB
+from diracx.logic.jobs.heartbeat import HeartbeatBuffer, JobHeartbeatSettings
+from diracx.logic.jobs.status import add_heartbeat
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+async def job_db() -> AsyncGenerator[JobDB, None]:
+    db = JobDB(db_url="sqlite+aiosqlite:///:memory:")
+    async with db.engine_context():
+        async with db.engine.begin() as conn:
+            await conn.run_sync(db.metadata.create_all)
+        yield db
+
+
+@pytest.fixture
+async def job_ids(job_db: JobDB) -> list[int]:
+    async with job_db:
+        job_ids = [await job_db.create_job("") for _ in range(3)]
+        await job_db.insert_job_attributes(
+            {
+                job_id: {
+                    "Status": JobStatus.RUNNING,
+                    "VO": "lhcb",
+                    "Owner": "tester",
+                    "OwnerGroup": "lhcb_user",
+                }
+                for job_id in job_ids
+            }
+        )
+    return job_ids
+
+
+async def get_heartbeats(job_db: JobDB):
+    async with job_db:
+        _, jobs = await job_db.search(["JobID", "HeartBeatTime"], [], [])
+        rows = await job_db.conn.execute(
+            sqlalchemy.text(
+                "SELECT JobID, Name, Value FROM HeartBeatLoggingInfo "
+                "ORDER BY JobID, Name"
+            )
+        )
+        return {j["JobID"]: j["HeartBeatTime"] for j in jobs}, [
+            tuple(row) for row in rows
+        ]
+
+
+async def test_buffer_merges_heartbeats(job_db: JobDB, job_ids: list[int]):
+    job1, job2, job3 = job_ids
+    buffer = HeartbeatBuffer(max_pending_jobs=100)
+
+    buffer.add(job_db, T0, {job1: {"LoadAverage": 1, "MemoryUsed": 10}, job2: {}})
+    buffer.add(job_db, T0 + timedelta(minutes=1), {job1: {"LoadAverage": 2}})
+    # Heartbeats received out of order don't overwrite the most recent data
+    buffer.add(job_db, T0 - timedelta(minutes=1), {job1: {"LoadAverage": 0}})
+    assert len(buffer) == 2
+
+    assert await buffer.flush() == 2
+    assert len(buffer) == 0
+    assert await buffer.flush() == 0
+
+    heartbeat_times, data = await get_heartbeats(job_db)
+    assert heartbeat_times == {job1: T0 + timedelta(minutes=1), job2: T0, job3: None}
+    assert data == [(job1, "LoadAverage", "2"), (job1, "MemoryUsed", "10")]
+
+
+async def test_buffer_keeps_heartbeats_on_failure(job_db: JobDB, job_ids, monkeypatch):
+    job1, job2, _ = job_ids
+    buffer = HeartbeatBuffer(max_pending_jobs=100)
+    buffer.add(job_db, T0, {job1: {"LoadAverage": 1}})
+
+    async def broken_add_heartbeats(heartbeats):
+        # A new heartbeat arrives while the flush is in progress
+        buffer.add(job_db, T0 + timedelta(minutes=1), {job1: {}, job2: {}})
+        raise RuntimeError("DB is down")
+
+    monkeypatch.setattr(job_db, "add_heartbeats", broken_add_heartbeats)
+    with pytest.raises(RuntimeError):
+        await buffer.flush()
+    monkeypatch.undo()
+
+    assert len(buffer) == 2
+    assert await buffer.flush() == 2
+    heartbeat_times, data = await get_heartbeats(job_db)
+    assert heartbeat_times[job1] == T0 + timedelta(minutes=1)
+    assert data == [(job1, "LoadAverage", "1")]
+
+
+async def test_add_heartbeat_is_buffered(job_db: JobDB, job_ids: list[int]):
+    job1, job2, _ = job_ids
+    buffer = HeartbeatBuffer(max_pending_jobs=100)
+    data = {
+        job1: HeartbeatData(LoadAverage=3.5),
+        job2: HeartbeatData(),
+    }
+    async with job_db:
+        # None of the other DBs are needed as the jobs are already running
+        await add_heartbeat(data, None, job_db, None, None, None, buffer)  # type: ignore
+
+    heartbeat_times, _ = await get_heartbeats(job_db)
+    assert heartbeat_times[job1] is None
+
+    await buffer.flush()
+    heartbeat_times, heartbeat_data = await get_heartbeats(job_db)
+    assert heartbeat_times[job1] is not None
+    assert heartbeat_times[job1] == heartbeat_times[job2]
+    assert heartbeat_data == [(job1, "LoadAverage", "3.5")]
+
+
+async def test_settings_flush_on_shutdown(job_db: JobDB, job_ids: list[int]):
+    settings = JobHeartbeatSettings(buffer_enabled=True, flush_interval_seconds=3600)
+    assert settings.buffer is None
+
+    async with settings.lifetime_function():
+        assert settings.buffer is not None
+        settings.buffer.add(job_db, T0, {job_ids[0]: {"WallClockTime": 5}})
+        await asyncio.sleep(0)
+        heartbeat_times, _ = await get_heartbeats(job_db)
+        assert heartbeat_times[job_ids[0]] is None
+
+    assert settings.buffer is None
+    heartbeat_times, data = await get_heartbeats(job_db)
+    assert heartbeat_times[job_ids[0]] == T0
+    assert data == [(job_ids[0], "WallClockTime", "5")]
+
+
+async def test_settings_flush_when_full(job_db: JobDB, job_ids: list[int]):
+    settings = JobHeartbeatSettings(
+        buffer_enabled=True, flush_interval_seconds=3600, max_pending_jobs=2
+    )
+    async with settings.lifetime_function():
+        assert settings.buffer is not None
+        settings.buffer.add(job_db, T0, {job_ids[0]: {}})
+        await asyncio.sleep(0.05)
+        assert len(settings.buffer) == 1
+
+        settings.buffer.add(job_db, T0, {job_ids[1]: {}})
+        for _ in range(100):
+            if not len(settings.buffer):
+                break
+            await asyncio.sleep(0.01)
+        heartbeat_times, _ = await get_heartbeats(job_db)
+        assert heartbeat_times[job_ids[0]] == heartbeat_times[job_ids[1]] == T0
+
+
+async def test_settings_disabled():
+    settings = JobHeartbeatSettings()
+    async with settings.lifetime_function():
+        assert settings.buffer is None
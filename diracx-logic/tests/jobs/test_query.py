@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from collections.abc import AsyncGenerator
+
+import pytest
+
+from diracx.core.models import CountStrategy, SearchParams
+from diracx.db.sql.job.db import JobDB
+from diracx.logic.jobs.query import count_jobs
+
+
+@pytest.fixture
+async def job_db() -> AsyncGenerator[JobDB, None]:
+    db = JobDB(db_url="sqlite+aiosqlite:///:memory:")
+    async with db.engine_context():
+        async with db.engine.begin() as conn:
+            await conn.run_sync(db.metadata.create_all)
+        async with db:
+            job_ids = [await db.create_job("") for _ in range(6)]
+            await db.insert_job_attributes(
+                {
+                    job_id: {
+                        "Status": "Waiting" if job_id % 2 else "Running",
+                        "VO": "lhcb",
+                        "Owner": "tester",
+                        "OwnerGroup": "lhcb_user",
+                    }
+                    for job_id in job_ids
+                }
+            )
+        yield db
+
+
+def make_search(*status_values: str) -> SearchParams:
+    return SearchParams.model_validate(
+        {
+            "search": [
+                {"parameter": "Owner", "operator": "eq", "value": "tester"},
+                {"parameter": "Status", "operator": "in", "values": status_values},
+            ]
+        }
+    )
+
+
+async def add_job(job_db: JobDB):
+    job_id = await job_db.create_job("")
+    await job_db.insert_job_attributes(
+        {job_id: {"Status": "Waiting", "VO": "lhcb", "Owner": "tester"}}
+    )
+
+
+async def test_count_strategies(job_db: JobDB):
+    async with job_db:
+        assert await count_jobs(
+            job_db, make_search("Waiting"), CountStrategy.CACHED
+        ) == (3, CountStrategy.EXACT)
+        await add_job(job_db)
+
+        # The total of the same search is reused
+        assert await count_jobs(
+            job_db, make_search("Waiting"), CountStrategy.CACHED
+        ) == (3, CountStrategy.CACHED)
+        # Unless an exact count is requested, which also refreshes the cache
+        assert await count_jobs(
+            job_db, make_search("Waiting"), CountStrategy.EXACT
+        ) == (4, CountStrategy.EXACT)
+        assert await count_jobs(
+            job_db, make_search("Waiting"), CountStrategy.CACHED
+        ) == (4, CountStrategy.CACHED)
+
+        # The order of the filters doesn't matter
+        search = make_search("Running", "Waiting")
+        assert await count_jobs(job_db, search, CountStrategy.CACHED) == (
+            7,
+            CountStrategy.EXACT,
+        )
+        search = make_search("Waiting", "Running")
+        search.search.reverse()
+        assert await count_jobs(job_db, search, CountStrategy.CACHED) == (
+            7,
+            CountStrategy.CACHED,
+        )
+
+        # SQLite doesn't provide estimates so the cache is used
+        assert await count_jobs(
+            job_db, make_search("Waiting"), CountStrategy.ESTIMATED
+        ) == (4, CountStrategy.CACHED)
+
+
+async def test_count_estimated(job_db: JobDB, monkeypatch):
+    async def estimate_count(parameters, search, *, distinct=False):
+        return 1000
+
+    monkeypatch.setattr(job_db, "estimate_count", estimate_count)
+    async with job_db:
+        assert await count_jobs(
+            job_db, make_search("Waiting"), CountStrategy.ESTIMATED
+        ) == (1000, CountStrategy.ESTIMATED)
+
+
+async def test_count_cache_is_per_db(job_db: JobDB):
+    other_db = JobDB(db_url="sqlite+aiosqlite:///:memory:")
+    async with other_db.engine_context():
+        async with other_db.engine.begin() as conn:
+            await conn.run_sync(other_db.metadata.create_all)
+
+        async with job_db:
+            await count_jobs(job_db, make_search("Waiting"), CountStrategy.EXACT)
+        async with other_db:
+            assert await count_jobs(
+                other_db, make_search("Waiting"), CountStrategy.CACHED
+            ) == (0, CountStrategy.EXACT)
@@ -25,6 +25,13 @@ class _MockJobParametersDB(MockOSDBMixin, RealJobParametersDB):
         document["JobID"] = doc_id
         return super().upsert(vo, doc_id, document)
 
+    def bulk_upsert(self, documents, **kwargs):
+        """Override to add JobID to the documents."""
+        return super().bulk_upsert(
+            (vo, doc_id, {**document, "JobID": doc_id})
+            for vo, doc_id, document in documents
+        )
+
 
 # --------------------------------------------------------------------------------------
 # Test setup fixtures
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import pytest
+from DIRACCommon.Core.Utilities.ReturnValues import returnValueOrRaise
+from DIRACCommon.WorkloadManagementSystem.Utilities.JobStatusUtility import (
+    getNewStatus,
+    getStartAndEndTime,
+)
+
+from diracx.core.models import JobLoggingRecord, JobStatus
+from diracx.logic.jobs.transitions import compute_status_transitions
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+SOURCES = ["JobWrapper", "Heartbeat", "JobAgent", "Matcher", "Unknown"]
+STATUSES = [s for s in JobStatus if s != JobStatus.SUBMITTING]
+
+
+def reference_transitions(jobs, status_dicts, last_times, force=False):
+    """The per-job implementation which used to live in ``set_job_statuses``."""
+    result = {}
+    for job_id, current_status, start_time, end_time in jobs:
+        if current_status == JobStatus.STALLED:
+            current_status = JobStatus.RUNNING
+        status_dict = {k: dict(v) for k, v in status_dicts[job_id].items()}
+        last_time = last_times[job_id]
+        update_times = sorted(status_dict)
+
+        new_start_time, new_end_time = getStartAndEndTime(
+            start_time, end_time, update_times, defaultdict(str), status_dict
+        )
+        status = minor = application = None
+        if update_times[-1] >= last_time:
+            status, minor, application = returnValueOrRaise(
+                getNewStatus(
+                    job_id,
+                    update_times,
+                    last_time,
+                    status_dict,
+                    current_status,
+                    force,
+                    MagicMock(),
+                )
+            )
+        heartbeat_time = None
+        for upd_time in update_times:
+            source = status_dict[upd_time]["Source"]
+            if source.startswith("Job") or source == "Heartbeat":
+                heartbeat_time = upd_time
+        records = [
+            JobLoggingRecord(
+                job_id=job_id,
+                status=s_dict.get("Status", "idem"),
+                minor_status=s_dict.get("MinorStatus", "idem"),
+                application_status=s_dict.get("ApplicationStatus", "idem"),
+                date=upd_time,
+                source=s_dict.get("Source", "Unknown"),
+            )
+            for upd_time, s_dict in sorted(status_dict.items())
+        ]
+        result[job_id] = (
+            status,
+            minor,
+            application,
+            new_start_time if not start_time and new_start_time else None,
+            new_end_time if not end_time and new_end_time else None,
+            heartbeat_time,
+            records,
+        )
+    return result
+
+
+def make_batch(n_jobs, seed=1234):
+    """Generate a random batch of jobs with 1 to 4 status updates each."""
+    rng = random.Random(seed)
+    jobs = []
+    status_dicts = {}
+    last_times = {}
+    for job_id in range(1, n_jobs + 1):
+        start_time = T0 if rng.random() < 0.2 else None
+        end_time = T0 + timedelta(hours=1) if rng.random() < 0.1 else None
+        jobs.append((job_id, rng.choice(STATUSES), start_time, end_time))
+        last_times[job_id] = T0 + timedelta(seconds=rng.randint(0, 100))
+        status_dicts[job_id] = {}
+        for _ in range(rng.randint(1, 4)):
+            s_dict = {"Source": rng.choice(SOURCES)}
+            if rng.random() < 0.8:
+                s_dict["Status"] = rng.choice(STATUSES)
+            if rng.random() < 0.5:
+                s_dict["MinorStatus"] = f"minor {rng.randint(0, 9)}"
+            if rng.random() < 0.3:
+                s_dict["ApplicationStatus"] = f"app {rng.randint(0, 9)}"
+            upd_time = T0 + timedelta(seconds=rng.randint(0, 200))
+            status_dicts[job_id][upd_time] = s_dict
+    return jobs, status_dicts, last_times
+
+
+def as_tuple(transition):
+    return (
+        transition.status,
+        transition.minor_status,
+        transition.application_status,
+        transition.start_exec_time,
+        transition.end_exec_time,
+        transition.heartbeat_time,
+        transition.records,
+    )
+
+
+@pytest.mark.parametrize("force", [False, True])
+def test_matches_reference_implementation(force):
+    jobs, status_dicts, last_times = make_batch(2000)
+    expected = reference_transitions(jobs, status_dicts, last_times, force=force)
+    actual = compute_status_transitions(jobs, status_dicts, last_times, force=force)
+    assert {job_id: as_tuple(t) for job_id, t in actual.items()} == expected
+
+
+def test_state_machine_rejection():
+    """A transition refused by the state machine is recorded with an (SM) suffix."""
+    status_dicts = {
+        1: {
+            T0: {"Status": JobStatus.RUNNING, "Source": "JobWrapper"},
+            T0 + timedelta(seconds=1): {"Status": JobStatus.WAITING, "Source": "Foo"},
+        }
+    }
+    jobs = [(1, JobStatus.MATCHED, None, None)]
+    transition = compute_status_transitions(jobs, status_dicts, {1: T0})[1]
+    assert transition.status == JobStatus.RUNNING
+    assert transition.start_exec_time == T0
+    assert transition.heartbeat_time == T0
+    assert [(r.status, r.source) for r in transition.records] == [
+        (JobStatus.RUNNING, "JobWrapper"),
+        (JobStatus.RUNNING, "Foo(SM)"),
+    ]
+    # The input is left untouched
+    assert status_dicts[1][T0 + timedelta(seconds=1)]["Source"] == "Foo"
+
+
+def test_outdated_updates():
+    """Updates older than the last major status change are only logged."""
+    status_dicts = {1: {T0: {"Status": JobStatus.DONE, "Source": "JobWrapper"}}}
+    jobs = [(1, JobStatus.RUNNING, T0, None)]
+    last_times = {1: T0 + timedelta(seconds=1)}
+    transition = compute_status_transitions(jobs, status_dicts, last_times)[1]
+    assert not transition.applied
+    assert transition.status is None
+    assert transition.end_exec_time == T0
+    assert len(transition.records) == 1
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("n_jobs", [1_000, 10_000, 100_000])
+def test_benchmark_status_transitions(n_jobs, record_property):
+    jobs, status_dicts, last_times = make_batch(n_jobs)
+
+    start = time.perf_counter()
+    reference_transitions(jobs, status_dicts, last_times)
+    reference_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compute_status_transitions(jobs, status_dicts, last_times)
+    batch_duration = time.perf_counter() - start
+
+    record_property("reference_seconds", reference_duration)
+    record_property("batch_seconds", batch_duration)
+    print(
+        f"{n_jobs} jobs: per-job loop {reference_duration:.3f}s, "
+        f"batch engine {batch_duration:.3f}s "
+        f"(x{reference_duration / batch_duration:.1f})"
+    )
+    assert batch_duration < reference_duration
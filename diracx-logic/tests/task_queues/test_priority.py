@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event, insert, select
+
+from diracx.core.properties import JOB_SHARING, NORMAL_USER
+from diracx.db.sql.task_queue.db import TaskQueueDB
+from diracx.db.sql.task_queue.schema import JobsQueue, TaskQueues
+from diracx.logic.jobs.status import remove_jobs_from_task_queue
+
+CONFIG = SimpleNamespace(
+    Registry={
+        "lhcb": SimpleNamespace(
+            Groups={
+                "user": SimpleNamespace(
+                    Properties={NORMAL_USER}, JobShare=1000, AllowBackgroundTQs=False
+                ),
+                "prod": SimpleNamespace(
+                    Properties={JOB_SHARING}, JobShare=200, AllowBackgroundTQs=False
+                ),
+            }
+        )
+    }
+)
+
+
+@pytest.fixture
+async def task_queue_db():
+    db = TaskQueueDB("sqlite+aiosqlite:///:memory:")
+    async with db.engine_context():
+        async with db.engine.begin() as conn:
+            await conn.run_sync(db.metadata.create_all)
+        yield db
+
+
+async def add_task_queues(db: TaskQueueDB, tqs: dict[int, tuple[str, str, float]]):
+    """Add task queues with one job each.
+
+    :param tqs: mapping of TQId -> (owner, owner_group, real_priority)
+    """
+    async with db:
+        await db.conn.execute(
+            insert(TaskQueues),
+            [
+                {
+                    "TQId": tq_id,
+                    "Owner": owner,
+                    "OwnerGroup": owner_group,
+                    "VO": "lhcb",
+                    # Different CPU times so that the TQs are not grouped together
+                    "CPUTime": tq_id,
+                    "Priority": 1,
+                    "Enabled": True,
+                }
+                for tq_id, (owner, owner_group, _) in tqs.items()
+            ],
+        )
+        await db.conn.execute(
+            insert(JobsQueue),
+            [
+                {
+                    "TQId": tq_id,
+                    "JobId": tq_id,
+                    "Priority": 1,
+                    "RealPriority": real_priority,
+                }
+                for tq_id, (_, _, real_priority) in tqs.items()
+            ],
+        )
+
+
+async def get_priorities(db: TaskQueueDB) -> dict[int, float]:
+    async with db:
+        rows = await db.conn.execute(select(TaskQueues.TQId, TaskQueues.Priority))
+        return dict(rows.all())
+
+
+async def test_remove_jobs_from_task_queue(task_queue_db: TaskQueueDB):
+    await add_task_queues(
+        task_queue_db,
+        {
+            1: ("alice", "user", 1),
+            2: ("alice", "user", 3),
+            3: ("bob", "user", 1),
+            4: ("bob", "user", 1),
+            5: ("carol", "prod", 1),
+            6: ("dave", "prod", 1),
+            7: ("erin", "user", 1),
+        },
+    )
+    # Add a second job to TQ 7 so it is not emptied
+    async with task_queue_db as db:
+        await db.conn.execute(
+            insert(JobsQueue).values(TQId=7, JobId=70, Priority=1, RealPriority=1)
+        )
+
+    async with task_queue_db as db:
+        await remove_jobs_from_task_queue([4, 6, 7], CONFIG, db)  # type: ignore
+
+    # The three owners of the "user" group share 1000, the two TQs of alice
+    # share her part according to their priority. JobSharing gives the whole
+    # share of the "prod" group to TQ 5.
+    assert await get_priorities(task_queue_db) == pytest.approx(
+        {1: 1000 / 3 / 4, 2: 1000 / 3 * 3 / 4, 3: 1000 / 3, 5: 200, 7: 1000 / 3}
+    )
+
+    # Removing a job which isn't in a task queue is a no-op
+    async with task_queue_db as db:
+        await remove_jobs_from_task_queue([1234], CONFIG, db)  # type: ignore
+
+
+async def test_remove_jobs_from_task_queue_query_count(task_queue_db: TaskQueueDB):
+    """The number of queries doesn't depend on the number of TQs or owners."""
+    n_queries = []
+    executed = []
+    event.listen(
+        task_queue_db.engine.sync_engine,
+        "before_cursor_execute",
+        lambda *args, **kwargs: executed.append(args[2]),
+    )
+    for offset, n_tqs in [(0, 10), (1000, 200)]:
+        await add_task_queues(
+            task_queue_db,
+            {
+                offset + i: (f"owner{offset + i}", "user" if i % 2 else "prod", 1)
+                for i in range(n_tqs)
+            },
+        )
+        executed.clear()
+        async with task_queue_db as db:
+            await remove_jobs_from_task_queue(
+                [offset + i for i in range(0, n_tqs, 3)],
+                CONFIG,  # type: ignore
+                db,
+            )
+        n_queries.append(len(executed))
+    assert n_queries[0] == n_queries[1]
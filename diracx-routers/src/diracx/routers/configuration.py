@@ -1,29 +1,146 @@
 from __future__ import annotations
 
+import gzip
+import json
 from datetime import datetime, timezone
-from typing import Annotated
+from functools import cached_property
+from typing import Annotated, Any
 
+import zstandard
+from cachetools import LRUCache
 from fastapi import (
     Header,
     HTTPException,
+    Request,
     Response,
     status,
 )
+from starlette.concurrency import run_in_threadpool
+
+from diracx.core.config import Config as _Config
 
 from .access_policies import open_access
 from .dependencies import Config
 from .fastapi_classes import DiracxRouter
 
 LAST_MODIFIED_FORMAT = "%a, %d %b %Y %H:%M:%S GMT"
+# Number of revisions kept serialized, older ones can't be the base of a delta
+MAX_SERIALIZED_REVISIONS = 4
+GZIP_COMPRESSION_LEVEL = 6
+ZSTD_COMPRESSION_LEVEL = 10
+# Content codings in order of preference
+SUPPORTED_ENCODINGS = ("zstd", "gzip")
+# Delta encoding as described in RFC 3229, the delta being a RFC 6902 JSON patch
+JSON_PATCH_IM = "json-patch"
+JSON_PATCH_MEDIA_TYPE = "application/json-patch+json"
 
 router = DiracxRouter()
 
 
+class SerializedConfig:
+    """JSON representation of a config revision, with its compressed variants."""
+
+    def __init__(self, config: _Config):
+        self.hexsha = config._hexsha
+        self.modified = config._modified
+        body = config.model_dump_json().encode()
+        self.bodies = {
+            "identity": body,
+            "gzip": gzip.compress(body, compresslevel=GZIP_COMPRESSION_LEVEL, mtime=0),
+            "zstd": zstandard.ZstdCompressor(level=ZSTD_COMPRESSION_LEVEL).compress(
+                body
+            ),
+        }
+
+    @cached_property
+    def content(self) -> Any:
+        """The decoded JSON, only needed to compute deltas."""
+        return json.loads(self.bodies["identity"])
+
+
+# The config is only serialized once per revision. Concurrent requests for a
+# new revision might serialize it more than once, which is harmless.
+_serialized_configs: LRUCache[str, SerializedConfig] = LRUCache(
+    maxsize=MAX_SERIALIZED_REVISIONS
+)
+_deltas: LRUCache[tuple[str, str], bytes] = LRUCache(maxsize=MAX_SERIALIZED_REVISIONS)
+
+
+async def get_serialized_config(config: _Config) -> SerializedConfig:
+    """Return the serialized config, serializing it if it's a new revision."""
+    if (serialized := _serialized_configs.get(config._hexsha)) is None:
+        serialized = await run_in_threadpool(SerializedConfig, config)
+        _serialized_configs[config._hexsha] = serialized
+    return serialized
+
+
+def _escape_json_pointer(key: str) -> str:
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def json_patch(old: Any, new: Any, path: str = "") -> list[dict[str, Any]]:
+    """Generate the RFC 6902 JSON patch transforming ``old`` into ``new``.
+
+    Objects are compared key by key, anything else (including arrays) is
+    replaced as a whole when it differs.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        operations: list[dict[str, Any]] = []
+        for key in old:
+            if key not in new:
+                operations.append(
+                    {"op": "remove", "path": f"{path}/{_escape_json_pointer(key)}"}
+                )
+        for key, value in new.items():
+            key_path = f"{path}/{_escape_json_pointer(key)}"
+            if key not in old:
+                operations.append({"op": "add", "path": key_path, "value": value})
+            elif old[key] != value or type(old[key]) is not type(value):
+                operations.extend(json_patch(old[key], value, key_path))
+        return operations
+    if old == new and type(old) is type(new):
+        return []
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def _get_delta(base: SerializedConfig, target: SerializedConfig) -> bytes:
+    key = (base.hexsha, target.hexsha)
+    if (delta := _deltas.get(key)) is None:
+        delta = _deltas[key] = json.dumps(
+            json_patch(base.content, target.content), separators=(",", ":")
+        ).encode()
+    return delta
+
+
+def _select_encoding(accept_encoding: str | None) -> str:
+    """Pick the preferred content coding accepted by the client.
+
+    ``*`` matches the codings which aren't listed, those listed with ``q=0``
+    are never used.
+    """
+    accepted, refused = set(), set()
+    for coding in (accept_encoding or "").split(","):
+        name, *params = coding.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        (accepted if quality > 0 else refused).add(name.strip().lower())
+    for encoding in SUPPORTED_ENCODINGS:
+        if encoding in accepted or ("*" in accepted and encoding not in refused):
+            return encoding
+    return "identity"
+
+
 @open_access
 @router.get("/")
 async def serve_config(
     config: Config,
-    response: Response,
+    request: Request,
     # check_permissions: OpenAccessPolicyCallable,
     if_none_match: Annotated[str | None, Header()] = None,
     if_modified_since: Annotated[str | None, Header()] = None,
@@ -34,11 +151,17 @@ async def serve_config(
 
     If If-Modified-Since is given and is newer than latest,
         return 304: this is to avoid flip/flopping
+
+    If A-IM contains json-patch and If-None-Match is the ETag of one of the
+    previous revisions, return 226 with the JSON patch transforming that
+    revision into the latest one.
     """
     # await check_permissions()
     headers = {
         "ETag": config._hexsha,
         "Last-Modified": config._modified.strftime(LAST_MODIFIED_FORMAT),
+        # Also needed for the 304 responses, which are cached like the others
+        "Vary": "Accept-Encoding, A-IM",
     }
 
     if if_none_match == config._hexsha:
@@ -59,6 +182,29 @@ async def serve_config(
                     status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
                 )
 
-    response.headers.update(headers)
+    serialized = await get_serialized_config(config)
+
+    instance_manipulations = {
+        im.strip().lower() for im in request.headers.get("A-IM", "").split(",")
+    }
+    if (
+        JSON_PATCH_IM in instance_manipulations
+        and if_none_match
+        and (base := _serialized_configs.get(if_none_match)) is not None
+    ):
+        headers |= {"IM": JSON_PATCH_IM, "Delta-Base": base.hexsha}
+        return Response(
+            content=_get_delta(base, serialized),
+            status_code=status.HTTP_226_IM_USED,
+            headers=headers,
+            media_type=JSON_PATCH_MEDIA_TYPE,
+        )
 
-    return config
+    encoding = _select_encoding(request.headers.get("Accept-Encoding"))
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(
+        content=serialized.bodies[encoding],
+        headers=headers,
+        media_type="application/json",
+    )
@@ -8,6 +8,7 @@ __all__ = (
     "SandboxMetadataDB",
     "TaskQueueDB",
     "PilotAgentsDB",
+    "JobHeartbeatSettings",
     "add_settings_annotation",
     "AvailableSecurityProperties",
 )
@@ -30,6 +31,7 @@ from diracx.db.sql import JobLoggingDB as _JobLoggingDB
 from diracx.db.sql import PilotAgentsDB as _PilotAgentsDB
 from diracx.db.sql import SandboxMetadataDB as _SandboxMetadataDB
 from diracx.db.sql import TaskQueueDB as _TaskQueueDB
+from diracx.logic.jobs.heartbeat import JobHeartbeatSettings as _JobHeartbeatSettings
 
 T = TypeVar("T")
 
@@ -70,3 +72,6 @@ DevelopmentSettings = Annotated[
 SandboxStoreSettings = Annotated[
     _SandboxStoreSettings, Depends(_SandboxStoreSettings.create)
 ]
+JobHeartbeatSettings = Annotated[
+    _JobHeartbeatSettings, Depends(_JobHeartbeatSettings.create)
+]
@@ -137,16 +137,16 @@ def create_app_inner(
     # Find which settings classes are available and add them to dependency_overrides
     # We use a single instance of each Setting classes for performance reasons,
     # since it avoids recreating a pydantic model every time
-    # We add the Settings lifetime_function to the application lifetime_function,
-    # Please see ServiceSettingsBase for more details
+    # The Settings lifetime_function are added to the application lifetime_function
+    # once the DBs have been added, please see ServiceSettingsBase for more details
 
+    all_service_settings = list(all_service_settings)
     available_settings_classes: set[type[ServiceSettingsBase]] = set()
 
     for service_settings in all_service_settings:
         cls = type(service_settings)
         assert cls not in available_settings_classes
         available_settings_classes.add(cls)
-        app.lifetime_functions.append(service_settings.lifetime_function)
         # We always return the same setting instance for perf reasons
         app.dependency_overrides[cls.create] = partial(lambda x: x, service_settings)
 
@@ -155,6 +155,7 @@ def create_app_inner(
     app.dependency_overrides[ConfigSource.create] = (
         config_source.read_config_non_blocking
     )
+    app.lifetime_functions.append(config_source.lifetime_function)
 
     all_access_policies_used = {}
 
@@ -178,8 +179,8 @@ def create_app_inner(
                 policy_name=access_policy_name,
             )
 
-    app.dependency_overrides[BaseAccessPolicy.all_used_access_policies] = (
-        lambda: all_access_policies_used
+    app.dependency_overrides[BaseAccessPolicy.all_used_access_policies] = lambda: (
+        all_access_policies_used
     )
 
     fail_startup = True
@@ -228,6 +229,11 @@ def create_app_inner(
                 db_transaction, os_db
             )
 
+    # The settings lifetime functions are added after those of the DBs so that
+    # they are stopped first, e.g. buffered writes can still be flushed to the DBs
+    for service_settings in all_service_settings:
+        app.lifetime_functions.append(service_settings.lifetime_function)
+
     # Load the requested routers
     routers: dict[str, APIRouter] = {}
     # The enabled systems must be sorted to ensure the openapi.json is deterministic
@@ -317,7 +323,12 @@ def create_app_inner(
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
-        expose_headers=["Content-Range"],
+        expose_headers=[
+            "Content-Range",
+            "X-Count-Strategy",
+            "X-Next-Cursor",
+            "X-Total-Count",
+        ],
     )
 
     configure_logger()
@@ -36,9 +36,20 @@ class DiracFastAPI(FastAPI):
     def __init__(self):
         @contextlib.asynccontextmanager
         async def lifespan(app: DiracFastAPI):
+            # The lifetime functions are started concurrently but, like nested
+            # context managers, they are stopped in the reverse order of
+            # app.lifetime_functions. This lets lifetime functions which are added
+            # later rely on the earlier ones (e.g. DB engines) during shutdown.
             async with contextlib.AsyncExitStack() as stack:
+                stacks = [
+                    await stack.enter_async_context(contextlib.AsyncExitStack())
+                    for _ in app.lifetime_functions
+                ]
                 await asyncio.gather(
-                    *(stack.enter_async_context(f()) for f in app.lifetime_functions)
+                    *(
+                        s.enter_async_context(f())
+                        for s, f in zip(stacks, app.lifetime_functions)
+                    )
                 )
                 yield
 
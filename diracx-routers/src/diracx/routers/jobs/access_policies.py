@@ -159,12 +159,11 @@ class SandboxAccessPolicy(BaseAccessPolicy):
                         status_code=status.HTTP_403_FORBIDDEN,
                         detail=f"Invalid PFN. PFN must start with {required_prefix}",
                     )
-                # Checking if the user owns the sandbox
-                owner_id = await sandbox_metadata_db.get_owner_id(user_info)
-                sandbox_owner_id = await sandbox_metadata_db.get_sandbox_owner_id(
-                    pfn, se_name
-                )
-                if not owner_id or owner_id != sandbox_owner_id:
+            # Checking if the user owns the sandboxes
+            owner_id = await sandbox_metadata_db.get_owner_id(user_info)
+            sandbox_ids = await sandbox_metadata_db.get_sandbox_ids(se_name, pfns)
+            for pfn in pfns:
+                if not owner_id or owner_id != sandbox_ids.get(pfn, (None, None))[1]:
                     raise HTTPException(
                         status_code=status.HTTP_403_FORBIDDEN,
                         detail=f"{user_info.preferred_username} is not the owner of the sandbox",
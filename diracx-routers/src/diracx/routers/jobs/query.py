@@ -1,16 +1,23 @@
 from __future__ import annotations
 
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack
 from http import HTTPStatus
 from typing import Annotated, Any
 
-from fastapi import Body, Depends, Response
+from fastapi import Body, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic_core import to_json
 
 from diracx.core.models import (
+    CountStrategy,
     SearchParams,
     SummaryParams,
 )
 from diracx.core.properties import JOB_ADMINISTRATOR
 from diracx.logic.jobs.query import search as search_bl
+from diracx.logic.jobs.query import search_stream as search_stream_bl
+from diracx.logic.jobs.query import search_with_cursor as search_with_cursor_bl
 from diracx.logic.jobs.query import summary as summary_bl
 
 from ..dependencies import (
@@ -28,6 +35,8 @@ router = DiracxRouter()
 
 MAX_PER_PAGE = 10000
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
 
 EXAMPLE_SEARCHES = {
     "Show all": {
@@ -57,6 +66,20 @@ EXAMPLE_SEARCHES = {
 EXAMPLE_SEARCH_RESPONSES: dict[int | str, dict[str, Any]] = {
     200: {
         "description": "List of matching results",
+        "headers": {
+            "X-Next-Cursor": {
+                "description": "The cursor to get the next page, absent on the last page",
+                "schema": {"type": "string"},
+            },
+            "X-Total-Count": {
+                "description": "The total number of matching jobs, if it was requested",
+                "schema": {"type": "integer"},
+            },
+            "X-Count-Strategy": {
+                "description": "The strategy used to get the total number of jobs",
+                "schema": {"type": "string"},
+            },
+        },
         "content": {
             "application/json": {
                 "example": [
@@ -90,7 +113,11 @@ EXAMPLE_SEARCH_RESPONSES: dict[int | str, dict[str, Any]] = {
             "Content-Range": {
                 "description": "The range of jobs returned in this response",
                 "schema": {"type": "string", "example": "jobs 0-1/4"},
-            }
+            },
+            "X-Count-Strategy": {
+                "description": "The strategy used to get the total number of jobs",
+                "schema": {"type": "string"},
+            },
         },
         "model": list[dict[str, Any]],
         "content": {
@@ -131,9 +158,13 @@ async def search(
     job_logging_db: JobLoggingDB,
     user_info: Annotated[AuthorizedUserInfo, Depends(verify_dirac_access_token)],
     check_permissions: CheckWMSPolicyCallable,
+    request: Request,
     response: Response,
     page: int = 1,
     per_page: int = 100,
+    cursor: str | None = None,
+    include_total: bool | None = None,
+    count_strategy: CountStrategy = CountStrategy.EXACT,
     body: Annotated[
         SearchParams | None, Body(openapi_examples=EXAMPLE_SEARCHES)
     ] = None,
@@ -148,6 +179,31 @@ async def search(
 
     By default, the search will return all jobs the user has access to, and all the fields
     of the job will be returned.
+
+    **Pagination**
+    - By default, pages are selected with `page` and `per_page` and the
+      `Content-Range` header gives the position of the page among all the jobs.
+    - When paging deep into the results, pass an empty `cursor` to get the first
+      page and then the value of the `X-Next-Cursor` response header to get the
+      following ones. This header is absent on the last page. In this mode,
+      the total number of jobs is given in the `X-Total-Count` header of the
+      first page, `include_total` can be used to request it for the other pages
+      or to skip it.
+
+    **Total**
+    - Counting all the matching jobs can be expensive, `count_strategy` selects
+      how the total is obtained: `exact` (default) counts the jobs, `estimated`
+      uses the estimate of the database and `cached` reuses the total of the same
+      search if it was computed recently. The strategy which actually produced
+      the total is given in the `X-Count-Strategy` header: when no estimate or
+      recent total is available the jobs are counted.
+
+    **Streaming**
+    - With `Accept: application/x-ndjson` the jobs are sent as newline-delimited
+      JSON while they are read from the database instead of being loaded all at
+      once, which allows to retrieve large pages (up to `per_page=10000`) with
+      a bounded memory usage. The total is given in the `X-Total-Count` header
+      unless `include_total=false`. This is not supported together with `cursor`.
     """
     await check_permissions(action=ActionType.QUERY, job_db=job_db)
 
@@ -155,7 +211,62 @@ async def search(
     if JOB_ADMINISTRATOR in user_info.properties:
         preferred_username = None
 
-    total, jobs = await search_bl(
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        if cursor is not None:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail="cursor cannot be used when streaming the results",
+            )
+        stream_total, used_strategy, batches = await search_stream_bl(
+            config=config,
+            job_db=job_db,
+            job_parameters_db=job_parameters_db,
+            job_logging_db=job_logging_db,
+            preferred_username=preferred_username,
+            vo=user_info.vo,
+            page=page,
+            per_page=per_page,
+            include_total=include_total is not False,
+            body=body,
+            count_strategy=count_strategy,
+        )
+        headers = {}
+        if stream_total is not None and used_strategy is not None:
+            headers["X-Total-Count"] = str(stream_total)
+            headers["X-Count-Strategy"] = used_strategy
+        return StreamingResponse(  # type: ignore[return-value]
+            _iter_ndjson(batches, job_db, job_logging_db),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=headers,
+        )
+
+    if cursor is not None:
+        if page != 1:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail="page cannot be used together with cursor",
+            )
+        cursor_total, jobs, next_cursor, used_strategy = await search_with_cursor_bl(
+            config=config,
+            job_db=job_db,
+            job_parameters_db=job_parameters_db,
+            job_logging_db=job_logging_db,
+            preferred_username=preferred_username,
+            vo=user_info.vo,
+            cursor=cursor or None,
+            per_page=per_page,
+            include_total=include_total,
+            body=body,
+            count_strategy=count_strategy,
+        )
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+        if cursor_total is not None and used_strategy is not None:
+            response.headers["X-Total-Count"] = str(cursor_total)
+            response.headers["X-Count-Strategy"] = used_strategy
+        return jobs
+
+    total, jobs, used_strategy = await search_bl(
         config=config,
         job_db=job_db,
         job_parameters_db=job_parameters_db,
@@ -165,7 +276,9 @@ async def search(
         page=page,
         per_page=per_page,
         body=body,
+        count_strategy=count_strategy,
     )
+    response.headers["X-Count-Strategy"] = used_strategy
 
     # Set the Content-Range header if needed
     # https://datatracker.ietf.org/doc/html/rfc7233#section-4
@@ -186,6 +299,22 @@ async def search(
     return jobs
 
 
+async def _iter_ndjson(
+    batches: AsyncIterator[list[dict[str, Any]]], *dbs: Any
+) -> AsyncIterator[bytes]:
+    """Serialize batches of jobs as newline-delimited JSON.
+
+    The DB transactions of the request are committed before the response is
+    sent, so the jobs are read within new transactions of the given DBs.
+    """
+    async with AsyncExitStack() as stack:
+        for db in dbs:
+            await stack.enter_async_context(db)
+        async for jobs in batches:
+            # Serialized like the JSON responses
+            yield b"".join(to_json(job) + b"\n" for job in jobs)
+
+
 EXAMPLE_SUMMARY = {
     "Show all": {
         "summary": "Show all",
@@ -21,6 +21,9 @@ from diracx.logic.jobs.sandboxes import get_sandbox_file as get_sandbox_file_bl
 from diracx.logic.jobs.sandboxes import (
     initiate_sandbox_upload as initiate_sandbox_upload_bl,
 )
+from diracx.logic.jobs.sandboxes import (
+    initiate_sandbox_uploads as initiate_sandbox_uploads_bl,
+)
 from diracx.logic.jobs.sandboxes import (
     unassign_jobs_sandboxes as unassign_jobs_sandboxes_bl,
 )
@@ -35,6 +38,7 @@ from .access_policies import (
 )
 
 MAX_SANDBOX_SIZE_BYTES = 100 * 1024 * 1024
+MAX_SANDBOXES_PER_REQUEST = 1000
 router = DiracxRouter()
 
 
@@ -70,6 +74,36 @@ async def initiate_sandbox_upload(
     return sandbox_upload_response
 
 
+@router.post("/sandbox/bulk")
+async def initiate_bulk_sandbox_upload(
+    user_info: Annotated[AuthorizedUserInfo, Depends(verify_dirac_access_token)],
+    sandbox_infos: Annotated[
+        list[SandboxInfo], Body(min_length=1, max_length=MAX_SANDBOXES_PER_REQUEST)
+    ],
+    sandbox_metadata_db: SandboxMetadataDB,
+    settings: SandboxStoreSettings,
+    check_permissions: CheckSandboxPolicyCallable,
+) -> list[SandboxUploadResponse]:
+    """Get the PFNs for the given sandboxes, initiate the uploads as required.
+
+    This is the same as ``POST /sandbox`` for many sandboxes at once, the
+    responses are returned in the same order as the request.
+    """
+    await check_permissions(
+        action=ActionType.CREATE, sandbox_metadata_db=sandbox_metadata_db
+    )
+
+    try:
+        return await initiate_sandbox_uploads_bl(
+            user_info, sandbox_infos, sandbox_metadata_db, settings
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=str(e),
+        ) from e
+
+
 @router.get("/sandbox")
 async def get_sandbox_file(
     pfn: Annotated[str, Query(max_length=256, pattern=SANDBOX_PFN_REGEX)],
@@ -24,6 +24,7 @@ from diracx.logic.jobs.status import set_job_statuses as set_job_statuses_bl
 from ..dependencies import (
     Config,
     JobDB,
+    JobHeartbeatSettings,
     JobLoggingDB,
     JobParametersDB,
     TaskQueueDB,
@@ -165,6 +166,7 @@ async def add_heartbeat(
     job_logging_db: JobLoggingDB,
     task_queue_db: TaskQueueDB,
     job_parameters_db: JobParametersDB,
+    heartbeat_settings: JobHeartbeatSettings,
     check_permissions: CheckWMSPolicyCallable,
 ) -> list[JobCommand]:
     """Register a heartbeat from the job.
@@ -178,7 +180,13 @@ async def add_heartbeat(
     await check_permissions(action=ActionType.PILOT, job_db=job_db, job_ids=list(data))
 
     await add_heartbeat_bl(
-        data, config, job_db, job_logging_db, task_queue_db, job_parameters_db
+        data,
+        config,
+        job_db,
+        job_logging_db,
+        task_queue_db,
+        job_parameters_db,
+        heartbeat_buffer=heartbeat_settings.buffer,
     )
     return await get_job_commands_bl(data, job_db)
 
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 from datetime import datetime, timezone
 from http import HTTPStatus
 
@@ -540,6 +541,144 @@ def test_search_pagination(normal_user_client):
     assert r.status_code == 400, r.json()
 
 
+def test_search_cursor_pagination(normal_user_client):
+    """Test that the jobs can be paged through using a cursor."""
+    job_definitions = [TEST_JDL] * 20
+    r = normal_user_client.post("/api/jobs/jdl", json=job_definitions)
+    assert r.status_code == 200, r.json()
+    body = {
+        "parameters": ["JobID"],
+        "sort": [{"parameter": "JobID", "direction": "desc"}],
+    }
+
+    r = normal_user_client.post("/api/jobs/search", json=body)
+    expected = r.json()
+    assert len(expected) == 20
+
+    # An empty cursor gives the first page
+    r = normal_user_client.post(
+        "/api/jobs/search", params={"cursor": "", "per_page": 8}, json=body
+    )
+    assert r.status_code == 200, r.json()
+    assert r.json() == expected[:8]
+    assert "Content-Range" not in r.headers
+    assert r.headers["X-Total-Count"] == "20"
+    cursor = r.headers["X-Next-Cursor"]
+
+    # The total is only counted for the first page unless requested
+    r = normal_user_client.post(
+        "/api/jobs/search", params={"cursor": cursor, "per_page": 8}, json=body
+    )
+    assert r.status_code == 200, r.json()
+    assert r.json() == expected[8:16]
+    assert "X-Total-Count" not in r.headers
+    cursor = r.headers["X-Next-Cursor"]
+
+    r = normal_user_client.post(
+        "/api/jobs/search",
+        params={"cursor": cursor, "per_page": 8, "include_total": True},
+        json=body,
+    )
+    assert r.status_code == 200, r.json()
+    assert r.json() == expected[16:]
+    assert r.headers["X-Total-Count"] == "20"
+    assert "X-Next-Cursor" not in r.headers
+
+    # The cursor is only valid for the sort it was created with
+    r = normal_user_client.post("/api/jobs/search", params={"cursor": cursor})
+    assert r.status_code == 400, r.json()
+
+    # page and cursor are mutually exclusive
+    r = normal_user_client.post(
+        "/api/jobs/search", params={"cursor": "", "page": 2}, json=body
+    )
+    assert r.status_code == 400, r.json()
+
+
+def test_search_count_strategy(normal_user_client):
+    """Test that the strategy used to get the total is reported."""
+    r = normal_user_client.post("/api/jobs/jdl", json=[TEST_JDL] * 5)
+    assert r.status_code == 200, r.json()
+
+    # The totals are cached by the app, use a search no other test does
+    body = {
+        "search": [
+            {"parameter": "JobGroup", "operator": "neq", "value": "count_strategy"}
+        ]
+    }
+    params = {"per_page": 2, "count_strategy": "cached"}
+    r = normal_user_client.post("/api/jobs/search", params=params, json=body)
+    assert r.status_code == 206, r.json()
+    # Nothing was cached yet so the jobs were counted
+    assert r.headers["X-Count-Strategy"] == "exact"
+    assert r.headers["Content-Range"] == "jobs 0-1/5"
+
+    r = normal_user_client.post(
+        "/api/jobs/search", params=params | {"page": 2}, json=body
+    )
+    assert r.status_code == 206, r.json()
+    assert r.headers["X-Count-Strategy"] == "cached"
+    assert r.headers["Content-Range"] == "jobs 2-3/5"
+
+    # The estimate isn't available with SQLite so the cached total is used
+    r = normal_user_client.post(
+        "/api/jobs/search",
+        params={"cursor": "", "per_page": 2, "count_strategy": "estimated"},
+        json=body,
+    )
+    assert r.status_code == 200, r.json()
+    assert r.headers["X-Count-Strategy"] == "cached"
+    assert r.headers["X-Total-Count"] == "5"
+
+    r = normal_user_client.post("/api/jobs/search")
+    assert r.headers["X-Count-Strategy"] == "exact"
+
+    r = normal_user_client.post("/api/jobs/search", params={"count_strategy": "bad"})
+    assert r.status_code == 422, r.json()
+
+
+def test_search_ndjson(normal_user_client):
+    """Test that the jobs can be streamed as newline delimited JSON."""
+    r = normal_user_client.post("/api/jobs/jdl", json=[TEST_JDL] * 5)
+    assert r.status_code == 200, r.json()
+    body = {
+        "parameters": ["JobID", "Status", "SubmissionTime", "LoggingInfo"],
+        "sort": [{"parameter": "JobID", "direction": "desc"}],
+    }
+    r = normal_user_client.post("/api/jobs/search", json=body)
+    expected = r.json()
+    assert len(expected) == 5
+
+    headers = {"Accept": "application/x-ndjson"}
+    r = normal_user_client.post("/api/jobs/search", json=body, headers=headers)
+    assert r.status_code == 200, r.text
+    assert r.headers["Content-Type"] == "application/x-ndjson"
+    assert r.headers["X-Total-Count"] == "5"
+    assert r.headers["X-Count-Strategy"] == "exact"
+    assert "Content-Range" not in r.headers
+    assert [json.loads(line) for line in r.text.splitlines()] == expected
+
+    r = normal_user_client.post(
+        "/api/jobs/search",
+        params={"page": 2, "per_page": 2, "include_total": False},
+        json=body,
+        headers=headers,
+    )
+    assert r.status_code == 200, r.text
+    assert "X-Total-Count" not in r.headers
+    assert [json.loads(line) for line in r.text.splitlines()] == expected[2:4]
+
+    # Invalid searches are rejected before starting to stream
+    r = normal_user_client.post(
+        "/api/jobs/search", json={"parameters": ["Unknown"]}, headers=headers
+    )
+    assert r.status_code == 400, r.text
+    r = normal_user_client.post(
+        "/api/jobs/search", params={"cursor": ""}, headers=headers
+    )
+    assert r.status_code == 400, r.text
+
+
 def test_user_cannot_submit_parametric_jdl_greater_than_max_parametric_jobs(
     normal_user_client,
 ):
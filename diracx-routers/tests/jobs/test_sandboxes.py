@@ -216,6 +216,62 @@ def test_upload_oversized(normal_user_client: TestClient):
     assert "Sandbox too large" in r.json()["detail"], r.text
 
 
+def test_bulk_upload(normal_user_client: TestClient):
+    """Test that many sandboxes can be uploaded with a single request."""
+    data = [secrets.token_bytes(512) for _ in range(3)]
+    sandbox_infos = [
+        {
+            "checksum_algorithm": "sha256",
+            "checksum": hashlib.sha256(d).hexdigest(),
+            "size": len(d),
+            "format": "tar.bz2",
+        }
+        for d in data
+    ]
+
+    # The same sandbox can be requested several times
+    r = normal_user_client.post(
+        "/api/jobs/sandbox/bulk", json=sandbox_infos + sandbox_infos[:1]
+    )
+    assert r.status_code == 200, r.text
+    upload_infos = r.json()
+    assert len(upload_infos) == 4
+    assert all(upload_info["url"] for upload_info in upload_infos)
+    assert upload_infos[0] == upload_infos[3]
+    assert len({upload_info["pfn"] for upload_info in upload_infos}) == 3
+
+    # Only upload the first sandbox
+    files = {"file": ("file", BytesIO(data[0]))}
+    r = httpx.post(upload_infos[0]["url"], data=upload_infos[0]["fields"], files=files)
+    assert r.status_code == 204, r.text
+
+    r = normal_user_client.post("/api/jobs/sandbox/bulk", json=sandbox_infos)
+    assert r.status_code == 200, r.text
+    assert [upload_info["pfn"] for upload_info in r.json()] == [
+        upload_info["pfn"] for upload_info in upload_infos[:3]
+    ]
+    assert [upload_info["url"] is None for upload_info in r.json()] == [
+        True,
+        False,
+        False,
+    ]
+
+    # The single sandbox route agrees
+    r = normal_user_client.post("/api/jobs/sandbox", json=sandbox_infos[0])
+    assert r.status_code == 200, r.text
+    assert r.json() == {"pfn": upload_infos[0]["pfn"], "url": None, "fields": {}}
+
+    r = normal_user_client.post(
+        "/api/jobs/sandbox/bulk",
+        json=[sandbox_infos[1] | {"size": 1024 * 1024 * 1024}, sandbox_infos[2]],
+    )
+    assert r.status_code == 400, r.text
+    assert "Sandbox too large" in r.json()["detail"], r.text
+
+    r = normal_user_client.post("/api/jobs/sandbox/bulk", json=[])
+    assert r.status_code == 422, r.text
+
+
 def test_malformed_request_to_get_job_sandbox(normal_user_client: TestClient):
     """Test that a malformed request to get a job sandbox returns an information to help user."""
     # Submit a job:
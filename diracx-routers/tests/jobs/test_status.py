@@ -27,6 +27,7 @@ pytestmark = pytest.mark.enabled_dependencies(
         "WMSAccessPolicy",
         "DevelopmentSettings",
         "JobParametersDB",
+        "JobHeartbeatSettings",
     ]
 )
 
@@ -28,7 +28,7 @@ class FakeJobDB:
 
 class FakeSBMetadataDB:
     async def get_owner_id(self, *args): ...
-    async def get_sandbox_owner_id(self, *args): ...
+    async def get_sandbox_ids(self, *args): ...
 
 
 @pytest.fixture
@@ -312,13 +312,12 @@ async def test_sandbox_access_policy_read(sandbox_metadata_db, monkeypatch):
     async def get_owner_id(*args):
         return 1
 
-    async def get_sandbox_owner_id(*args):
-        return 1
+    async def get_sandbox_ids(se_name, pfns):
+        # The SBId and OwnerId of each sandbox
+        return {pfn: (10, 1) for pfn in pfns}
 
     monkeypatch.setattr(sandbox_metadata_db, "get_owner_id", get_owner_id)
-    monkeypatch.setattr(
-        sandbox_metadata_db, "get_sandbox_owner_id", get_sandbox_owner_id
-    )
+    monkeypatch.setattr(sandbox_metadata_db, "get_sandbox_ids", get_sandbox_ids)
 
     await SandboxAccessPolicy.policy(
         SANDBOX_POLICY_NAME,
@@ -1,8 +1,16 @@
 from __future__ import annotations
 
+import copy
+import gzip
+from datetime import timedelta
+
 import pytest
+import zstandard
 from fastapi import status
 
+from diracx.core.config import ConfigSource
+from diracx.routers.configuration import _select_encoding, json_patch
+
 pytestmark = pytest.mark.enabled_dependencies(
     ["AuthSettings", "ConfigSource", "OpenAccessPolicy"]
 )
@@ -38,6 +46,7 @@ def test_get_config(normal_user_client):
 
     assert r.status_code == status.HTTP_304_NOT_MODIFIED, r.text
     assert not r.text
+    assert "Accept-Encoding" in r.headers["Vary"]
 
     # If only an invalid ETAG is passed, we expect a response
     r = normal_user_client.get(
@@ -114,3 +123,120 @@ def test_get_config(normal_user_client):
     )
     assert r.status_code == status.HTTP_304_NOT_MODIFIED, r.text
     assert not r.text
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_get_config_compressed(normal_user_client, encoding):
+    expected = normal_user_client.get(
+        "/api/config/", headers={"Accept-Encoding": "identity"}
+    )
+    assert "Content-Encoding" not in expected.headers
+
+    r = normal_user_client.get(
+        "/api/config/", headers={"Accept-Encoding": f"br;q=0, {encoding}"}
+    )
+    assert r.status_code == status.HTTP_200_OK, r.text
+    assert r.headers["Content-Encoding"] == encoding
+    assert r.headers["ETag"] == expected.headers["ETag"]
+    assert "Accept-Encoding" in r.headers["Vary"]
+    # httpx transparently decodes the body
+    assert r.content == expected.content
+    assert r.json() == expected.json()
+
+    decompress = gzip.decompress if encoding == "gzip" else zstandard.decompress
+    with normal_user_client.stream(
+        "GET", "/api/config/", headers={"Accept-Encoding": encoding}
+    ) as r:
+        assert decompress(b"".join(r.iter_raw())) == expected.content
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        (None, "identity"),
+        ("identity", "identity"),
+        ("gzip, zstd", "zstd"),
+        ("gzip", "gzip"),
+        ("zstd;q=0, gzip", "gzip"),
+        ("*", "zstd"),
+        # Explicitly refused codings aren't matched by *
+        ("zstd;q=0, *", "gzip"),
+        ("zstd;q=0, gzip;q=0, *", "identity"),
+        ("*;q=0, gzip", "gzip"),
+        ("gzip;q=invalid", "identity"),
+    ],
+)
+def test_select_encoding(accept_encoding, expected):
+    assert _select_encoding(accept_encoding) == expected
+
+
+def apply_json_patch(document, patch):
+    document = copy.deepcopy(document)
+    for operation in patch:
+        *parents, key = [
+            part.replace("~1", "/").replace("~0", "~")
+            for part in operation["path"].split("/")[1:]
+        ]
+        target = document
+        for parent in parents:
+            target = target[parent]
+        if operation["op"] == "remove":
+            del target[key]
+        else:
+            target[key] = operation["value"]
+    return document
+
+
+def test_json_patch():
+    old = {"a": {"b": 1, "c/d": [1, 2], "e~": True}, "f": 1}
+    new = {"a": {"b": 2, "c/d": [1], "g": {"h": None}}, "f": True}
+    patch = json_patch(old, new)
+    assert patch == [
+        {"op": "remove", "path": "/a/e~0"},
+        {"op": "replace", "path": "/a/b", "value": 2},
+        {"op": "replace", "path": "/a/c~1d", "value": [1]},
+        {"op": "add", "path": "/a/g", "value": {"h": None}},
+        {"op": "replace", "path": "/f", "value": True},
+    ]
+    assert apply_json_patch(old, patch) == new
+    assert json_patch(new, new) == []
+
+
+def test_get_config_delta(normal_user_client):
+    r = normal_user_client.get("/api/config/")
+    old_etag, old_content = r.headers["ETag"], r.json()
+
+    # Make a new revision of the config
+    config_source = normal_user_client.app.dependency_overrides[
+        ConfigSource.create
+    ].__self__
+    config = config_source.read_config()
+    new_config = config.model_copy(
+        update={"Operations": {**config.Operations, "newvo": config.Operations["lhcb"]}}
+    )
+    new_config._hexsha = "1" * 40
+    new_config._modified = config._modified + timedelta(minutes=1)
+    normal_user_client.app.dependency_overrides[ConfigSource.create] = lambda: (
+        new_config
+    )
+
+    new_content = normal_user_client.get("/api/config/").json()
+    assert new_content != old_content
+
+    r = normal_user_client.get(
+        "/api/config/", headers={"If-None-Match": old_etag, "A-IM": "json-patch"}
+    )
+    assert r.status_code == status.HTTP_226_IM_USED, r.text
+    assert r.headers["IM"] == "json-patch"
+    assert r.headers["Delta-Base"] == old_etag
+    assert r.headers["ETag"] == new_config._hexsha
+    assert r.headers["Content-Type"] == "application/json-patch+json"
+    assert [op["path"] for op in r.json()] == ["/Operations/newvo"]
+    assert apply_json_patch(old_content, r.json()) == new_content
+
+    # The full config is sent if the base revision is unknown
+    r = normal_user_client.get(
+        "/api/config/", headers={"If-None-Match": "unknown", "A-IM": "json-patch"}
+    )
+    assert r.status_code == status.HTTP_200_OK, r.text
+    assert r.json() == new_content
@@ -13,9 +13,12 @@ from .utils import (
     fernet_key,
     private_key,
     pytest_addoption,
+    pytest_collection_modifyitems,
+    pytest_configure,
     session_client_factory,
     test_auth_settings,
     test_dev_settings,
+    test_heartbeat_settings,
     test_login,
     test_sandbox_settings,
     with_cli_login,
@@ -28,9 +31,12 @@ __all__ = (
     "do_device_flow_with_dex",
     "test_login",
     "pytest_addoption",
+    "pytest_configure",
+    "pytest_collection_modifyitems",
     "private_key",
     "fernet_key",
     "test_dev_settings",
+    "test_heartbeat_settings",
     "test_auth_settings",
     "aio_moto",
     "test_sandbox_settings",
@@ -86,19 +86,30 @@ class MockOSDBMixin:
         async with self._sql_db.engine.begin() as conn:
             await conn.run_sync(self._sql_db.metadata.create_all)
 
+    def _upsert_stmt(self, doc_id, document):
+        values = {}
+        for key, value in document.items():
+            if key in self.fields:
+                values[key] = value
+            else:
+                values.setdefault("extra", {})[key] = value
+
+        stmt = sqlite_insert(self._table).values(doc_id=doc_id, **values)
+        # TODO: Upsert the JSON blob properly
+        return stmt.on_conflict_do_update(index_elements=["doc_id"], set_=values)
+
     async def upsert(self, vo, doc_id, document) -> None:
         async with self._sql_db:
-            values = {}
-            for key, value in document.items():
-                if key in self.fields:
-                    values[key] = value
-                else:
-                    values.setdefault("extra", {})[key] = value
-
-            stmt = sqlite_insert(self._table).values(doc_id=doc_id, **values)
-            # TODO: Upsert the JSON blob properly
-            stmt = stmt.on_conflict_do_update(index_elements=["doc_id"], set_=values)
-            await self._sql_db.conn.execute(stmt)
+            await self._sql_db.conn.execute(self._upsert_stmt(doc_id, document))
+
+    async def bulk_upsert(self, documents, **kwargs) -> None:
+        """Upsert all the documents in a single transaction.
+
+        The chunking options of the real implementation are accepted but ignored.
+        """
+        async with self._sql_db:
+            for _, doc_id, document in documents:
+                await self._sql_db.conn.execute(self._upsert_stmt(doc_id, document))
 
     async def search(
         self,
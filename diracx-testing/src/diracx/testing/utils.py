@@ -31,6 +31,7 @@ if TYPE_CHECKING:
         DevelopmentSettings,
         SandboxStoreSettings,
     )
+    from diracx.logic.jobs.heartbeat import JobHeartbeatSettings
     from diracx.routers.utils.users import AuthorizedUserInfo
 
 
@@ -53,6 +54,29 @@ def pytest_addoption(parser):
         default=None,
         help="Path to a diracx-charts directory with the demo running",
     )
+    parser.addoption(
+        "--run-benchmarks",
+        action="store_true",
+        default=False,
+        help="Run the tests marked with @pytest.mark.benchmark",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "benchmark: Performance comparison which is only ran with --run-benchmarks",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip the benchmarks unless they have been explicitly requested."""
+    if config.getoption("--run-benchmarks"):
+        return
+    skip_benchmark = pytest.mark.skip(reason="Needs --run-benchmarks to run")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip_benchmark)
 
 
 @pytest.fixture(scope="session")
@@ -80,6 +104,13 @@ def test_dev_settings() -> Generator[DevelopmentSettings, None, None]:
     yield DevelopmentSettings()
 
 
+@pytest.fixture(scope="session")
+def test_heartbeat_settings() -> Generator[JobHeartbeatSettings, None, None]:
+    from diracx.logic.jobs.heartbeat import JobHeartbeatSettings
+
+    yield JobHeartbeatSettings()
+
+
 @pytest.fixture(scope="session")
 def test_auth_settings(private_key, fernet_key) -> Generator[AuthSettings, None, None]:
     from diracx.core.settings import AuthSettings
@@ -145,6 +176,7 @@ class ClientFactory:
         test_auth_settings,
         test_sandbox_settings,
         test_dev_settings,
+        test_heartbeat_settings,
     ):
         from diracx.core.config import ConfigSource
         from diracx.core.extensions import select_from_extension
@@ -213,6 +245,7 @@ class ClientFactory:
                 test_auth_settings,
                 test_sandbox_settings,
                 test_dev_settings,
+                test_heartbeat_settings,
             ],
             database_urls=database_urls,
             os_database_conn_kwargs=os_database_conn_kwargs,
@@ -389,6 +422,7 @@ def session_client_factory(
     with_config_repo,
     tmp_path_factory,
     test_dev_settings,
+    test_heartbeat_settings,
 ):
     """TODO.
     ----
@@ -400,6 +434,7 @@ def session_client_factory(
         test_auth_settings,
         test_sandbox_settings,
         test_dev_settings,
+        test_heartbeat_settings,
     )
 
 
@@ -52,6 +52,7 @@ from ._models import (  # type: ignore
 
 from ._enums import (  # type: ignore
     ChecksumAlgorithm,
+    CountStrategy,
     JobStatus,
     SandboxFormat,
     SandboxType,
@@ -101,6 +102,7 @@ __all__ = [
     "VectorSearchSpec",
     "VectorSearchSpecValues",
     "ChecksumAlgorithm",
+    "CountStrategy",
     "JobStatus",
     "SandboxFormat",
     "SandboxType",